@@ -0,0 +1,284 @@
+# app/aggregate.py
+
+import asyncio
+import os
+from typing import Optional
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import Float, Integer, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.cache import TTLCache
+from app.datasets import NUMBER, STRING, DatasetColumn, column_of, filter_condition, open_dataset
+from app.models import Dataset, Equipment, Finance
+from app.versions import get_versions
+
+# Агрегация для графиков: группировка по колонкам и/или корзинам
+# (гистограмма по числу, интервал по дате), функции sum/mean/min/max/count
+# и процентили pNN. Всё считается над массивами numpy без цикла по строкам:
+# номера групп — через np.unique(return_inverse), суммы — np.bincount,
+# min/max и процентили — по отсортированным внутри групп значениям.
+# Источник — загруженный набор (/datasets) или таблицы equipment / finance;
+# результат кэшируется по (источник, версия, запрос).
+AGGREGATE_CACHE_SIZE = int(os.getenv("AGGREGATE_CACHE_SIZE", "256"))
+AGGREGATE_CACHE_TTL = float(os.getenv("AGGREGATE_CACHE_TTL", "600"))
+
+SOURCE_TABLES = {"equipment": Equipment, "finance": Finance}
+
+_results = TTLCache(maxsize=AGGREGATE_CACHE_SIZE, ttl=AGGREGATE_CACHE_TTL)
+# колонки таблиц, уже собранные в массивы: ключ (таблица, версия, колонка)
+_table_columns = TTLCache(maxsize=64, ttl=AGGREGATE_CACHE_TTL)
+
+
+# ----------------------------------------
+# Источники
+# ----------------------------------------
+
+def _encode_column(values: list, numeric: bool) -> DatasetColumn:
+    if numeric:
+        return DatasetColumn(NUMBER, np.array(values, dtype=np.float64))
+    codes: dict[str, int] = {}
+    encoded = np.fromiter(
+        (codes.setdefault("" if v is None else str(v), len(codes)) for v in values),
+        dtype=np.int32, count=len(values),
+    )
+    return DatasetColumn(STRING, encoded, list(codes))
+
+
+async def load_table_columns(db: AsyncSession, source: str, names: set[str]) -> tuple[dict, int]:
+    """
+    Нужные колонки таблицы (без удалённых строк) в виде DatasetColumn.
+    Возвращает также версию таблицы — по ней кэшируются и колонки, и результат.
+    """
+    model = SOURCE_TABLES[source]
+    table = model.__table__
+    unknown = [n for n in names if n not in table.c or n in ("updated_at", "deleted_at")]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Нет колонки: {', '.join(sorted(unknown))}")
+
+    version = dict(await get_versions(db, [table.name]))[table.name]
+    columns = {}
+    missing = []
+    for name in names:
+        cached = _table_columns.get((table.name, version, name))
+        if cached is None:
+            missing.append(name)
+        else:
+            columns[name] = cached
+    if missing:
+        result = await db.execute(
+            select(*[table.c[n] for n in missing]).where(model.deleted_at.is_(None)).order_by(model.id)
+        )
+        rows = result.all()
+        transposed = list(zip(*rows)) if rows else [()] * len(missing)
+        for name, values in zip(missing, transposed):
+            numeric = isinstance(table.c[name].type, (Integer, Float))
+            column = _encode_column(list(values), numeric)
+            _table_columns.set((table.name, version, name), column)
+            columns[name] = column
+    return columns, version
+
+
+# ----------------------------------------
+# Ключи групп
+# ----------------------------------------
+
+def _key_ids(column: DatasetColumn) -> tuple[np.ndarray, list]:
+    """Номер группы для каждой строки и подписи групп в порядке сортировки."""
+    if column.kind == NUMBER:
+        labels, inverse = np.unique(column.values, return_inverse=True)
+        return inverse, [None if v != v else v for v in labels.tolist()]
+    used, inverse = np.unique(column.values, return_inverse=True)
+    labels = [column.dictionary[code] for code in used.tolist()]
+    # коды идут в порядке появления — переставляем группы по алфавиту
+    order = np.argsort(np.asarray(labels, dtype=object), kind="stable")
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return rank[inverse], [labels[i] for i in order]
+
+
+def _to_days(column: DatasetColumn) -> np.ndarray:
+    """Колонка дат (строки YYYY-MM-DD...) → datetime64[D]."""
+    if column.kind != STRING:
+        raise HTTPException(status_code=400, detail="Интервал по времени строится только по колонке дат")
+    try:
+        dictionary = np.array([v[:10] if v else "NaT" for v in column.dictionary], dtype="datetime64[D]")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Колонка содержит не даты")
+    return dictionary[column.values]
+
+
+def _time_bins(column: DatasetColumn, interval: str) -> tuple[np.ndarray, list]:
+    days = _to_days(column)
+    if interval == "week":
+        # 1970-01-01 — четверг: сдвигаем к понедельнику
+        offset = (days.astype("datetime64[D]").astype(np.int64) + 3) % 7
+        days = days - offset.astype("timedelta64[D]")
+    elif interval == "month":
+        days = days.astype("datetime64[M]").astype("datetime64[D]")
+    labels, inverse = np.unique(days, return_inverse=True)
+    return inverse, [None if np.isnat(v) else str(v) for v in labels]
+
+
+def _histogram_bins(column: DatasetColumn, bins: int) -> tuple[np.ndarray, list, list]:
+    if column.kind != NUMBER:
+        raise HTTPException(status_code=400, detail="Гистограмма строится только по числовой колонке")
+    values = column.values
+    finite = values[np.isfinite(values)]
+    edges = np.histogram_bin_edges(finite, bins=bins) if len(finite) else np.linspace(0, 1, bins + 1)
+    ids = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, bins - 1)
+    ids[~np.isfinite(values)] = bins   # пустые значения — отдельная корзина
+    return ids, edges[:-1].tolist() + [None], edges.tolist()
+
+
+# ----------------------------------------
+# Агрегаты
+# ----------------------------------------
+
+def _grouped_sorted(groups: np.ndarray, values: np.ndarray, n: int):
+    """Значения, отсортированные по (группа, значение), начала и размеры групп."""
+    valid = ~np.isnan(values)
+    g, v = groups[valid], values[valid]
+    order = np.lexsort((v, g))
+    g, v = g[order], v[order]
+    counts = np.bincount(g, minlength=n)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return v, starts, counts
+
+
+def _aggregate(fn: str, groups: np.ndarray, values: Optional[np.ndarray], n: int) -> np.ndarray:
+    if values is None:
+        return np.bincount(groups, minlength=n).astype(np.float64)
+    valid = ~np.isnan(values)
+    if fn == "count":
+        return np.bincount(groups[valid], minlength=n).astype(np.float64)
+    if fn in ("sum", "mean"):
+        sums = np.bincount(groups[valid], weights=values[valid], minlength=n)
+        if fn == "sum":
+            return sums
+        counts = np.bincount(groups[valid], minlength=n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    v, starts, counts = _grouped_sorted(groups, values, n)
+    if not len(v):
+        return np.full(n, np.nan)
+    top = len(v) - 1
+    if fn in ("min", "max"):
+        index = starts if fn == "min" else starts + counts - 1
+        return np.where(counts > 0, v[np.clip(index, 0, top)], np.nan)
+
+    # pNN — линейная интерполяция, как np.percentile(method="linear")
+    q = int(fn[1:]) / 100
+    position = starts + q * np.maximum(counts - 1, 0)
+    low = np.clip(np.floor(position).astype(np.int64), 0, top)
+    high = np.clip(np.ceil(position).astype(np.int64), 0, top)
+    result = v[low] + (v[high] - v[low]) * (position - low)
+    return np.where(counts > 0, result, np.nan)
+
+
+def query_columns(query) -> set[str]:
+    """Колонки, которые нужны запросу."""
+    names = set(query.group_by) | {f.column for f in query.filters} | \
+        {a.column for a in query.aggregations if a.column}
+    if query.bin:
+        names.add(query.bin.column)
+    return names
+
+
+def compute(columns: dict[str, DatasetColumn], rows: int, query) -> dict:
+    """Фильтры → группы → агрегаты. Возвращает серии по колонкам, готовые для графика."""
+    columns = {name: column_of(columns, name) for name in query_columns(query)}
+    mask = None
+    for f in query.filters:
+        condition = filter_condition(column_of(columns, f.column), f.op, f.value)
+        mask = condition if mask is None else mask & condition
+    if mask is not None:
+        columns = {
+            name: DatasetColumn(c.kind, np.asarray(c.values)[mask], c.dictionary, c._ranks)
+            for name, c in columns.items()
+        }
+        rows = int(mask.sum())
+
+    keys, key_ids, key_labels, edges = [], [], [], None
+    for name in query.group_by:
+        ids, labels = _key_ids(column_of(columns, name))
+        keys.append(name)
+        key_ids.append(ids)
+        key_labels.append(labels)
+    if query.bin:
+        column = column_of(columns, query.bin.column)
+        if query.bin.kind == "histogram":
+            ids, labels, edges = _histogram_bins(column, query.bin.bins)
+        else:
+            ids, labels = _time_bins(column, query.bin.interval)
+        keys.append(query.bin.column)
+        key_ids.append(ids)
+        key_labels.append(labels)
+
+    # составной номер группы: индексы по всем ключам → одно число
+    if key_ids:
+        sizes = [len(labels) for labels in key_labels]
+        combined = np.ravel_multi_index(key_ids, sizes) if rows else np.zeros(0, dtype=np.int64)
+        present, groups = np.unique(combined, return_inverse=True)
+        parts = np.unravel_index(present, sizes) if len(present) else [np.zeros(0, dtype=np.int64)] * len(sizes)
+    else:
+        present = np.zeros(1 if rows else 0, dtype=np.int64)
+        groups = np.zeros(rows, dtype=np.int64)
+        parts = []
+    n = len(present)
+
+    series = {}
+    for name, ids, labels in zip(keys, parts, key_labels):
+        series[name] = [labels[i] for i in ids.tolist()]
+    for agg in query.aggregations:
+        values = None
+        if agg.column:
+            column = column_of(columns, agg.column)
+            if column.kind != NUMBER and agg.fn != "count":
+                raise HTTPException(status_code=400, detail=f"{agg.fn} требует числовую колонку: {agg.column}")
+            values = np.asarray(column.values, dtype=np.float64) if column.kind == NUMBER else \
+                np.zeros(rows, dtype=np.float64)
+        result = _aggregate(agg.fn, groups, values, n)
+        series[agg.name or f"{agg.fn}({agg.column or '*'})"] = [None if v != v else v for v in result.tolist()]
+
+    truncated = n > query.max_groups
+    if truncated:
+        series = {name: values[:query.max_groups] for name, values in series.items()}
+    return {
+        "keys": keys,
+        "series": series,
+        "groups": min(n, query.max_groups),
+        "rows": rows,
+        "truncated": truncated,
+        "edges": edges,
+    }
+
+
+async def aggregate(db: AsyncSession, query, dataset: Optional[Dataset] = None) -> dict:
+    """Посчитать (или взять из кэша) агрегат по источнику запроса."""
+    if dataset is not None:
+        # загруженный набор не меняется — его id и есть версия
+        version_key = ("dataset", dataset.id)
+        cached = _results.get((version_key, query.json()))
+        if cached is not None:
+            return cached
+        columns, rows = open_dataset(dataset), dataset.rows
+    else:
+        columns, version = await load_table_columns(db, query.source, query_columns(query))
+        version_key = (query.source, version)
+        cached = _results.get((version_key, query.json()))
+        if cached is not None:
+            return cached
+        rows = len(next(iter(columns.values())).values) if columns else await _count_rows(db, query.source)
+
+    result = await asyncio.to_thread(compute, columns, rows, query)
+    _results.set((version_key, query.json()), result)
+    return result
+
+
+async def _count_rows(db: AsyncSession, source: str) -> int:
+    model = SOURCE_TABLES[source]
+    return await db.scalar(select(func.count()).select_from(model).where(model.deleted_at.is_(None)))
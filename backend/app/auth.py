@@ -1,21 +1,55 @@
-from passlib.context import CryptContext
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
+from typing import Optional
 import os
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import noload
 from app.models import User
 from app.database import get_db
+from app.cache import TTLCache
+from app.hashing import pwd_context
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
 SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = os.getenv("JWT_ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# Кэш «принципалов» — облегчённых записей пользователя для проверки доступа
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Текущий пользователь без пароля и связей — то, что нужно
+    для проверки роли и записи логов. Поля совпадают с UserRead.
+    """
+    id: int
+    fullname: str
+    email: str
+    avatar_url: Optional[str]
+    phone: Optional[str]
+    role: str
+    position: Optional[str]
+
+
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+_PRINCIPAL_COLUMNS = (
+    User.id,
+    User.fullname,
+    User.email,
+    User.avatar_url,
+    User.phone,
+    User.role,
+    User.position,
+)
+
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -35,7 +69,29 @@ def decode_access_token(token: str):
     except JWTError:
         return None
     
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
+async def load_principal(db: AsyncSession, user_id: int) -> Optional[Principal]:
+    """
+    Principal из кэша, при промахе — один SELECT только нужных колонок
+    (без загрузки data_logs).
+    """
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    result = await db.execute(select(*_PRINCIPAL_COLUMNS).where(User.id == user_id))
+    row = result.one_or_none()
+    if row is None:
+        return None
+    principal = Principal(**row._mapping)
+    principal_cache.set(user_id, principal)
+    return principal
+
+
+def invalidate_principal(user_id: int) -> None:
+    """Сбросить кэш после изменения или удаления пользователя."""
+    principal_cache.pop(user_id)
+
+
+async def principal_from_token(token: str, db: AsyncSession) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Неверный токен",
@@ -49,14 +105,39 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     except JWTError:
         raise credentials_exception
 
-    result = await db.execute(select(User).where(User.id == int(user_id)))
+    try:
+        principal = await load_principal(db, int(user_id))
+    except ValueError:
+        raise credentials_exception
+    if principal is None:
+        raise credentials_exception
+    return principal
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> Principal:
+    return await principal_from_token(token, db)
+
+
+async def get_current_user_db(
+    principal: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    """
+    ORM-объект текущего пользователя — для обработчиков, которые его меняют
+    (профиль, пароль, аватар). Связь data_logs не загружается.
+    """
+    result = await db.execute(
+        select(User).options(noload(User.data_logs)).where(User.id == principal.id)
+    )
     user = result.scalar_one_or_none()
     if user is None:
-        raise credentials_exception
+        invalidate_principal(principal.id)
+        raise HTTPException(status_code=401, detail="Неверный токен")
     return user
 
+
 def require_role(allowed_roles: list[str]):
-    async def role_checker(user: User = Depends(get_current_user)):
+    async def role_checker(user: Principal = Depends(get_current_user)):
         if user.role not in allowed_roles:
             raise HTTPException(status_code=403, detail="Доступ запрещён")
         return user
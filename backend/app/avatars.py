@@ -0,0 +1,139 @@
+# app/avatars.py
+
+import asyncio
+import hashlib
+import io
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, Request
+from PIL import Image, ImageOps, UnidentifiedImageError
+from starlette.datastructures import UploadFile
+from starlette.staticfiles import StaticFiles
+
+# Аватары: загрузка читается частями с ограничением размера, декодирование
+# и уменьшение до AVATAR_SIZES (квадрат, WebP) — в отдельном пуле потоков,
+# не в event loop. Имя файла — хеш исходника: «<hash>_<size>.webp». Файл
+# с таким именем никогда не меняется, поэтому /static/avatars отдаётся
+# с Cache-Control: immutable (CachedStaticFiles), а новое фото — новый URL.
+AVATAR_DIR = os.getenv("AVATAR_DIR", "app/static/avatars")
+AVATAR_URL_PREFIX = "/static/avatars"
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(5 * 2**20)))
+AVATAR_MAX_PIXELS = int(os.getenv("AVATAR_MAX_PIXELS", str(40_000_000)))   # защита от «бомб» распаковки
+AVATAR_SIZES = tuple(sorted(int(s) for s in os.getenv("AVATAR_SIZES", "64,128,256").split(",")))
+AVATAR_WORKERS = int(os.getenv("AVATAR_WORKERS", "2"))
+AVATAR_QUALITY = 85
+
+_ACCEPTED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF", "BMP"}
+_CHUNK = 64 * 1024
+# запас на заголовки multipart сверх самого файла
+_MULTIPART_OVERHEAD = 16 * 1024
+# при смене обработки меняется и хеш — старые URL остаются валидными
+_PIPELINE = f"v1:{AVATAR_SIZES}:{AVATAR_QUALITY}".encode()
+
+CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{24}_\d+\.webp$")
+
+_executor = ThreadPoolExecutor(max_workers=AVATAR_WORKERS, thread_name_prefix="avatars")
+
+Image.MAX_IMAGE_PIXELS = AVATAR_MAX_PIXELS
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Файл больше {AVATAR_MAX_BYTES / 2**20:.3g} МБ")
+
+
+async def read_avatar_upload(request: Request) -> bytes:
+    """
+    Файл из multipart-формы (поле file). Размер проверяется по
+    Content-Length до разбора формы и ещё раз при чтении.
+    """
+    length = request.headers.get("content-length")
+    if length is None:
+        raise HTTPException(status_code=411, detail="Нужен заголовок Content-Length")
+    if int(length) > AVATAR_MAX_BYTES + _MULTIPART_OVERHEAD:
+        raise _too_large()
+
+    form = await request.form(max_files=1, max_fields=4)
+    try:
+        upload = form.get("file")
+        if not isinstance(upload, UploadFile):
+            raise HTTPException(status_code=422, detail="Нет файла в поле file")
+        data = bytearray()
+        while chunk := await upload.read(_CHUNK):
+            data += chunk
+            if len(data) > AVATAR_MAX_BYTES:
+                raise _too_large()
+        return bytes(data)
+    finally:
+        await form.close()
+
+
+def avatar_url(digest: str, size: int) -> str:
+    return f"{AVATAR_URL_PREFIX}/{digest}_{size}.webp"
+
+
+def _render(data: bytes) -> tuple[str, dict[int, str]]:
+    """Декодирование, обрезка до квадрата и запись всех размеров (в пуле)."""
+    digest = hashlib.sha256(_PIPELINE + data).hexdigest()[:24]
+    paths = {size: os.path.join(AVATAR_DIR, f"{digest}_{size}.webp") for size in AVATAR_SIZES}
+    if all(os.path.exists(p) for p in paths.values()):
+        return digest, paths   # такое фото уже загружали
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.format not in _ACCEPTED_FORMATS:
+                raise ValueError(f"формат {image.format} не поддерживается")
+            image = ImageOps.exif_transpose(image)
+            image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+            side = min(image.size)
+            square = ImageOps.fit(image, (side, side), method=Image.Resampling.LANCZOS)
+    except UnidentifiedImageError:
+        raise ValueError("формат не распознан")
+    except (Image.DecompressionBombError, OSError, ValueError) as e:
+        raise ValueError(str(e) or type(e).__name__)
+
+    os.makedirs(AVATAR_DIR, exist_ok=True)
+    for size, path in paths.items():
+        thumbnail = square if size >= side else square.resize((size, size), Image.Resampling.LANCZOS)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        thumbnail.save(tmp_path, "WEBP", quality=AVATAR_QUALITY, method=4)
+        os.replace(tmp_path, path)
+    return digest, paths
+
+
+async def store_avatar(data: bytes) -> dict[int, str]:
+    """Миниатюры всех размеров: {размер: URL}."""
+    try:
+        digest, _ = await asyncio.get_running_loop().run_in_executor(_executor, _render, data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Некорректное изображение: {e}")
+    return {size: avatar_url(digest, size) for size in AVATAR_SIZES}
+
+
+def remove_avatar_files(url: str) -> None:
+    """Удалить все размеры аватара по URL любого из них (только хешированные)."""
+    name = url.rsplit("/", 1)[-1]
+    if not url.startswith(AVATAR_URL_PREFIX + "/") or not CONTENT_ADDRESSED.match(name):
+        return
+    digest = name.split("_", 1)[0]
+    for size in AVATAR_SIZES:
+        try:
+            os.remove(os.path.join(AVATAR_DIR, f"{digest}_{size}.webp"))
+        except FileNotFoundError:
+            pass
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles (ETag, Last-Modified и 304 уже есть) с долгим кэшем для
+    файлов с хешем в имени; остальные браузер перепроверяет каждый раз.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if CONTENT_ADDRESSED.match(os.path.basename(full_path)):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response
@@ -0,0 +1,116 @@
+# app/batch.py
+
+import os
+from types import SimpleNamespace
+from typing import Iterable, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.schemas import BatchFilter
+
+# Пакетные изменения equipment / finance: каждая операция — одно выражение
+# (многострочный INSERT ... RETURNING или UPDATE ... RETURNING по списку id
+# или фильтру) в одной транзакции вместе с агрегатами, живой лентой и
+# версией таблицы. Удаление мягкое, как у одиночных обработчиков:
+# UPDATE deleted_at, надгробия потом вычищает app/changes.py.
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "10000"))   # строк в create и id в списке
+
+
+def check_batch_size(count: int) -> None:
+    if count == 0:
+        raise HTTPException(status_code=400, detail="Пустой пакет")
+    if count > BATCH_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"В пакете больше {BATCH_MAX_ROWS} строк")
+
+
+def batch_conditions(model, device_column, where: BatchFilter) -> list:
+    """WHERE по списку id и/или фильтру; без условий — 400 (не трогаем всю таблицу)."""
+    conditions = []
+    if where.ids is not None:
+        check_batch_size(len(where.ids))
+        conditions.append(model.id.in_(where.ids))
+    if where.start:
+        conditions.append(model.date >= where.start)
+    if where.end:
+        conditions.append(model.date <= where.end)
+    if where.device:
+        conditions.append(device_column == where.device)
+    if not conditions:
+        raise HTTPException(status_code=400, detail="Укажите ids или фильтр (start, end, device)")
+    return [model.deleted_at.is_(None), *conditions]
+
+
+def patch_values(patch, required: Iterable[str]) -> dict:
+    """Переданные поля патча; NOT NULL-поля нельзя обнулить."""
+    values = patch.dict(exclude_unset=True)
+    if not values:
+        raise HTTPException(status_code=400, detail="Нет полей для изменения")
+    empty = [name for name in required if name in values and values[name] is None]
+    if empty:
+        raise HTTPException(status_code=400, detail=f"Поле не может быть пустым: {', '.join(empty)}")
+    return values
+
+
+async def batch_insert(db: AsyncSession, model, rows: list[dict], returning: list) -> list:
+    """Многострочный INSERT ... RETURNING (SQLAlchemy режет на пачки VALUES сам)."""
+    result = await db.execute(insert(model).returning(*returning), rows)
+    return result.all()
+
+
+async def batch_update(
+    db: AsyncSession,
+    model,
+    conditions: list,
+    values: dict,
+    returning: list,
+    returning_old: Optional[list] = None,
+) -> list:
+    """
+    UPDATE ... RETURNING. Если нужны и прежние значения (для агрегатов),
+    в PostgreSQL строки до изменения присоединяются подзапросом
+    (UPDATE ... FROM) — всё равно одно выражение; прежние колонки приходят
+    с префиксом old_. SQLite не даёт ссылаться в RETURNING на таблицы из
+    FROM, там прежние значения читаются отдельным SELECT в той же транзакции.
+    """
+    if not returning_old:
+        stmt = update(model).where(*conditions).values(**values).returning(*returning)
+        result = await db.execute(stmt.execution_options(synchronize_session=False))
+        return result.all()
+
+    if db.get_bind().dialect.name == "postgresql":
+        old = select(model.id, *returning_old).where(*conditions).with_for_update().subquery("old")
+        stmt = (
+            update(model)
+            .where(model.id == old.c.id)
+            .values(**values)
+            .returning(*returning, *[old.c[c.name].label(f"old_{c.name}") for c in returning_old])
+        )
+        result = await db.execute(stmt.execution_options(synchronize_session=False))
+        return result.all()
+
+    old_rows = await db.execute(select(model.id, *returning_old).where(*conditions))
+    previous = {row.id: row for row in old_rows}
+    stmt = update(model).where(*conditions).values(**values).returning(*returning)
+    result = await db.execute(stmt.execution_options(synchronize_session=False))
+    return [
+        SimpleNamespace(
+            **row._mapping,
+            **{f"old_{c.name}": getattr(previous[row.id], c.name) for c in returning_old},
+        )
+        for row in result
+    ]
+
+
+def batch_summary(action: str, ids: list[int], devices: Iterable[str], dates: Iterable) -> dict:
+    dates = [d for d in dates if d is not None]
+    return {
+        "action": action,
+        "count": len(ids),
+        "ids": sorted(ids),
+        "devices": sorted(set(devices)),
+        "start": min(dates) if dates else None,
+        "end": max(dates) if dates else None,
+    }
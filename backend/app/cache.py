@@ -0,0 +1,107 @@
+# app/cache.py
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    In-process LRU-кэш ограниченного размера с временем жизни записей.
+    Рассчитан на один event loop (без блокировок). В каждом воркере
+    uvicorn свой экземпляр, поэтому устаревание между воркерами
+    ограничено ttl.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def values(self) -> list:
+        """Неустаревшие значения, от старых к новым."""
+        now = time.monotonic()
+        return [value for expires_at, value in self._data.values() if expires_at >= now]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RefreshingValue:
+    """
+    Одно вычисляемое значение с коротким TTL и stale-while-revalidate:
+    свежее (моложе ttl) отдаётся сразу; устаревшее, но моложе ttl + stale,
+    тоже отдаётся сразу, а пересчёт запускается в фоне; иначе запрос ждёт
+    пересчёта. Одновременно идёт не больше одного пересчёта — остальные
+    запросы ждут его же (single-flight), а не нагружают БД параллельно.
+    """
+
+    def __init__(self, compute: Callable[[], Awaitable[Any]], ttl: float, stale: float):
+        self.compute = compute
+        self.ttl = ttl
+        self.stale = stale
+        self._value: Any = _MISSING
+        self._computed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self) -> Any:
+        age = time.monotonic() - self._computed_at
+        if self._value is not _MISSING and age < self.ttl:
+            return self._value
+        if self._value is not _MISSING and age < self.ttl + self.stale:
+            self._start_refresh()
+            return self._value
+        return await asyncio.shield(self._start_refresh())
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh())
+        return self._task
+
+    async def _refresh(self) -> Any:
+        try:
+            value = await self.compute()
+            self._value = value
+            self._computed_at = time.monotonic()
+            return value
+        except Exception:
+            logger.exception("Не удалось пересчитать значение")
+            if self._value is _MISSING:
+                raise
+            return self._value
+        finally:
+            self._task = None
+
+    def invalidate(self) -> None:
+        self._computed_at = 0.0
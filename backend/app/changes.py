@@ -0,0 +1,102 @@
+# app/changes.py
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import delete, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.database import AsyncSessionLocal
+from app.querying import encode_cursor, decode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Дельта-синхронизация: клиент хранит курсор (updated_at, id) последней
+# полученной строки и запрашивает только то, что изменилось после него.
+# Удалённые строки остаются «надгробиями» (deleted_at) ещё
+# TOMBSTONE_RETENTION_DAYS дней, затем удаляются физически; курсор старше
+# этого срока получает 410 — клиенту нужна полная перезагрузка.
+#
+# Транзакция может закоммититься позже, чем началась более новая, поэтому
+# последние CHANGES_SETTLE_SECONDS секунд считаются «неустоявшимися»:
+# курсор в конце выдачи не сдвигается дальше now - CHANGES_SETTLE_SECONDS,
+# и такие строки придут повторно (клиент применяет их по id). Пустая
+# выдача, наоборот, подтягивает старый курсор к now - CHANGES_SETTLE_SECONDS:
+# иначе клиент, опрашивающий неизменную таблицу, получил бы 410.
+CHANGES_PAGE_DEFAULT = 500
+CHANGES_PAGE_MAX = 5000
+CHANGES_SETTLE_SECONDS = float(os.getenv("CHANGES_SETTLE_SECONDS", "5"))
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))
+TOMBSTONE_PURGE_INTERVAL = float(os.getenv("TOMBSTONE_PURGE_INTERVAL", "3600"))
+
+
+async def changes_page(db: AsyncSession, model, since: Optional[str], limit: int, conditions: list = ()) -> dict:
+    """
+    Строки model, изменённые после курсора since (без since — с начала),
+    в порядке (updated_at, id). Удалённые отдаются списком id в deleted.
+    """
+    now = datetime.now(timezone.utc)
+    query = select(model).where(*conditions)
+    if since:
+        updated_at, row_id = decode_cursor(since, datetime, int)
+        horizon = now - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+        if updated_at.replace(tzinfo=updated_at.tzinfo or timezone.utc) < horizon:
+            raise HTTPException(status_code=410, detail="Курсор устарел, нужна полная загрузка")
+        query = query.where(tuple_(model.updated_at, model.id) > tuple_(updated_at, row_id))
+    query = query.order_by(model.updated_at, model.id).limit(limit + 1)
+
+    rows = (await db.execute(query)).scalars().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if rows:
+        last = rows[-1]
+        cursor_key = (last.updated_at, last.id)
+    elif since:
+        cursor_key = decode_cursor(since, datetime, int)
+    else:
+        cursor_key = (now - timedelta(seconds=CHANGES_SETTLE_SECONDS), 0)
+    if not has_more:
+        settled = now - timedelta(seconds=CHANGES_SETTLE_SECONDS)
+        key_time = cursor_key[0].replace(tzinfo=cursor_key[0].tzinfo or timezone.utc)
+        # после строк курсор не заходит в неустоявшееся окно; без строк —
+        # до него всё уже получено, и старый курсор сдвигается вперёд
+        if key_time > settled or not rows:
+            cursor_key = (settled, 0)
+
+    return {
+        "items": [row for row in rows if row.deleted_at is None],
+        "deleted": [row.id for row in rows if row.deleted_at is not None],
+        "cursor": encode_cursor(*cursor_key),
+        "has_more": has_more,
+    }
+
+
+async def purge_tombstones(models) -> int:
+    """Физически удаляет надгробия старше TOMBSTONE_RETENTION_DAYS."""
+    horizon = datetime.now(timezone.utc) - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    removed = 0
+    async with AsyncSessionLocal() as db:
+        for model in models:
+            result = await db.execute(
+                delete(model).where(model.deleted_at.isnot(None), model.deleted_at < horizon)
+            )
+            removed += result.rowcount or 0
+        await db.commit()
+    return removed
+
+
+async def run_tombstone_purger(models) -> None:
+    while True:
+        try:
+            removed = await purge_tombstones(models)
+            if removed:
+                logger.info("Удалено надгробий: %d", removed)
+        except Exception:
+            logger.exception("Не удалось очистить надгробия")
+        await asyncio.sleep(TOMBSTONE_PURGE_INTERVAL)
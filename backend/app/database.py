@@ -1,16 +1,129 @@
 # app/database.py
 
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import exc, inspect, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Реплика только для чтения (необязательно): списки и поиск по id читают
+# с неё через get_read_db (app/replica.py), запись — всегда в DATABASE_URL
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+# Параметры движка и пула. Размер пула считается на один воркер uvicorn:
+# всего соединений до workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))         # ожидание свободного соединения, с
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))         # пересоздавать соединения старше, с
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))  # asyncpg: prepared statements на соединение
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+# false — без логов SQL, true — запросы, debug — запросы и результаты
+DB_ECHO = os.getenv("DB_ECHO", "false").lower()
+
+# метрики пулов — с меткой engine (primary / replica): пулы разные
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds", "Ожидание соединения из пула (включая открытие нового)", ["engine"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Запросы, не дождавшиеся соединения за DB_POOL_TIMEOUT", ["engine"])
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Соединения, выданные из пула", ["engine"])
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Соединения сверх pool_size (отрицательное — ещё не открытые)", ["engine"])
+DB_POOL_SIZE_GAUGE = Gauge("db_pool_size", "Настроенный размер пула", ["engine"])
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул, который замеряет ожидание соединения и считает тайм-ауты."""
+
+    # метка в метриках; класс, а не атрибут экземпляра — engine.dispose()
+    # пересоздаёт пул тем же классом
+    engine_label = "primary"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            DB_POOL_TIMEOUTS.labels(self.engine_label).inc()
+            raise
+        finally:
+            DB_POOL_WAIT.labels(self.engine_label).observe(time.perf_counter() - started)
+
+
+class ReplicaInstrumentedPool(InstrumentedPool):
+    engine_label = "replica"
+
+
+def _echo_setting(value: str):
+    if value == "debug":
+        return "debug"
+    return value in ("1", "true", "yes")
+
+
+def engine_options(url: str, read_only: bool = False) -> dict:
+    """Аргументы create_async_engine для URL (у SQLite в памяти пула нет)."""
+    parsed = make_url(url)
+    options = {"echo": _echo_setting(DB_ECHO), "pool_pre_ping": DB_POOL_PRE_PING}
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return options
+    options.update(
+        poolclass=ReplicaInstrumentedPool if read_only else InstrumentedPool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    if parsed.get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "timeout": DB_CONNECT_TIMEOUT,
+            # кэш подготовленных выражений адаптера SQLAlchemy — аргумент DBAPI,
+            # а не create_async_engine (адаптер asyncpg забирает его из connect_args)
+            "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        }
+        if read_only:
+            # случайная запись через сессию реплики падает сразу, а не на сервере репликации
+            options["connect_args"]["server_settings"] = {"default_transaction_read_only": "on"}
+    return options
+
+
+def pool_status(pool) -> dict:
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return {"class": type(pool).__name__}
+    return {
+        "class": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "timeout": DB_POOL_TIMEOUT,
+    }
+
 
 # Создание движка
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+
+
+
+def track_pool(async_engine, label: str) -> None:
+    """Состояние пула движка в метриках (читается при каждом сборе /metrics)."""
+    if isinstance(async_engine.pool, AsyncAdaptedQueuePool):
+        DB_POOL_CHECKED_OUT.labels(label).set_function(lambda: async_engine.pool.checkedout())
+        DB_POOL_OVERFLOW.labels(label).set_function(lambda: async_engine.pool.overflow())
+        DB_POOL_SIZE_GAUGE.labels(label).set_function(lambda: async_engine.pool.size())
+
+
+track_pool(engine, "primary")
 
 # Асинхронная сессия
 AsyncSessionLocal = sessionmaker(
@@ -19,9 +132,77 @@ AsyncSessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
+# Движок и сессии реплики (None, если DATABASE_REPLICA_URL не задан).
+# Таблицы на реплике не создаются — их приносит репликация.
+replica_engine = (
+    create_async_engine(DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL, read_only=True))
+    if DATABASE_REPLICA_URL else None
+)
+ReplicaSessionLocal = (
+    sessionmaker(bind=replica_engine, class_=AsyncSession, expire_on_commit=False)
+    if replica_engine is not None else None
+)
+if replica_engine is not None:
+    track_pool(replica_engine, "replica")
+
 # Базовый класс для моделей
 Base = declarative_base()
 
+def _default_sql(column, dialect) -> str:
+    default = column.server_default.arg
+    return default if isinstance(default, str) else str(default.compile(dialect=dialect))
+
+
+def _add_missing_columns(sync_conn):
+    """
+    Досоздаёт колонки, появившиеся в моделях после создания таблицы.
+    Колонка добавляется допускающей NULL (SQLite не умеет ADD COLUMN
+    с DEFAULT now()), затем заполняется значением server_default.
+    В PostgreSQL после этого колонке возвращаются DEFAULT и NOT NULL из
+    модели — иначе COPY и «сырые» INSERT без колонки писали бы NULL.
+    Это же чинит колонки, добавленные раньше без них.
+    """
+    inspector = inspect(sync_conn)
+    preparer = sync_conn.dialect.identifier_preparer
+    alter_columns = sync_conn.dialect.name == "postgresql"
+    for table in Base.metadata.sorted_tables:
+        existing = {c["name"]: c for c in inspector.get_columns(table.name)}
+        table_name = preparer.format_table(table)
+        for column in table.columns:
+            column_name = preparer.format_column(column)
+            reflected = existing.get(column.name)
+            if reflected is None:
+                column_type = column.type.compile(dialect=sync_conn.dialect)
+                sync_conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+                if column.server_default is not None:
+                    default_sql = _default_sql(column, sync_conn.dialect)
+                    sync_conn.execute(text(f"UPDATE {table_name} SET {column_name} = {default_sql}"))
+                reflected = {"nullable": True, "default": None}
+            if not alter_columns or column.server_default is None:
+                continue
+            missing_default = reflected["default"] is None
+            missing_not_null = reflected["nullable"] and not column.nullable
+            if not (missing_default or missing_not_null):
+                continue
+            default_sql = _default_sql(column, sync_conn.dialect)
+            sync_conn.execute(text(f"UPDATE {table_name} SET {column_name} = {default_sql} WHERE {column_name} IS NULL"))
+            if missing_default:
+                sync_conn.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN {column_name} SET DEFAULT {default_sql}"))
+            if missing_not_null:
+                sync_conn.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN {column_name} SET NOT NULL"))
+
+
+# Создание таблиц, недостающих колонок и индексов при старте.
+# create_all не трогает уже существующие таблицы, поэтому новые колонки
+# и индексы досоздаются отдельно.
+async def init_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                await conn.run_sync(index.create, checkfirst=True)
+
 # Получение сессии
 async def get_db():
     async with AsyncSessionLocal() as session:
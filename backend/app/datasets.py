@@ -0,0 +1,444 @@
+# app/datasets.py
+
+import asyncio
+import csv
+import io
+import json
+import operator
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, AsyncIterator, Iterator, Optional
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import delete, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.cache import TTLCache
+from app.models import Dataset, utcnow
+
+# Наборы данных для аналитики: CSV загружается один раз и хранится на диске
+# поколоночно — по .npy-файлу на колонку (числа — float64 с NaN вместо пустых,
+# строки — int32-коды + словарь значений в .json). Файлы открываются через
+# mmap, фильтры и сортировка считаются векторно по массивам numpy.
+# Суммарный объём ограничен DATASETS_QUOTA_BYTES: при превышении удаляются
+# наборы, к которым дольше всего не обращались (LRU по last_accessed_at).
+DATASETS_DIR = os.getenv("DATASETS_DIR", "data/datasets")
+DATASETS_QUOTA_BYTES = int(os.getenv("DATASETS_QUOTA_BYTES", str(2 * 1024 ** 3)))
+DATASET_MAX_UPLOAD_BYTES = int(os.getenv("DATASET_MAX_UPLOAD_BYTES", str(512 * 1024 ** 2)))
+DATASET_CHUNK_ROWS = 65536
+DATASET_SPOOL_BUFFER = 4 * 1024 ** 2   # запись на диск пачками, в потоке
+DATASET_PAGE_MAX = 10000
+# last_accessed_at обновляется не чаще раза в минуту — LRU точнее не нужен
+DATASET_TOUCH_INTERVAL = timedelta(seconds=60)
+
+NUMBER, STRING = "number", "string"
+FILTER_OPS = ("eq", "ne", "lt", "le", "gt", "ge", "in", "contains", "empty", "not_empty")
+_COMPARE = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "le": operator.le,
+    "gt": operator.gt,
+    "ge": operator.ge,
+}
+
+# открытые (mmap) наборы и посчитанные выборки — в памяти воркера
+_opened = TTLCache(maxsize=int(os.getenv("DATASET_OPEN_CACHE", "16")), ttl=3600)
+_selections = TTLCache(maxsize=16, ttl=300)
+
+
+# ----------------------------------------
+# Загрузка
+# ----------------------------------------
+
+async def spool_upload(chunks: AsyncIterator[bytes], path: str) -> int:
+    """
+    Сохранить тело запроса во временный файл, не больше DATASET_MAX_UPLOAD_BYTES.
+    Файловые операции блокируют, поэтому идут в потоке, пачками по DATASET_SPOOL_BUFFER.
+    """
+    size = 0
+    buffer = bytearray()
+    out = await asyncio.to_thread(open, path, "wb")
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > DATASET_MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail="Файл слишком большой")
+            buffer += chunk
+            if len(buffer) >= DATASET_SPOOL_BUFFER:
+                await asyncio.to_thread(out.write, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await asyncio.to_thread(out.write, bytes(buffer))
+    finally:
+        await asyncio.to_thread(out.close)
+    return size
+
+
+@contextmanager
+def _csv_reader(path: str) -> Iterator[tuple[Iterator[list[str]], str]]:
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+        first = f.readline()
+        f.seek(0)
+        delimiter = ";" if first.count(";") > first.count(",") else ","
+        rows = (values for values in csv.reader(f, delimiter=delimiter) if any(v.strip() for v in values))
+        yield rows, delimiter
+
+
+def _number(value: str, delimiter: str) -> Optional[float]:
+    value = value.strip()
+    if not value:
+        return float("nan")
+    try:
+        return float(value)
+    except ValueError:
+        # «1,5» — десятичная запятая в CSV с разделителем «;»
+        if delimiter == ";" and "," in value:
+            try:
+                return float(value.replace(",", "."))
+            except ValueError:
+                pass
+        return None
+
+
+def _column_names(header: list[str]) -> list[str]:
+    names, seen = [], set()
+    for i, name in enumerate(header):
+        name = name.strip() or f"column_{i + 1}"
+        base, n = name, 2
+        while name in seen:
+            name, n = f"{base}_{n}", n + 1
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def build_dataset(spool: str, target: str) -> dict:
+    """
+    Разобрать CSV в колонки на диске (синхронно, вызывать в потоке).
+    Первый проход — заголовок, число строк и типы колонок,
+    второй — запись колонок в .npy пачками по DATASET_CHUNK_ROWS.
+    """
+    with _csv_reader(spool) as (rows, delimiter):
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("В файле нет данных")
+        names = _column_names(header)
+        width = len(names)
+        numeric = [True] * width
+        count = 0
+        for values in rows:
+            count += 1
+            for i in range(min(width, len(values))):
+                if numeric[i] and _number(values[i], delimiter) is None:
+                    numeric[i] = False
+    if count == 0:
+        raise ValueError("В файле нет данных")
+
+    os.makedirs(target)
+    arrays = [
+        np.lib.format.open_memmap(
+            os.path.join(target, f"c{i}.npy"), mode="w+",
+            dtype=np.float64 if numeric[i] else np.int32, shape=(count,),
+        )
+        for i in range(width)
+    ]
+    dictionaries: list[dict[str, int]] = [{} for _ in range(width)]
+
+    def flush(chunk: list[list[str]], start: int) -> None:
+        for i in range(width):
+            values = [row[i] if i < len(row) else "" for row in chunk]
+            if numeric[i]:
+                arrays[i][start:start + len(chunk)] = [_number(v, delimiter) for v in values]
+            else:
+                codes = dictionaries[i]
+                arrays[i][start:start + len(chunk)] = [codes.setdefault(v, len(codes)) for v in values]
+
+    with _csv_reader(spool) as (rows, delimiter):
+        next(rows)
+        chunk, position = [], 0
+        for values in rows:
+            chunk.append(values)
+            if len(chunk) == DATASET_CHUNK_ROWS:
+                flush(chunk, position)
+                position += len(chunk)
+                chunk = []
+        if chunk:
+            flush(chunk, position)
+
+    for i, array in enumerate(arrays):
+        array.flush()
+        if not numeric[i]:
+            with open(os.path.join(target, f"c{i}.json"), "w", encoding="utf-8") as f:
+                json.dump(list(dictionaries[i]), f, ensure_ascii=False)
+    del arrays
+
+    size = sum(entry.stat().st_size for entry in os.scandir(target))
+    return {
+        "rows": count,
+        "columns": [{"name": name, "kind": NUMBER if numeric[i] else STRING} for i, name in enumerate(names)],
+        "size_bytes": size,
+    }
+
+
+def remove_dataset_files(dataset_id: str) -> None:
+    _opened.pop(dataset_id)
+    shutil.rmtree(os.path.join(DATASETS_DIR, dataset_id), ignore_errors=True)
+
+
+async def create_dataset(
+    db: AsyncSession,
+    chunks: AsyncIterator[bytes],
+    name: str,
+    file_name: Optional[str],
+    owner_id: int,
+) -> Dataset:
+    """Принять CSV потоком, разложить по колонкам и зарегистрировать набор."""
+    dataset_id = uuid.uuid4().hex
+    os.makedirs(DATASETS_DIR, exist_ok=True)
+    target = os.path.join(DATASETS_DIR, dataset_id)
+    spool = target + ".csv.part"
+    try:
+        await spool_upload(chunks, spool)
+        info = await asyncio.to_thread(build_dataset, spool, target)
+    except (ValueError, csv.Error) as exc:
+        shutil.rmtree(target, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=f"Некорректный CSV: {exc}")
+    except BaseException:
+        shutil.rmtree(target, ignore_errors=True)
+        raise
+    finally:
+        if os.path.exists(spool):
+            os.remove(spool)
+
+    if info["size_bytes"] > DATASETS_QUOTA_BYTES:
+        remove_dataset_files(dataset_id)
+        raise HTTPException(status_code=413, detail="Набор данных больше дисковой квоты")
+
+    dataset = Dataset(id=dataset_id, owner_id=owner_id, name=name, file_name=file_name, **info)
+    db.add(dataset)
+    await db.flush()
+    return dataset
+
+
+async def enforce_quota(db: AsyncSession, keep: str) -> list[str]:
+    """
+    Удалить из БД самые давно использованные наборы, пока сумма не уложится
+    в квоту. Возвращает id удалённых — файлы стираются после commit.
+    """
+    total = await db.scalar(select(func.coalesce(func.sum(Dataset.size_bytes), 0)))
+    if total <= DATASETS_QUOTA_BYTES:
+        return []
+    result = await db.execute(
+        select(Dataset.id, Dataset.size_bytes)
+        .where(Dataset.id != keep)
+        .order_by(Dataset.last_accessed_at, Dataset.created_at)
+    )
+    evicted = []
+    for dataset_id, size in result.all():
+        if total <= DATASETS_QUOTA_BYTES:
+            break
+        evicted.append(dataset_id)
+        total -= size
+    if evicted:
+        await db.execute(delete(Dataset).where(Dataset.id.in_(evicted)))
+    return evicted
+
+
+async def touch_dataset(db: AsyncSession, dataset_id: str) -> None:
+    now = utcnow()
+    await db.execute(
+        update(Dataset)
+        .where(Dataset.id == dataset_id, Dataset.last_accessed_at < now - DATASET_TOUCH_INTERVAL)
+        .values(last_accessed_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+
+# ----------------------------------------
+# Запросы
+# ----------------------------------------
+
+@dataclass
+class DatasetColumn:
+    kind: str
+    values: np.ndarray                      # mmap: float64 или int32-коды
+    dictionary: Optional[list[str]] = None  # для строковых колонок
+    _ranks: Optional[np.ndarray] = None
+
+    def ranks(self) -> np.ndarray:
+        """Место каждого значения словаря в отсортированном порядке (для сортировки строк)."""
+        if self._ranks is None:
+            order = np.argsort(np.asarray(self.dictionary, dtype=object), kind="stable")
+            ranks = np.empty(len(order), dtype=np.int32)
+            ranks[order] = np.arange(len(order), dtype=np.int32)
+            self._ranks = ranks
+        return self._ranks
+
+    def lookup(self, predicate) -> np.ndarray:
+        """Маска строк: predicate считается по словарю, затем разворачивается по кодам."""
+        table = np.fromiter((bool(predicate(v)) for v in self.dictionary), dtype=bool, count=len(self.dictionary))
+        return table[self.values]
+
+    def cells(self, index: np.ndarray) -> list:
+        values = self.values[index].tolist()
+        if self.kind == NUMBER:
+            return [None if v != v else v for v in values]
+        dictionary = self.dictionary
+        return [dictionary[code] for code in values]
+
+
+def open_dataset(dataset: Dataset) -> dict[str, DatasetColumn]:
+    columns = _opened.get(dataset.id)
+    if columns is not None:
+        return columns
+    folder = os.path.join(DATASETS_DIR, dataset.id)
+    if not os.path.isdir(folder):
+        raise HTTPException(status_code=404, detail="Набор данных не найден")
+    columns = {}
+    for i, column in enumerate(dataset.columns):
+        values = np.load(os.path.join(folder, f"c{i}.npy"), mmap_mode="r")
+        dictionary = None
+        if column["kind"] == STRING:
+            with open(os.path.join(folder, f"c{i}.json"), encoding="utf-8") as f:
+                dictionary = json.load(f)
+        columns[column["name"]] = DatasetColumn(column["kind"], values, dictionary)
+    _opened.set(dataset.id, columns)
+    return columns
+
+
+def column_of(columns: dict[str, DatasetColumn], name: str) -> DatasetColumn:
+    """Колонка набора по имени; неизвестное имя — 400."""
+    if name not in columns:
+        raise HTTPException(status_code=400, detail=f"Нет колонки: {name}")
+    return columns[name]
+
+
+def _as_number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Ожидалось число: {value!r}")
+
+
+def filter_condition(column: DatasetColumn, op: str, value: Any) -> np.ndarray:
+    """Булева маска строк для одного фильтра (op из FILTER_OPS)."""
+    if op in ("empty", "not_empty"):
+        if column.kind == NUMBER:
+            mask = np.isnan(column.values)
+        else:
+            mask = column.lookup(lambda v: not v.strip())
+        return mask if op == "empty" else ~mask
+
+    if column.kind == NUMBER:
+        if op == "contains":
+            raise HTTPException(status_code=400, detail="contains применим только к текстовым колонкам")
+        if op == "in":
+            return np.isin(column.values, [_as_number(v) for v in (value or [])])
+        return _COMPARE[op](column.values, _as_number(value))
+
+    if op == "in":
+        wanted = {str(v) for v in (value or [])}
+        return column.lookup(lambda v: v in wanted)
+    if op == "contains":
+        needle = str(value or "").lower()
+        return column.lookup(lambda v: needle in v.lower())
+    target = str(value)
+    compare = _COMPARE[op]
+    return column.lookup(lambda v: compare(v, target))
+
+
+def select_rows(
+    columns: dict[str, DatasetColumn],
+    rows: int,
+    filters: list,
+    search: Optional[str],
+    sort: list[str],
+) -> np.ndarray:
+    """Индексы строк, прошедших фильтры, в порядке сортировки."""
+    mask = None
+    for f in filters:
+        condition = filter_condition(column_of(columns, f.column), f.op, f.value)
+        mask = condition if mask is None else mask & condition
+    if search:
+        # общий поиск — подстрока в любой текстовой колонке
+        needle = search.lower()
+        found = np.zeros(rows, dtype=bool)
+        for column in columns.values():
+            if column.kind == STRING:
+                found |= column.lookup(lambda v: needle in v.lower())
+        mask = found if mask is None else mask & found
+
+    index = np.arange(rows, dtype=np.int64) if mask is None else np.flatnonzero(mask)
+    if sort:
+        keys = []
+        # у np.lexsort главный ключ — последний
+        for spec in reversed(sort):
+            column = column_of(columns, spec.lstrip("-"))
+            key = column.values[index] if column.kind == NUMBER else column.ranks()[column.values[index]]
+            keys.append(-key if spec.startswith("-") else key)
+        index = index[np.lexsort(keys)]
+    return index
+
+
+async def run_query(dataset: Dataset, query) -> dict:
+    """Фильтр, сортировка, проекция и страница. Выборка кэшируется для листания."""
+    columns = open_dataset(dataset)
+    names = query.columns or list(columns)
+    for name in names:
+        column_of(columns, name)
+
+    key = (dataset.id, repr(query.filters), query.search, tuple(query.sort))
+    index = _selections.get(key)
+    if index is None:
+        index = await asyncio.to_thread(select_rows, columns, dataset.rows, query.filters, query.search, query.sort)
+        _selections.set(key, index)
+
+    page = index[query.offset:query.offset + query.limit]
+    return {
+        "columns": names,
+        "total": int(len(index)),
+        "offset": query.offset,
+        "data": [columns[name].cells(page) for name in names],
+    }
+
+
+async def distinct_values(dataset: Dataset, name: str, limit: int) -> list:
+    """Различные значения колонки (для списков выбора в фильтрах)."""
+    column = column_of(open_dataset(dataset), name)
+    # np.unique сортирует всю колонку — в потоке, как и выборки
+    return await asyncio.to_thread(_distinct, column, limit)
+
+
+def _distinct(column: DatasetColumn, limit: int) -> list:
+    if column.kind == STRING:
+        used = np.unique(column.values)
+        values = sorted(column.dictionary[code] for code in used.tolist())
+    else:
+        values = [v for v in np.unique(column.values).tolist() if v == v]
+    return values[:limit]
+
+
+async def iter_dataset_csv(dataset: Dataset, query) -> AsyncIterator[bytes]:
+    """Выборка целиком в CSV, пачками по DATASET_CHUNK_ROWS строк."""
+    columns = open_dataset(dataset)
+    names = query.columns or list(columns)
+    index = await asyncio.to_thread(select_rows, columns, dataset.rows, query.filters, query.search, query.sort)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    yield buffer.getvalue().encode()
+    for start in range(0, len(index), DATASET_CHUNK_ROWS):
+        part = index[start:start + DATASET_CHUNK_ROWS]
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(zip(*[columns[name].cells(part) for name in names]))
+        yield buffer.getvalue().encode()
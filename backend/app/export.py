@@ -0,0 +1,78 @@
+# app/export.py
+
+import csv
+import io
+import zlib
+from typing import AsyncIterator
+
+import orjson
+from fastapi.responses import StreamingResponse
+
+from app.database import AsyncSessionLocal
+
+# Экспорт идёт потоком: строки читаются серверным курсором пачками
+# по EXPORT_CHUNK_ROWS и сразу уходят клиенту (chunked transfer),
+# поэтому память не зависит от размера выгрузки.
+EXPORT_CHUNK_ROWS = 1000
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return orjson.dumps(value).decode()
+    return value
+
+
+def _encode_csv(columns: list[str], rows, header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    writer.writerows([_csv_value(v) for v in row] for row in rows)
+    return buffer.getvalue().encode()
+
+
+def _encode_ndjson(columns: list[str], rows) -> bytes:
+    return b"".join(orjson.dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+async def iter_export(query, fmt: str) -> AsyncIterator[bytes]:
+    # Сессия открывается внутри генератора: сессия из get_db закрывается
+    # раньше, чем StreamingResponse начнёт отдавать тело.
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(query.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+        columns = list(result.keys())
+        if fmt == "csv":
+            # заголовок отдаём даже для пустой выгрузки
+            yield _encode_csv(columns, [], header=True)
+        async for rows in result.partitions(EXPORT_CHUNK_ROWS):
+            if fmt == "csv":
+                yield _encode_csv(columns, rows, header=False)
+            else:
+                yield _encode_ndjson(columns, rows)
+
+
+async def _gzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(query, fmt: str, compress: bool, filename: str) -> StreamingResponse:
+    """
+    StreamingResponse с выгрузкой запроса в CSV или NDJSON.
+    query должен выбирать колонки (select(*Model.__table__.c)), а не ORM-объекты.
+    """
+    body = iter_export(query, fmt)
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    if compress:
+        body = _gzip(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=EXPORT_MEDIA_TYPES[fmt], headers=headers)
@@ -0,0 +1,84 @@
+# app/hashing.py
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from prometheus_client import Counter, Gauge, Histogram
+
+# bcrypt — CPU-тяжёлая операция; её нельзя выполнять прямо в event loop.
+# Хеширование идёт в отдельном пуле потоков (bcrypt отпускает GIL),
+# одновременно работает не больше HASH_CONCURRENCY операций, а в очереди
+# ждут не больше HASH_QUEUE_LIMIT — остальные получают 503.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_CONCURRENCY = int(os.getenv("HASH_CONCURRENCY", "2"))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+HASH_LATENCY = Histogram(
+    "password_hash_seconds", "Время bcrypt-операции в пуле", ["operation"],
+    buckets=(0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 1, 2, 5),
+)
+HASH_QUEUE_WAIT = Histogram(
+    "password_hash_queue_wait_seconds", "Ожидание свободного потока хеширования", ["operation"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+HASH_IN_FLIGHT = Gauge("password_hash_in_flight", "Операции хеширования в работе и в очереди")
+HASH_REJECTED = Counter("password_hash_rejected_total", "Отказы из-за переполненной очереди", ["operation"])
+
+_executor = ThreadPoolExecutor(max_workers=HASH_CONCURRENCY, thread_name_prefix="bcrypt")
+_pending = 0
+
+
+async def _run_in_pool(operation: str, fn, *args):
+    global _pending
+    if _pending >= HASH_CONCURRENCY + HASH_QUEUE_LIMIT:
+        HASH_REJECTED.labels(operation).inc()
+        raise HTTPException(
+            status_code=503,
+            detail="Сервер перегружен, повторите попытку позже",
+            headers={"Retry-After": "1"},
+        )
+
+    submitted = time.perf_counter()
+
+    def job():
+        started = time.perf_counter()
+        HASH_QUEUE_WAIT.labels(operation).observe(started - submitted)
+        try:
+            return fn(*args)
+        finally:
+            HASH_LATENCY.labels(operation).observe(time.perf_counter() - started)
+
+    _pending += 1
+    HASH_IN_FLIGHT.inc()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, job)
+    finally:
+        _pending -= 1
+        HASH_IN_FLIGHT.dec()
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_in_pool("hash", pwd_context.hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_pool("verify", pwd_context.verify, plain_password, hashed_password)
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """
+    Проверка пароля; если хеш сделан с другим BCRYPT_ROUNDS,
+    вторым элементом возвращается новый хеш для сохранения.
+    """
+    return await _run_in_pool("verify", pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+def shutdown_hashing() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
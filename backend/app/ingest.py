@@ -0,0 +1,176 @@
+# app/ingest.py
+
+import codecs
+import csv
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import utcnow
+
+# Потоковый импорт CSV: тело запроса разбирается по мере поступления,
+# строки валидируются схемой и пишутся пачками по IMPORT_BATCH_SIZE.
+# На asyncpg пачка идёт через COPY, на остальных драйверах — executemany INSERT.
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100"))
+
+
+class _LineFeed:
+    """Итератор строк для csv.reader, который пополняется снаружи."""
+
+    def __init__(self):
+        self.lines: deque[str] = deque()
+
+    def __iter__(self) -> Iterator[str]:
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+async def iter_csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, list[str]]]:
+    """
+    Разбирает CSV из потока байтов, не собирая файл целиком в памяти.
+    Отдаёт (номер строки файла, значения). Заголовок — первая запись.
+    Разделитель (',' или ';') определяется по первой строке.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    feed = _LineFeed()
+    reader = None
+    tail = ""
+    record = ""
+    quotes = 0
+    line_no = 0
+
+    async def decoded():
+        async for chunk in chunks:
+            yield decoder.decode(chunk)
+        yield decoder.decode(b"", final=True) + "\n"
+
+    async for text in decoded():
+        parts = (tail + text).split("\n")
+        tail = parts.pop()
+        for line in parts:
+            line_no += 1
+            record += line + "\n"
+            quotes += line.count('"')
+            # запись закончена, только если все кавычки закрыты
+            if quotes % 2:
+                continue
+            if not record.strip():
+                record, quotes = "", 0
+                continue
+            if reader is None:
+                header_line = record.rstrip("\r\n")
+                delimiter = ";" if header_line.count(";") > header_line.count(",") else ","
+                reader = csv.reader(feed, delimiter=delimiter)
+            feed.lines.append(record)
+            record, quotes = "", 0
+            for values in reader:
+                yield line_no, values
+
+
+async def import_rows(
+    db: AsyncSession,
+    chunks: AsyncIterator[bytes],
+    schema: type[BaseModel],
+    table,
+    on_batch: Optional[Callable[[AsyncSession, list[dict]], Awaitable[None]]] = None,
+) -> dict:
+    """
+    Импортирует CSV в таблицу: каждая строка проверяется схемой, ошибочные
+    строки пропускаются и попадают в отчёт, остальные пишутся пачками.
+    Пачка и on_batch (агрегаты, события) — одна транзакция сессии db.
+    """
+    started = time.perf_counter()
+    columns = list(schema.__fields__)
+    stats = {
+        "rows_total": 0,
+        "rows_imported": 0,
+        "rows_failed": 0,
+        "batches": 0,
+        "errors": [],
+        "errors_truncated": False,
+        "loader": "copy" if db.get_bind().dialect.driver == "asyncpg" else "insert",
+    }
+    header = None
+    batch: list[dict] = []
+
+    async for line_no, values in iter_csv_records(chunks):
+        if header is None:
+            header = [h.strip() for h in values]
+            missing = [c for c in columns if c not in header]
+            if missing:
+                stats["errors"].append({"line": line_no, "errors": [f"нет колонок: {', '.join(missing)}"]})
+                break
+            continue
+
+        stats["rows_total"] += 1
+        try:
+            row = schema(**dict(zip(header, values)))
+        except ValidationError as exc:
+            stats["rows_failed"] += 1
+            if len(stats["errors"]) < IMPORT_MAX_ERRORS:
+                stats["errors"].append({
+                    "line": line_no,
+                    "errors": [f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in exc.errors()],
+                })
+            else:
+                stats["errors_truncated"] = True
+            continue
+
+        batch.append(row.dict())
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await _commit_batch(db, table, columns, batch, on_batch)
+            stats["rows_imported"] += len(batch)
+            stats["batches"] += 1
+            batch = []
+
+    if batch:
+        await _commit_batch(db, table, columns, batch, on_batch)
+        stats["rows_imported"] += len(batch)
+        stats["batches"] += 1
+
+    elapsed = time.perf_counter() - started
+    stats["elapsed_seconds"] = round(elapsed, 3)
+    stats["rows_per_second"] = round(stats["rows_total"] / elapsed, 1) if elapsed else 0.0
+    return stats
+
+
+async def _commit_batch(db: AsyncSession, table, columns: list[str], rows: list[dict], on_batch) -> None:
+    # при ошибке транзакция откатывается целиком при закрытии сессии
+    await load_batch(db, table, columns, rows)
+    if on_batch:
+        await on_batch(db, rows)
+    await db.commit()
+
+
+async def load_batch(db: AsyncSession, table, columns: list[str], rows: list[dict]) -> None:
+    """
+    Пишет пачку в текущую транзакцию сессии (фиксирует вызывающий):
+    COPY на asyncpg, иначе executemany INSERT.
+    """
+    conn = await db.connection()
+    if conn.dialect.driver == "asyncpg":
+        # адаптер asyncpg открывает транзакцию лениво, на первом запросе;
+        # без него COPY прошёл бы в autocommit, мимо транзакции сессии
+        await conn.execute(text("SELECT 1"))
+        raw = await conn.get_raw_connection()
+        # COPY не применяет default модели: updated_at (курсор /changes)
+        # проставляется явно
+        stamped = ["updated_at"] if "updated_at" in table.c and "updated_at" not in columns else []
+        now = utcnow()
+        await raw.driver_connection.copy_records_to_table(
+            table.name,
+            columns=[*columns, *stamped],
+            records=[tuple(row[c] for c in columns) + (now,) * len(stamped) for row in rows],
+        )
+    else:
+        await conn.execute(insert(table), rows)
@@ -0,0 +1,174 @@
+# app/instrumentation.py
+
+import logging
+import os
+import time
+from collections import Counter as StatementCounter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+from prometheus_client import Counter, Histogram
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Метрики запросов: чистый ASGI-middleware замеряет длительность и статус
+# по шаблону маршрута (/equipment/{item_id}, а не конкретный id), а хуки
+# SQLAlchemy считают выражения и время в БД. Счётчики текущего запроса
+# лежат в contextvar — хуки выполняются в той же задаче, что и обработчик.
+#   SLOW_QUERY_MS      — выражения дольше порога пишутся в лог
+#   SLOW_REQUEST_MS    — запросы дольше порога пишутся в лог с числом выражений
+#   N_PLUS_ONE_THRESHOLD — одно и то же выражение столько раз за запрос = N+1
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Длительность запроса", ["method", "route"],
+    buckets=_LATENCY_BUCKETS,
+)
+HTTP_REQUESTS = Counter("http_requests_total", "Запросы по статусу ответа", ["method", "route", "status"])
+HTTP_DB_STATEMENTS = Histogram(
+    "http_request_db_statements", "SQL-выражений за запрос", ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500),
+)
+HTTP_DB_TIME = Histogram(
+    "http_request_db_seconds", "Время в БД за запрос", ["method", "route"],
+    buckets=_LATENCY_BUCKETS,
+)
+DB_SLOW_QUERIES = Counter("db_slow_queries_total", "Выражения дольше SLOW_QUERY_MS", ["route", "engine"])
+DB_N_PLUS_ONE = Counter("db_n_plus_one_total", "Запросы с повторяющимся выражением (N+1)", ["route"])
+
+
+@dataclass
+class RequestStats:
+    """Счётчики БД одного запроса. Изменяется на месте из хуков SQLAlchemy."""
+    scope: dict = field(default_factory=dict, repr=False)
+    statements: int = 0
+    db_time: float = 0.0
+    repeats: StatementCounter = field(default_factory=StatementCounter)
+    n_plus_one: Optional[str] = None
+    # (выражение, длительность) каждого запроса к БД — только при профилировании
+    queries: Optional[list] = None
+
+    @property
+    def route(self) -> str:
+        return _route_template(self.scope)
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+# ----------------------------------------
+# Хуки SQLAlchemy
+# ----------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany, engine_label="primary"):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current.get()
+    route = stats.route if stats else "background"
+    if stats is not None:
+        stats.statements += 1
+        stats.db_time += elapsed
+        stats.repeats[statement] += 1
+        if stats.queries is not None:
+            stats.queries.append((statement, elapsed))
+        if stats.n_plus_one is None and stats.repeats[statement] >= N_PLUS_ONE_THRESHOLD:
+            stats.n_plus_one = statement
+            DB_N_PLUS_ONE.labels(route).inc()
+            logger.warning(
+                "Возможный N+1 в %s: выражение выполнено %d раз: %s",
+                route, N_PLUS_ONE_THRESHOLD, shorten_statement(statement),
+            )
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        DB_SLOW_QUERIES.labels(route, engine_label).inc()
+        logger.warning(
+            "Медленный запрос (%.1f мс, %s) в %s: %s",
+            elapsed * 1000, engine_label, route, shorten_statement(statement),
+        )
+
+
+def shorten_statement(statement: str, limit: int = 500) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "…"
+
+
+def install_db_hooks(engine, label: str = "primary") -> None:
+    """
+    Подключить хуки к движку (AsyncEngine или обычному). Счётчики запроса
+    общие для всех движков, label различает их в медленных выражениях.
+    """
+    target = getattr(engine, "sync_engine", engine)
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _after_cursor_execute(conn, cursor, statement, parameters, context, executemany, label)
+
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", after_cursor_execute)
+
+
+# ----------------------------------------
+# Middleware
+# ----------------------------------------
+
+def _route_template(scope) -> str:
+    # маршрут FastAPI кладёт в scope при сопоставлении
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is None:
+        return "unmatched"
+    return scope.get("root_path", "") + path
+
+
+class InstrumentationMiddleware:
+    """
+    Чистый ASGI-middleware: в отличие от BaseHTTPMiddleware не буферизует
+    потоковые ответы (экспорт, живая лента) и не добавляет задачу на запрос.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - started
+            route = stats.route
+            method = scope["method"]
+            HTTP_LATENCY.labels(method, route).observe(elapsed)
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+            HTTP_DB_STATEMENTS.labels(method, route).observe(stats.statements)
+            HTTP_DB_TIME.labels(method, route).observe(stats.db_time)
+            if elapsed * 1000 >= SLOW_REQUEST_MS:
+                logger.warning(
+                    "Медленный запрос %s %s: %.1f мс, SQL: %d выражений, %.1f мс",
+                    method, route, elapsed * 1000, stats.statements, stats.db_time * 1000,
+                )
@@ -0,0 +1,264 @@
+# app/live.py
+
+import asyncio
+import logging
+import os
+import time
+from typing import Iterable, Optional
+
+import orjson
+from prometheus_client import Counter, Gauge
+from fastapi import WebSocket, WebSocketDisconnect, status
+from sqlalchemy import event, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import Session
+
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Живая лента изменений equipment.
+# Обработчики вызывают emit() до commit: на PostgreSQL событие уходит через
+# NOTIFY (доставляется только после commit и во все воркеры — каждый воркер
+# слушает канал), на других БД публикуется локально после commit.
+# Каждый клиент получает события через свою ограниченную очередь;
+# если клиент не успевает читать и очередь переполнилась — он отключается.
+# Соединение LISTEN переподключается с нарастающей паузой; после
+# переподключения клиентам уходит "resync" — события за разрыв потеряны.
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "256"))
+LIVE_RECONNECT_MIN = float(os.getenv("LIVE_RECONNECT_MIN", "0.5"))
+LIVE_RECONNECT_MAX = float(os.getenv("LIVE_RECONNECT_MAX", "30"))
+LIVE_PING_INTERVAL = float(os.getenv("LIVE_PING_INTERVAL", "15"))   # проверка «тихо оборванного» соединения
+LIVE_CONNECT_TIMEOUT = float(os.getenv("LIVE_CONNECT_TIMEOUT", "5"))
+LIVE_CHANNEL = "equipment_events"
+NOTIFY_PAYLOAD_LIMIT = 7900  # лимит NOTIFY в PostgreSQL — 8000 байт
+
+LIVE_CLIENTS = Gauge("live_clients", "Подключённые клиенты живой ленты")
+LIVE_EVENTS = Counter("live_events_total", "События, разосланные живой лентой")
+LIVE_DROPPED = Counter("live_clients_dropped_total", "Клиенты, отключённые из-за переполненной очереди")
+LIVE_LISTENER_UP = Gauge("live_listener_up", "Соединение LISTEN живой ленты открыто")
+LIVE_RECONNECTS = Counter("live_listener_reconnects_total", "Переподключения LISTEN живой ленты")
+
+_DROPPED = object()
+
+
+class Subscriber:
+    def __init__(self, devices: Optional[set[str]]):
+        self.devices = devices          # None — все устройства
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+
+    def wants(self, names: Optional[list[str]]) -> bool:
+        if self.devices is None or names is None:
+            return True
+        return not self.devices.isdisjoint(names)
+
+
+class LiveHub:
+    def __init__(self):
+        self._subscribers: set[Subscriber] = set()
+        self._listener = None
+        self._task: Optional[asyncio.Task] = None
+        self._lost = asyncio.Event()
+        self.connected = False
+        self.error: Optional[str] = None      # только тип, текст — в логе
+        self.connected_at: Optional[float] = None
+        self.reconnects = 0
+
+    def subscribe(self, devices: Optional[set[str]] = None) -> Subscriber:
+        subscriber = Subscriber(devices)
+        self._subscribers.add(subscriber)
+        LIVE_CLIENTS.set(len(self._subscribers))
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+        LIVE_CLIENTS.set(len(self._subscribers))
+
+    def publish(self, payload: str) -> None:
+        """Рассылка уже сериализованного события всем подписчикам воркера."""
+        names = orjson.loads(payload).get("names")
+        for subscriber in list(self._subscribers):
+            if not subscriber.wants(names):
+                continue
+            try:
+                subscriber.queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+        LIVE_EVENTS.inc()
+
+    def _drop(self, subscriber: Subscriber) -> None:
+        # медленный клиент: очищаем очередь и оставляем только сигнал отключения
+        self.unsubscribe(subscriber)
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(_DROPPED)
+        LIVE_DROPPED.inc()
+
+    @property
+    def enabled(self) -> bool:
+        return engine.dialect.name == "postgresql"
+
+    async def start(self) -> None:
+        """На PostgreSQL подписывает воркер на канал NOTIFY отдельным соединением."""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self._close()
+
+    async def _run(self) -> None:
+        delay = LIVE_RECONNECT_MIN
+        while True:
+            try:
+                await self._connect()
+            except Exception as e:  # база недоступна, тайм-аут и т.п.
+                self._mark_lost(e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, LIVE_RECONNECT_MAX)
+                continue
+            delay = LIVE_RECONNECT_MIN
+            await self._watch()
+            await self._close()
+
+    async def _connect(self) -> None:
+        import asyncpg
+
+        dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        self._lost.clear()
+        listener = await asyncpg.connect(dsn, timeout=LIVE_CONNECT_TIMEOUT)
+        self._listener = listener
+        listener.add_termination_listener(self._on_terminated)
+        await listener.add_listener(LIVE_CHANNEL, self._on_notify)
+        if self.connected_at is not None:
+            logger.info("Живая лента: LISTEN восстановлен")
+            self.reconnects += 1
+            LIVE_RECONNECTS.inc()
+            # за время разрыва события могли потеряться — клиенты перечитывают данные
+            self.publish(encode_event("resync", None))
+        self.connected, self.error, self.connected_at = True, None, time.time()
+        LIVE_LISTENER_UP.set(1)
+
+    async def _watch(self) -> None:
+        """Ждёт разрыва; termination listener не видит «тихий» обрыв TCP — отсюда пинг."""
+        while True:
+            try:
+                await asyncio.wait_for(self._lost.wait(), LIVE_PING_INTERVAL)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self._listener.execute("SELECT 1", timeout=LIVE_CONNECT_TIMEOUT)
+            except Exception as e:
+                self._mark_lost(e)
+                return
+
+    async def _close(self) -> None:
+        listener, self._listener = self._listener, None
+        if listener is not None and not listener.is_closed():
+            listener.terminate()
+
+    def _mark_lost(self, error: BaseException) -> None:
+        if self.connected or self.error is None:
+            logger.warning("Живая лента: нет соединения LISTEN: %s: %s", type(error).__name__, error)
+        self.connected, self.error = False, type(error).__name__
+        LIVE_LISTENER_UP.set(0)
+        self._lost.set()
+
+    def _on_terminated(self, connection) -> None:
+        if connection is self._listener:
+            self._mark_lost(ConnectionError("соединение закрыто"))
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self.publish(payload)
+
+    def status(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        body = {"enabled": True, "connected": self.connected, "reconnects": self.reconnects}
+        if self.error:
+            body["error"] = self.error
+        return body
+
+
+live_hub = LiveHub()
+
+
+def parse_devices(value) -> Optional[set[str]]:
+    """'A1,A2' или список → множество устройств; пусто/None — все устройства."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    devices = {str(v).strip() for v in value if str(v).strip()}
+    return devices or None
+
+
+async def serve(websocket: WebSocket, subscriber: Subscriber) -> None:
+    """
+    Обслуживание одного клиента: отправка событий из его очереди и приём
+    сообщений {"devices": [...]} (null — все устройства) для смены подписки.
+    """
+    async def send():
+        while True:
+            payload = await subscriber.queue.get()
+            if payload is _DROPPED:
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+                return
+            await websocket.send_text(payload)
+
+    async def receive():
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except ValueError:
+                continue
+            if isinstance(message, dict) and "devices" in message:
+                subscriber.devices = parse_devices(message["devices"])
+
+    tasks = [asyncio.create_task(send()), asyncio.create_task(receive())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            exc = task.exception()
+            if exc and not isinstance(exc, WebSocketDisconnect):
+                logger.warning("Ошибка живой ленты: %r", exc)
+    finally:
+        for task in tasks:
+            task.cancel()
+        live_hub.unsubscribe(subscriber)
+
+
+def encode_event(kind: str, names: Optional[Iterable[str]], **data) -> str:
+    names = sorted(set(names)) if names is not None else None
+    payload = orjson.dumps({"type": kind, "names": names, **data}).decode()
+    if len(payload.encode()) > NOTIFY_PAYLOAD_LIMIT:
+        # слишком большое событие (массовый импорт) — шлём без подробностей всем
+        payload = orjson.dumps({"type": kind, "names": None, "count": data.get("count")}).decode()
+    return payload
+
+
+async def emit(db: AsyncSession, kind: str, names: Optional[Iterable[str]], **data) -> None:
+    """
+    Поставить событие в транзакцию db: клиенты получат его только
+    после успешного commit. names — устройства, которых оно касается.
+    """
+    payload = encode_event(kind, names, **data)
+    if db.get_bind().dialect.name == "postgresql":
+        await db.execute(select(func.pg_notify(LIVE_CHANNEL, payload)))
+    else:
+        db.info.setdefault("live_events", []).append(payload)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session) -> None:
+    for payload in session.info.pop("live_events", ()):
+        live_hub.publish(payload)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session) -> None:
+    session.info.pop("live_events", None)
@@ -0,0 +1,131 @@
+# app/log_buffer.py
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Optional
+
+from fastapi import HTTPException
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import insert
+
+from app.database import AsyncSessionLocal
+from app.models import DataLog
+from app.versions import bump_version
+
+logger = logging.getLogger(__name__)
+
+# Write-behind буфер для DataLog: POST /logs/ только кладёт запись в очередь,
+# фоновая задача пишет накопленное одним многострочным INSERT — когда набралось
+# LOG_FLUSH_BATCH записей или прошло LOG_FLUSH_INTERVAL секунд.
+# Очередь ограничена LOG_BUFFER_SIZE: при переполнении запрос ждёт до
+# LOG_ENQUEUE_TIMEOUT секунд и затем получает 503.
+LOG_BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", "10000"))
+LOG_FLUSH_BATCH = int(os.getenv("LOG_FLUSH_BATCH", "500"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "1.0"))
+LOG_ENQUEUE_TIMEOUT = float(os.getenv("LOG_ENQUEUE_TIMEOUT", "2.0"))
+LOG_FLUSH_RETRIES = 3
+
+_STOP = object()
+
+LOG_BUFFER_DEPTH = Gauge("log_buffer_depth", "Записи DataLog, ожидающие записи в БД")
+LOG_BUFFER_FLUSHED = Counter("log_buffer_flushed_total", "Записи DataLog, записанные буфером")
+LOG_BUFFER_DROPPED = Counter("log_buffer_dropped_total", "Записи DataLog, потерянные после ошибок записи")
+LOG_BUFFER_REJECTED = Counter("log_buffer_rejected_total", "Отказы из-за переполненного буфера")
+LOG_BUFFER_BATCH = Histogram(
+    "log_buffer_batch_size", "Размер пачки при сбросе буфера",
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 5000),
+)
+
+
+class LogBuffer:
+    def __init__(self, maxsize: int, batch_size: int, interval: float):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает фоновую задачу, дописав всё, что осталось в очереди."""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def put(self, record: dict[str, Any]) -> None:
+        if self._task is None:
+            # буфер не запущен (например, в скриптах) — пишем сразу
+            await self._flush([record])
+            return
+        try:
+            await asyncio.wait_for(self._queue.put(record), timeout=LOG_ENQUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            LOG_BUFFER_REJECTED.inc()
+            raise HTTPException(
+                status_code=503,
+                detail="Буфер логов переполнен, повторите попытку позже",
+                headers={"Retry-After": "1"},
+            )
+        LOG_BUFFER_DEPTH.set(self._queue.qsize())
+
+    def _take(self, limit: int) -> list[dict[str, Any]]:
+        records = []
+        while len(records) < limit and not self._queue.empty():
+            records.append(self._queue.get_nowait())
+        LOG_BUFFER_DEPTH.set(self._queue.qsize())
+        return records
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            records = []
+            item = await self._queue.get()
+            if item is _STOP:
+                stopping = True
+            else:
+                records.append(item)
+            deadline = time.monotonic() + self.interval
+            while not stopping and len(records) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                else:
+                    records.append(item)
+            LOG_BUFFER_DEPTH.set(self._queue.qsize())
+            await self._flush(records)
+        # после сигнала остановки дописываем то, что успели положить
+        while not self._queue.empty():
+            await self._flush(self._take(self.batch_size))
+
+    async def _flush(self, records: list[dict[str, Any]]) -> None:
+        if not records:
+            return
+        for attempt in range(1, LOG_FLUSH_RETRIES + 1):
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(insert(DataLog).values(records))
+                    await bump_version(db, "data_logs")
+                    await db.commit()
+                LOG_BUFFER_FLUSHED.inc(len(records))
+                LOG_BUFFER_BATCH.observe(len(records))
+                return
+            except Exception:
+                logger.exception("Не удалось записать %d логов (попытка %d)", len(records), attempt)
+                await asyncio.sleep(0.5 * attempt)
+        LOG_BUFFER_DROPPED.inc(len(records))
+
+
+log_buffer = LogBuffer(LOG_BUFFER_SIZE, LOG_FLUSH_BATCH, LOG_FLUSH_INTERVAL)
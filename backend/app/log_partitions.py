@@ -0,0 +1,325 @@
+# app/log_partitions.py
+
+import asyncio
+import gzip
+import logging
+import os
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+import orjson
+from prometheus_client import Counter
+from sqlalchemy import MetaData, PrimaryKeyConstraint, delete, func, inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.future import select
+
+from app.database import AsyncSessionLocal, engine
+from app.models import DataLog
+from app.serialize import JSON_OPTIONS
+from app.versions import bump_version
+
+logger = logging.getLogger(__name__)
+
+# Секционирование и срок хранения data_logs по месяцам created_at (UTC).
+# В PostgreSQL новая таблица создаётся секционированной (PARTITION BY RANGE,
+# первичный ключ (id, created_at)): секция на месяц data_logs_pYYYYMM
+# заводится заранее на LOG_PARTITION_MONTHS_AHEAD месяцев вперёд, строки
+# вне секций попадают в data_logs_default. Запросы с условием на created_at
+# (фильтр start/end, курсор истории) читают только нужные секции, а
+# сортировка по created_at без фильтра идёт по секциям от новых к старым.
+# Срок хранения по умолчанию не ограничен (LOG_RETENTION_MONTHS=0): логи
+# не удаляются, пока его не задать явно. Чтобы включить, укажите в .env
+# число месяцев, например LOG_RETENTION_MONTHS=12, — текущий месяц и
+# 12 полных предыдущих остаются, более ранние уходят в архив при следующем
+# обслуживании (раз в LOG_MAINTENANCE_INTERVAL секунд и при старте).
+# Месяцы старше LOG_RETENTION_MONTHS сначала выгружаются в
+# LOG_ARCHIVE_DIR/data_logs_YYYY-MM_<метка>.ndjson.gz, затем секция
+# отсоединяется и удаляется целиком — без построчного DELETE.
+# SQLite и таблица, созданная до секционирования, секций не имеют: там
+# просроченный месяц после выгрузки удаляется пачками по LOG_DELETE_CHUNK
+# строк (по индексу created_at). Удалённые так строки не оставляют
+# надгробий — клиент с локальной копией увидит это после полной загрузки.
+LOG_PARTITIONING = os.getenv("LOG_PARTITIONING", "true").lower() in ("1", "true", "yes")
+LOG_PARTITION_MONTHS_AHEAD = int(os.getenv("LOG_PARTITION_MONTHS_AHEAD", "3"))
+LOG_RETENTION_MONTHS = int(os.getenv("LOG_RETENTION_MONTHS", "0"))      # 0 — хранить всё
+LOG_ARCHIVE = os.getenv("LOG_ARCHIVE", "true").lower() in ("1", "true", "yes")
+LOG_ARCHIVE_DIR = os.getenv("LOG_ARCHIVE_DIR", "data/archive/data_logs")
+LOG_ARCHIVE_CHUNK = int(os.getenv("LOG_ARCHIVE_CHUNK", "5000"))
+LOG_DELETE_CHUNK = int(os.getenv("LOG_DELETE_CHUNK", "5000"))
+LOG_MAINTENANCE_INTERVAL = float(os.getenv("LOG_MAINTENANCE_INTERVAL", "3600"))
+
+TABLE = DataLog.__tablename__
+DEFAULT_PARTITION = f"{TABLE}_default"
+_PARTITION_NAME = re.compile(rf"^{TABLE}_p(\d{{4}})(\d{{2}})$")
+# одно обслуживание на все воркеры (pg_try_advisory_lock)
+_ADVISORY_LOCK_KEY = 0x64617461   # "data"
+
+LOG_ARCHIVED = Counter("log_archived_rows_total", "Строки data_logs, выгруженные в архив")
+LOG_EXPIRED = Counter("log_expired_rows_total", "Строки data_logs, удалённые по сроку хранения", ["method"])
+
+
+def month_start(moment: datetime) -> datetime:
+    return moment.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(moment: datetime, months: int) -> datetime:
+    year, month = divmod(moment.month - 1 + months, 12)
+    return moment.replace(year=moment.year + year, month=month + 1)
+
+
+def partition_name(start: datetime) -> str:
+    return f"{TABLE}_p{start:%Y%m}"
+
+
+def _is_postgres() -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+# ----------------------------------------
+# Секции (только PostgreSQL)
+# ----------------------------------------
+
+async def _is_partitioned(conn) -> bool:
+    result = await conn.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name))"),
+        {"name": TABLE},
+    )
+    return bool(result.scalar())
+
+
+def _create_partitioned_table(sync_conn) -> None:
+    """
+    data_logs по описанию модели, но с ключом (id, created_at) — в
+    секционированной таблице ключ обязан включать колонку секционирования.
+    """
+    source = DataLog.__table__
+    referred = [fk.column.table for fk in source.foreign_keys]
+    source.metadata.create_all(sync_conn, tables=referred)
+
+    metadata = MetaData()
+    for table in referred:
+        table.to_metadata(metadata)
+    table = source.to_metadata(metadata)
+    table.c.id.autoincrement = True
+    table.c.created_at.primary_key = True
+    table.append_constraint(PrimaryKeyConstraint(table.c.id, table.c.created_at))
+    table.dialect_options["postgresql"]["partition_by"] = "RANGE (created_at)"
+    table.create(sync_conn)
+    sync_conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+
+
+async def _list_partitions(conn) -> dict[datetime, str]:
+    result = await conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:name)"
+        ),
+        {"name": TABLE},
+    )
+    partitions = {}
+    for (name,) in result:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions[datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc)] = name
+    return partitions
+
+
+async def ensure_partitions() -> None:
+    """Секции с текущего месяца на LOG_PARTITION_MONTHS_AHEAD вперёд."""
+    current = month_start(datetime.now(timezone.utc))
+    async with engine.connect() as conn:
+        existing = await _list_partitions(conn)
+    for offset in range(LOG_PARTITION_MONTHS_AHEAD + 1):
+        start = add_months(current, offset)
+        if start in existing:
+            continue
+        end = add_months(start, 1)
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF {TABLE} "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                ))
+        except DBAPIError as e:
+            # в data_logs_default уже есть строки этого месяца
+            logger.warning("Не удалось создать секцию %s: %s", partition_name(start), e.orig)
+
+
+async def prepare_log_partitions() -> None:
+    """
+    До init_db: в PostgreSQL создать data_logs секционированной (create_all
+    пропустит уже существующую таблицу) и завести секции вперёд.
+    """
+    if not LOG_PARTITIONING or not _is_postgres():
+        return
+    async with engine.begin() as conn:
+        exists = await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table(TABLE))
+        if exists and not await _is_partitioned(conn):
+            logger.warning(
+                "%s создана без секционирования: просроченные логи удаляются пачками; "
+                "для секций пересоздайте таблицу с переносом данных", TABLE,
+            )
+            return
+        if not exists:
+            await conn.run_sync(_create_partitioned_table)
+    await ensure_partitions()
+
+
+# ----------------------------------------
+# Архив и срок хранения
+# ----------------------------------------
+
+async def archive_month(start: datetime) -> tuple[Optional[str], int]:
+    """Выгрузить строки месяца в gzip NDJSON; (путь, число строк)."""
+    end = add_months(start, 1)
+    os.makedirs(LOG_ARCHIVE_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(LOG_ARCHIVE_DIR, f"{TABLE}_{start:%Y-%m}_{stamp}.ndjson.gz")
+    tmp_path = f"{path}.tmp"
+    query = (
+        select(*DataLog.__table__.columns)
+        .where(DataLog.created_at >= start, DataLog.created_at < end)
+        .order_by(DataLog.created_at, DataLog.id)
+        .execution_options(yield_per=LOG_ARCHIVE_CHUNK)
+    )
+    count = 0
+    try:
+        with gzip.open(tmp_path, "wb") as archive:
+            async with AsyncSessionLocal() as db:
+                result = await db.stream(query)
+                async for rows in result.partitions():
+                    lines = b"".join(
+                        orjson.dumps(dict(row._mapping), option=JSON_OPTIONS) + b"\n" for row in rows
+                    )
+                    # сжатие — в потоке, не в event loop
+                    await asyncio.to_thread(archive.write, lines)
+                    count += len(rows)
+        if count == 0:
+            os.remove(tmp_path)
+            return None, 0
+        # архив должен лечь на диск до удаления строк
+        with open(tmp_path, "rb") as written:
+            os.fsync(written.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    LOG_ARCHIVED.inc(count)
+    return path, count
+
+
+async def _drop_partition(name: str) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+        await conn.execute(text(f"DROP TABLE {name}"))
+
+
+async def _delete_month(start: datetime) -> int:
+    """Построчное удаление месяца пачками (без секций и для data_logs_default)."""
+    end = add_months(start, 1)
+    removed = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            chunk = (
+                select(DataLog.id)
+                .where(DataLog.created_at >= start, DataLog.created_at < end)
+                .limit(LOG_DELETE_CHUNK)
+                .scalar_subquery()
+            )
+            result = await db.execute(
+                delete(DataLog).where(DataLog.id.in_(chunk)).execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        removed += result.rowcount or 0
+        if not result.rowcount:
+            return removed
+
+
+async def _expired_months(cutoff: datetime) -> list[datetime]:
+    async with AsyncSessionLocal() as db:
+        oldest = (await db.execute(select(func.min(DataLog.created_at)).where(DataLog.created_at < cutoff))).scalar()
+    if oldest is None:
+        return []
+    if oldest.tzinfo is None:   # SQLite возвращает наивное время в UTC
+        oldest = oldest.replace(tzinfo=timezone.utc)
+    months, start = [], month_start(oldest)
+    while start < cutoff:
+        months.append(start)
+        start = add_months(start, 1)
+    return months
+
+
+async def expire_logs() -> dict:
+    """Выгрузить и удалить месяцы старше LOG_RETENTION_MONTHS."""
+    summary = {"months": [], "archived": 0, "removed": 0, "files": []}
+    if LOG_RETENTION_MONTHS <= 0:
+        return summary
+    cutoff = add_months(month_start(datetime.now(timezone.utc)), -LOG_RETENTION_MONTHS)
+    partitions = {}
+    if _is_postgres():
+        async with engine.connect() as conn:
+            if await _is_partitioned(conn):
+                partitions = await _list_partitions(conn)
+
+    months = await _expired_months(cutoff)
+    # секции без строк (например, заведённые заранее) тоже удаляются
+    months = sorted(set(months) | {start for start in partitions if start < cutoff})
+    for start in months:
+        archived = 0
+        if LOG_ARCHIVE:
+            path, archived = await archive_month(start)
+            if path:
+                summary["files"].append(path)
+                summary["archived"] += archived
+        removed = 0
+        if start in partitions:
+            async with engine.connect() as conn:
+                removed = (await conn.execute(text(f"SELECT count(*) FROM {partitions[start]}"))).scalar()
+            await _drop_partition(partitions[start])
+            LOG_EXPIRED.labels("partition").inc(removed)
+        deleted = await _delete_month(start)
+        LOG_EXPIRED.labels("delete").inc(deleted)
+        removed += deleted
+        if not archived and not removed:
+            continue
+        summary["months"].append(f"{start:%Y-%m}")
+        summary["removed"] += removed
+        logger.info("Логи за %s: в архив %d, удалено %d", f"{start:%Y-%m}", archived, removed)
+
+    if summary["removed"]:
+        async with AsyncSessionLocal() as db:
+            await bump_version(db, TABLE)
+            await db.commit()
+    return summary
+
+
+async def maintain_logs() -> Optional[dict]:
+    """
+    Один проход обслуживания: секции вперёд и срок хранения. В PostgreSQL
+    выполняется одним воркером за раз; остальные пропускают проход (None).
+    """
+    if not _is_postgres():
+        return await expire_logs()
+    async with engine.connect() as lock_conn:
+        # блокировка сессионная: соединение не держит открытую транзакцию
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        locked = (await lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": _ADVISORY_LOCK_KEY})).scalar()
+        if not locked:
+            return None
+        try:
+            if LOG_PARTITIONING and await _is_partitioned(lock_conn):
+                await ensure_partitions()
+            return await expire_logs()
+        finally:
+            await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+
+
+async def run_log_maintainer() -> None:
+    while True:
+        try:
+            await maintain_logs()
+        except Exception:
+            logger.exception("Не удалось обслужить секции и архив data_logs")
+        await asyncio.sleep(LOG_MAINTENANCE_INTERVAL)
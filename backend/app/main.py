@@ -1,13 +1,25 @@
 # app/main.py
 
-from fastapi import FastAPI
+import asyncio
+
+from fastapi import FastAPI, Response
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.openapi.utils import get_openapi
 from fastapi.middleware.cors import CORSMiddleware  # ✅ ДОБАВЛЕНО
-from fastapi.staticfiles import StaticFiles
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 
-from app.database import engine, Base
-from app.routers import users, finance, equipment, logs
+from app.database import engine, init_db, replica_engine
+from app.avatars import CachedStaticFiles
+from app.instrumentation import InstrumentationMiddleware, install_db_hooks
+from app.profiling import ProfilingMiddleware
+from app.replica import ReadYourWritesMiddleware, replica_monitor
+from app.hashing import shutdown_hashing
+from app.log_buffer import log_buffer
+from app.live import live_hub
+from app.changes import run_tombstone_purger
+from app.rollups import backfill_rollups
+from app.log_partitions import prepare_log_partitions, run_log_maintainer
+from app.routers import users, finance, equipment, logs, datasets, dashboard, health, profiles
 from app import models
 
 
@@ -15,7 +27,8 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
 
 app = FastAPI()
 
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+# файлы с хешем в имени (аватары) — с долгим immutable-кэшем
+app.mount("/static", CachedStaticFiles(directory="app/static"), name="static")
 
 origins = [
     "http://localhost:5173",  # адрес Vite (React frontend)
@@ -27,13 +40,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],            # Разрешены все методы (GET, POST и т.д.)
     allow_headers=["*"],            # Разрешены все заголовки
+    expose_headers=["X-Next-Cursor", "ETag", "X-Profile-Id"],  # курсор следующей страницы, версия списка, профиль
 )
 
+# Длительность, статусы и SQL по маршрутам — на /metrics, медленное — в лог.
+# Профилирование по X-Profile / ?profile=1 (только superadmin) — внутри,
+# add_middleware оборачивает снаружи последним добавленным.
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(InstrumentationMiddleware)
+install_db_hooks(engine, "primary")
+if replica_engine is not None:
+    # большинство GET читают с реплики (get_read_db) — без хуков их SQL не виден
+    install_db_hooks(replica_engine, "replica")
+# автор изменения читает из primary, пока реплика не догнала (app/replica.py)
+app.add_middleware(ReadYourWritesMiddleware)
+
 # Роутеры
 app.include_router(users.router, prefix="/users", tags=["Users"])
 app.include_router(finance.router, prefix="/finance", tags=["Finance"])
 app.include_router(equipment.router, prefix="/equipment", tags=["Equipment"])
 app.include_router(logs.router, prefix="/logs", tags=["Data Logs"])
+app.include_router(datasets.router, prefix="/datasets", tags=["Datasets"])
+app.include_router(dashboard.router, prefix="/dashboard", tags=["Dashboard"])
+app.include_router(health.router, prefix="/health", tags=["Health"])
+app.include_router(profiles.router, prefix="/profiles", tags=["Profiles"])
 
 @app.get("/")
 async def root():
@@ -42,8 +72,29 @@ async def root():
 # Создание таблиц при старте
 @app.on_event("startup")
 async def on_startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await prepare_log_partitions()   # до create_all: data_logs в PostgreSQL — секционированная
+    await init_db()
+    await backfill_rollups()         # агрегаты по данным, загруженным до их появления
+    await log_buffer.start()
+    await live_hub.start()
+    await replica_monitor.start()
+    app.state.tombstone_purger = asyncio.create_task(run_tombstone_purger([models.Equipment, models.Finance, models.DataLog]))
+    # секции вперёд; архив и удаление логов старше LOG_RETENTION_MONTHS, если он задан
+    app.state.log_maintainer = asyncio.create_task(run_log_maintainer())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    app.state.tombstone_purger.cancel()
+    app.state.log_maintainer.cancel()
+    await replica_monitor.stop()
+    await live_hub.stop()
+    await log_buffer.stop()
+    shutdown_hashing()
+
+# Метрики в формате Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 def custom_openapi():
     if app.openapi_schema:
@@ -7,13 +7,21 @@ from sqlalchemy import (
     ForeignKey,
     Float,
     Date,
+    BigInteger,
     JSON,
     DateTime,
+    Index,
+    UniqueConstraint,
     func,
 )
 from sqlalchemy.orm import relationship
+from datetime import datetime, timezone
 from app.database import Base
 
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -26,8 +34,9 @@ class User(Base):
     role = Column(String, default="user", nullable=False)  # user|admin|superadmin
     position = Column(String, nullable=True)
 
-    # связь для ленивого/selectin-запроса
-    data_logs = relationship("DataLog", back_populates="user", lazy="selectin")
+    # загружается только при обращении: selectin тянул все логи пользователя
+    # в каждый select(User). Счётчики для списка — агрегатом (routers/users.py)
+    data_logs = relationship("DataLog", back_populates="user", lazy="select")
 
 
 class DataLog(Base):
@@ -40,10 +49,20 @@ class DataLog(Base):
     action        = Column(String,  nullable=False)
     parameter     = Column(JSON,    nullable=True)
     file_name     = Column(String,  nullable=True)
-    created_at    = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)  # ← НОВОЕ
+    created_at    = Column(DateTime(timezone=True), default=utcnow, server_default=func.now(), nullable=False)  # ← НОВОЕ
+    updated_at    = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow, server_default=func.now(), nullable=False)
+    deleted_at    = Column(DateTime(timezone=True), nullable=True)  # мягкое удаление (tombstone)
 
     user = relationship("User", back_populates="data_logs")
 
+    # индексы под keyset-пагинацию (created_at, id) и фильтры истории
+    __table_args__ = (
+        Index("ix_data_logs_created_at_id", "created_at", "id"),
+        Index("ix_data_logs_user_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_data_logs_action_created_at_id", "action", "created_at", "id"),
+        Index("ix_data_logs_updated_at_id", "updated_at", "id"),
+    )
+
 
 class Finance(Base):
     __tablename__ = "finance"
@@ -57,6 +76,38 @@ class Finance(Base):
     income         = Column(Integer)
     expense        = Column(Integer)
     benefit        = Column(Integer)
+    updated_at     = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow, server_default=func.now(), nullable=False)
+    deleted_at     = Column(DateTime(timezone=True), nullable=True)  # мягкое удаление (tombstone)
+
+    __table_args__ = (
+        Index("ix_finance_date", "date"),
+        Index("ix_finance_equipment_name_date", "equipment_name", "date"),
+        Index("ix_finance_updated_at_id", "updated_at", "id"),
+    )
+
+
+class FinanceRollup(Base):
+    """
+    Предагрегированные суммы Finance по дню / неделе / месяцу и оборудованию.
+    Обновляется инкрементально в обработчиках finance (app/rollups.py).
+    """
+    __tablename__ = "finance_rollups"
+
+    id             = Column(Integer, primary_key=True)
+    period         = Column(String,  nullable=False)   # day|week|month
+    bucket         = Column(Date,    nullable=False)   # начало периода
+    equipment_name = Column(String,  nullable=False)
+    row_count      = Column(Integer, nullable=False, default=0)
+    energy         = Column(Float,   nullable=False, default=0)
+    effectiveness  = Column(Float,   nullable=False, default=0)   # сумма, среднее = / row_count
+    bcd_total      = Column(Float,   nullable=False, default=0)
+    income         = Column(BigInteger, nullable=False, default=0)
+    expense        = Column(BigInteger, nullable=False, default=0)
+    benefit        = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("period", "bucket", "equipment_name", name="uq_finance_rollups_key"),
+    )
 
 
 class Equipment(Base):
@@ -77,3 +128,70 @@ class Equipment(Base):
     uptime       = Column(Integer)
     hw_error     = Column(Integer)
     active       = Column(Integer)
+    updated_at   = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow, server_default=func.now(), nullable=False)
+    deleted_at   = Column(DateTime(timezone=True), nullable=True)  # мягкое удаление (tombstone)
+
+    __table_args__ = (
+        Index("ix_equipment_date", "date"),
+        Index("ix_equipment_name_date", "name", "date"),
+        Index("ix_equipment_updated_at_id", "updated_at", "id"),
+    )
+
+
+class EquipmentRollup(Base):
+    """
+    Агрегаты метрик оборудования по неделям и месяцам для графиков:
+    count / sum / min / max на (период, устройство, метрика).
+    Обновляется при записи в обработчиках equipment (app/rollups.py).
+    """
+    __tablename__ = "equipment_rollups"
+
+    id     = Column(Integer, primary_key=True)
+    period = Column(String,  nullable=False)   # week|month
+    bucket = Column(Date,    nullable=False)
+    name   = Column(String,  nullable=False)
+    metric = Column(String,  nullable=False)
+    count  = Column(Integer, nullable=False)
+    sum    = Column(Float,   nullable=False)
+    min    = Column(Float,   nullable=False)
+    max    = Column(Float,   nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("period", "bucket", "name", "metric", name="uq_equipment_rollups_key"),
+        Index("ix_equipment_rollups_lookup", "period", "metric", "bucket"),
+    )
+
+
+class TableVersion(Base):
+    """
+    Счётчик изменений таблицы: увеличивается в той же транзакции,
+    что и запись (app/versions.py). Используется для ETag списков.
+    """
+    __tablename__ = "table_versions"
+
+    name    = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+class Dataset(Base):
+    """
+    Загруженный CSV для аналитики. Сами данные лежат на диске
+    поколоночно (app/datasets.py), здесь — описание и время последнего
+    обращения для вытеснения по LRU.
+    """
+    __tablename__ = "datasets"
+
+    id               = Column(String,  primary_key=True)          # имя каталога с колонками
+    owner_id         = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    name             = Column(String,  nullable=False)
+    file_name        = Column(String,  nullable=True)
+    rows             = Column(Integer, nullable=False)
+    columns          = Column(JSON,    nullable=False)             # [{"name": ..., "kind": "number"|"string"}]
+    size_bytes       = Column(BigInteger, nullable=False)
+    created_at       = Column(DateTime(timezone=True), default=utcnow, server_default=func.now(), nullable=False)
+    last_accessed_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_datasets_last_accessed_at", "last_accessed_at"),
+        Index("ix_datasets_owner_id", "owner_id"),
+    )
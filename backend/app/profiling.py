@@ -0,0 +1,196 @@
+# app/profiling.py
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import HTTPException
+
+from app.auth import principal_from_token, require_role
+from app.cache import TTLCache
+from app.database import AsyncSessionLocal
+from app.instrumentation import current_stats, shorten_statement
+
+# Профилирование одного запроса по требованию суперадмина: заголовок
+# X-Profile или ?profile=1. Фоновый поток раз в PROFILE_INTERVAL секунд
+# снимает стек потока event loop — но засчитывает снимок, только если
+# в этот момент выполняется задача профилируемого запроса (чужие запросы
+# в профиль не попадают). Поток просыпается реже интервала, когда event loop
+# держит GIL (sys.getswitchinterval(), 5 мс по умолчанию), поэтому снимок
+# весит не интервал, а реально прошедшее с прошлого пробуждения время
+# (perf_counter). Время ожидания БД берётся из хуков SQLAlchemy
+# (app/instrumentation.py) и добавляется в профиль отдельными ветками.
+# Профиль хранится в памяти воркера, его id — в заголовке X-Profile-Id.
+# Запросы без флага проходят мимо без проверок токена и потоков.
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_TTL = float(os.getenv("PROFILE_TTL", "3600"))
+
+profiles = TTLCache(maxsize=PROFILE_KEEP, ttl=PROFILE_TTL)
+
+
+class StackSampler(threading.Thread):
+    """Сэмплер стеков одной asyncio-задачи (по потоку её event loop)."""
+
+    def __init__(self, task: asyncio.Task, interval: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.task = task
+        self.loop = task.get_loop()
+        self.thread_id = threading.get_ident()
+        self.interval = interval
+        self.samples: dict[tuple, float] = defaultdict(float)   # стек → секунды
+        self.count = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        deadline = time.monotonic() + PROFILE_MAX_SECONDS
+        # словарь «loop → выполняемая задача»; если его нет (другая
+        # реализация asyncio) — пишем все снимки потока
+        current_tasks = getattr(asyncio.tasks, "_current_tasks", None)
+        last = time.perf_counter()
+        while not self._stop_event.wait(self.interval) and time.monotonic() < deadline:
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            if current_tasks is not None and current_tasks.get(self.loop) is not self.task:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.samples[tuple(reversed(stack))] += elapsed
+            self.count += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+def _short_path(path: str) -> str:
+    marker = f"{os.sep}site-packages{os.sep}"
+    if marker in path:
+        return path.split(marker, 1)[1]
+    if f"{os.sep}app{os.sep}" in path:
+        return "app" + path.rsplit(f"{os.sep}app", 1)[1]
+    return os.path.basename(path)
+
+
+def _wants_profile(scope) -> bool:
+    if b"profile=1" in scope.get("query_string", b"").split(b"&"):
+        return True
+    return any(name == b"x-profile" for name, _ in scope["headers"])
+
+
+def _bearer_token(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token if scheme.lower() == "bearer" else None
+    return None
+
+
+async def _is_superadmin(scope) -> bool:
+    token = _bearer_token(scope)
+    if not token:
+        return False
+    try:
+        async with AsyncSessionLocal() as db:
+            principal = await principal_from_token(token, db)
+        await require_role(["superadmin"])(user=principal)
+    except HTTPException:
+        return False
+    return True
+
+
+def build_profile(profile_id: str, scope, status: int, wall: float, sampler: StackSampler, queries: list) -> dict:
+    """
+    Профиль в «свёрнутых стеках» (формат flamegraph.pl / speedscope):
+    строка «кадр;кадр;кадр вес», вес — в миллисекундах. Ветка [db]
+    собирает время SQL по выражениям, [wait] — остаток стены (ожидание
+    других задач, сети, пула).
+    """
+    interval_ms = sampler.interval * 1000
+    weights: dict[str, float] = defaultdict(float)
+    for stack, seconds in sampler.samples.items():
+        weights[";".join(stack)] += seconds * 1000
+
+    by_statement: dict[str, list] = defaultdict(lambda: [0, 0.0])
+    for statement, elapsed in queries:
+        entry = by_statement[shorten_statement(statement, 200)]
+        entry[0] += 1
+        entry[1] += elapsed * 1000
+    db_ms = sum(entry[1] for entry in by_statement.values())
+    for statement, (_, elapsed_ms) in by_statement.items():
+        weights["[db];" + statement.replace(";", ",")] += elapsed_ms
+
+    cpu_ms = sum(sampler.samples.values()) * 1000
+    wall_ms = wall * 1000
+    wait_ms = wall_ms - cpu_ms - db_ms
+    if wait_ms > 0:
+        weights["[wait]"] += wait_ms
+
+    return {
+        "id": profile_id,
+        "method": scope["method"],
+        "path": scope["path"],
+        "route": getattr(scope.get("route"), "path", None),
+        "status": status,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "wall_ms": round(wall_ms, 3),
+        "cpu_ms": round(cpu_ms, 3),
+        "db_ms": round(db_ms, 3),
+        "db_statements": len(queries),
+        "interval_ms": interval_ms,
+        "samples": sampler.count,
+        "queries": sorted(
+            ({"statement": s, "count": n, "time_ms": round(t, 3)} for s, (n, t) in by_statement.items()),
+            key=lambda q: q["time_ms"], reverse=True,
+        ),
+        "collapsed": "\n".join(f"{stack} {round(weight, 3)}" for stack, weight in sorted(weights.items())),
+    }
+
+
+class ProfilingMiddleware:
+    """Подключается внутри InstrumentationMiddleware — нужен его contextvar."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope) or not await _is_superadmin(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        stats = current_stats()
+        queries = []
+        if stats is not None:
+            stats.queries = queries
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        sampler = StackSampler(asyncio.current_task(), PROFILE_INTERVAL)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            wall = time.perf_counter() - started
+            sampler.stop()
+            if stats is not None:
+                stats.queries = None
+            profiles.set(profile_id, build_profile(profile_id, scope, status, wall, sampler, queries))
@@ -0,0 +1,62 @@
+# app/querying.py
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any
+
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Упаковывает значения ключа сортировки последней строки страницы
+    в непрозрачную строку для следующего запроса.
+    """
+    payload = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: type) -> tuple:
+    """
+    Обратная операция к encode_cursor: возвращает кортеж значений,
+    приведённых к указанным типам (datetime, date, int, str).
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if len(values) != len(types):
+            raise ValueError
+        result = []
+        for value, typ in zip(values, types):
+            if typ is datetime:
+                result.append(datetime.fromisoformat(value))
+            elif typ is date:
+                result.append(date.fromisoformat(value))
+            else:
+                result.append(typ(value))
+        return tuple(result)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+def contains_pattern(text: str) -> str:
+    """
+    Шаблон для ILIKE '%text%' с экранированием спецсимволов % и _.
+    Использовать вместе с escape="\\".
+    """
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def upsert(db: AsyncSession, model):
+    """INSERT ... ON CONFLICT для текущего диалекта (PostgreSQL / SQLite)."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    raise NotImplementedError(f"upsert не поддерживается для {dialect}")
@@ -0,0 +1,201 @@
+# app/replica.py
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Optional
+
+from fastapi import Depends
+from prometheus_client import Counter, Gauge
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from sqlalchemy.future import select
+from starlette.datastructures import Headers
+
+from app.auth import Principal, decode_access_token, get_current_user
+from app.cache import TTLCache
+from app.database import AsyncSessionLocal, ReplicaSessionLocal
+from app.models import TableVersion
+
+logger = logging.getLogger(__name__)
+
+# Маршрутизация чтений на реплику (DATABASE_REPLICA_URL). Безопасные GET
+# берут сессию через get_read_db, она выбирает базу так:
+#   - пользователь что-то менял последние REPLICA_STICKY_SECONDS — primary
+#     (read-your-writes: своё изменение видно сразу);
+#   - реплика недоступна или отстаёт больше REPLICA_MAX_LAG_SECONDS — primary;
+#   - иначе — реплика.
+# Отставание меряется по версиям таблиц (table_versions, app/versions.py):
+# монитор раз в REPLICA_CHECK_INTERVAL читает версии с обеих баз и считает,
+# сколько времени назад primary был в состоянии, до которого реплика ещё
+# не дошла. Так работает с любой репликацией и с двумя локальными базами.
+# Отметки о записи хранятся в памяти воркера: при нескольких воркерах
+# uvicorn следующий запрос может попасть в другой — там остаётся защита
+# по отставанию.
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "2"))
+REPLICA_CHECK_TIMEOUT = float(os.getenv("REPLICA_CHECK_TIMEOUT", "2"))
+REPLICA_STICKY_USERS = int(os.getenv("REPLICA_STICKY_USERS", "10000"))
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+DB_READ_ROUTING = Counter("db_read_routing_total", "Чтения по базе и причине выбора", ["target", "reason"])
+DB_REPLICA_LAG = Gauge("db_replica_lag_seconds", "Оценка отставания реплики")
+DB_REPLICA_HEALTHY = Gauge("db_replica_healthy", "Реплика доступна (1) или нет (0)")
+
+# id пользователей, недавно менявших данные
+recent_writers = TTLCache(maxsize=REPLICA_STICKY_USERS, ttl=REPLICA_STICKY_SECONDS)
+
+
+async def _read_versions(session_factory) -> dict[str, int]:
+    async with session_factory() as session:
+        result = await session.execute(select(TableVersion.name, TableVersion.version))
+        return dict(result.all())
+
+
+def _caught_up(replica: dict[str, int], primary: dict[str, int]) -> bool:
+    return all(replica.get(name, 0) >= version for name, version in primary.items())
+
+
+class ReplicaMonitor:
+    """Фоновая проверка доступности и отставания реплики."""
+
+    def __init__(self):
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.error: Optional[str] = None      # только тип: status() видят без авторизации
+        self.checked_at: Optional[float] = None
+        # (момент, версии primary), до которых реплика ещё не дошла
+        self._pending: deque = deque(maxlen=1000)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return ReplicaSessionLocal is not None
+
+    @property
+    def usable(self) -> bool:
+        return self.healthy and self.lag is not None and self.lag <= REPLICA_MAX_LAG_SECONDS
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None:
+            await self.check()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(REPLICA_CHECK_INTERVAL)
+            await self.check()
+
+    async def check(self) -> None:
+        now = time.monotonic()
+        try:
+            async with asyncio.timeout(REPLICA_CHECK_TIMEOUT):
+                primary = await _read_versions(AsyncSessionLocal)
+                replica = await _read_versions(ReplicaSessionLocal)
+        except Exception as e:  # тайм-аут, недоступная база и т.п.
+            if self.healthy or self.checked_at is None:
+                logger.warning("Реплика недоступна, чтения идут в primary: %s: %s", type(e).__name__, e)
+            self.healthy, self.error = False, type(e).__name__
+        else:
+            self._pending.append((now, primary))
+            while self._pending and _caught_up(replica, self._pending[0][1]):
+                self._pending.popleft()
+            lag = now - self._pending[0][0] if self._pending else 0.0
+            if self.usable and lag > REPLICA_MAX_LAG_SECONDS:
+                logger.warning("Реплика отстаёт на %.1f с, чтения идут в primary", lag)
+            self.healthy, self.error, self.lag = True, None, lag
+            DB_REPLICA_LAG.set(lag)
+        self.checked_at = now
+        DB_REPLICA_HEALTHY.set(1 if self.healthy else 0)
+
+    def mark_failed(self, error: BaseException) -> None:
+        """Ошибка чтения с реплики в запросе: до следующей проверки — primary."""
+        if self.healthy:
+            logger.warning("Ошибка чтения с реплики, чтения идут в primary: %s: %s", type(error).__name__, error)
+        self.healthy, self.error = False, type(error).__name__
+        DB_REPLICA_HEALTHY.set(0)
+
+    def status(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        body = {
+            "enabled": True,
+            "healthy": self.healthy,
+            "usable": self.usable,
+            "lag_seconds": None if self.lag is None else round(self.lag, 3),
+            "max_lag_seconds": REPLICA_MAX_LAG_SECONDS,
+        }
+        if self.error:
+            body["error"] = self.error
+        return body
+
+
+replica_monitor = ReplicaMonitor()
+
+
+def read_target(user_id: int) -> tuple[str, str]:
+    """(база, причина) для чтения от имени пользователя."""
+    if not replica_monitor.enabled:
+        return "primary", "no_replica"
+    if recent_writers.get(user_id):
+        return "primary", "sticky"
+    if not replica_monitor.healthy:
+        return "primary", "unhealthy"
+    if not replica_monitor.usable:
+        return "primary", "lagging"
+    return "replica", "ok"
+
+
+async def get_read_db(user: Principal = Depends(get_current_user)):
+    """Сессия только для чтения: реплика или primary (см. read_target)."""
+    target, reason = read_target(user.id)
+    DB_READ_ROUTING.labels(target, reason).inc()
+    session_factory = ReplicaSessionLocal if target == "replica" else AsyncSessionLocal
+    async with session_factory() as session:
+        try:
+            yield session
+        except (DBAPIError, PoolTimeoutError) as e:
+            # текущий запрос уже не повторить, но следующие пойдут в primary
+            if target == "replica":
+                replica_monitor.mark_failed(e)
+            raise
+
+
+def mark_write(scope) -> None:
+    authorization = Headers(scope=scope).get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer":
+        return
+    payload = decode_access_token(token)
+    if payload and str(payload.get("sub", "")).isdigit():
+        recent_writers.set(int(payload["sub"]), True)
+
+
+class ReadYourWritesMiddleware:
+    """
+    Отмечает автора успешного изменяющего запроса до отправки ответа —
+    его следующие чтения в течение REPLICA_STICKY_SECONDS идут в primary.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or not replica_monitor.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                mark_write(scope)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
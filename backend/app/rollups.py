@@ -0,0 +1,378 @@
+# app/rollups.py
+
+import hashlib
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, exists, func, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.database import AsyncSessionLocal
+from app.models import Equipment, EquipmentRollup, Finance, FinanceRollup
+from app.querying import upsert
+
+PERIODS = ("day", "week", "month")
+
+FINANCE_MEASURES = ("energy", "effectiveness", "bcd_total", "income", "expense", "benefit")
+
+
+def bucket_start(value: date, period: str) -> date:
+    """Начало периода: сам день, понедельник недели или 1-е число месяца."""
+    if period == "week":
+        return value - timedelta(days=value.weekday())
+    if period == "month":
+        return value.replace(day=1)
+    return value
+
+
+def bucket_end(bucket: date, period: str) -> date:
+    """Последний день периода, начинающегося с bucket."""
+    if period == "week":
+        return bucket + timedelta(days=6)
+    if period == "month":
+        return (bucket.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return bucket
+
+
+# сколько строк агрегатов писать одним INSERT
+_ROLLUP_CHUNK = 500
+
+
+# ----------------------------------------
+# Finance
+# ----------------------------------------
+
+def finance_values(entry) -> dict:
+    """Снимок полей строки Finance, нужных для агрегатов (до или после изменения)."""
+    return {
+        "date": entry.date,
+        "equipment_name": entry.equipment_name,
+        **{m: getattr(entry, m) or 0 for m in FINANCE_MEASURES},
+    }
+
+
+async def apply_finance_delta(db: AsyncSession, values: dict, sign: int) -> None:
+    """
+    Прибавляет (sign=1) или вычитает (sign=-1) строку Finance из всех
+    агрегатов, в которые она входит. Выполняется в транзакции изменения,
+    атомарно через ON CONFLICT DO UPDATE.
+    """
+    if sign > 0:
+        await apply_finance_deltas(db, added=[values])
+    else:
+        await apply_finance_deltas(db, removed=[values])
+
+
+async def apply_finance_deltas(db: AsyncSession, added: Iterable[dict] = (), removed: Iterable[dict] = ()) -> None:
+    """
+    То же для многих строк сразу (пакетные изменения): разности сначала
+    складываются по ключу агрегата, затем один INSERT ... ON CONFLICT.
+    """
+    deltas: dict[tuple, dict] = defaultdict(lambda: dict.fromkeys(("row_count", *FINANCE_MEASURES), 0))
+    for rows, sign in ((added, 1), (removed, -1)):
+        for values in rows:
+            for period in PERIODS:
+                acc = deltas[(period, bucket_start(values["date"], period), values["equipment_name"])]
+                acc["row_count"] += sign
+                for m in FINANCE_MEASURES:
+                    acc[m] += sign * (values[m] or 0)
+    if not deltas:
+        return
+
+    keys = list(deltas)
+    for offset in range(0, len(keys), _ROLLUP_CHUNK):
+        chunk = keys[offset:offset + _ROLLUP_CHUNK]
+        stmt = upsert(db, FinanceRollup).values([
+            {"period": period, "bucket": bucket, "equipment_name": name, **deltas[(period, bucket, name)]}
+            for period, bucket, name in chunk
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["period", "bucket", "equipment_name"],
+            set_={
+                "row_count": FinanceRollup.row_count + stmt.excluded.row_count,
+                **{m: getattr(FinanceRollup, m) + getattr(stmt.excluded, m) for m in FINANCE_MEASURES},
+            },
+        )
+        await db.execute(stmt)
+        if any(deltas[key]["row_count"] < 0 for key in chunk):
+            await db.execute(
+                delete(FinanceRollup).where(
+                    tuple_(FinanceRollup.period, FinanceRollup.bucket, FinanceRollup.equipment_name).in_(chunk),
+                    FinanceRollup.row_count <= 0,
+                )
+            )
+
+
+async def compute_finance_rollups(
+    db: AsyncSession,
+    names: Optional[Iterable[str]] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> dict[tuple, dict]:
+    """
+    Агрегаты с нуля по сырой таблице finance: {(period, bucket, name): суммы}.
+    Один GROUP BY по (date, equipment_name), недели и месяцы
+    складываются из дневных сумм.
+    """
+    conditions = [Finance.deleted_at.is_(None)]
+    if names is not None:
+        conditions.append(Finance.equipment_name.in_(list(names)))
+    if start:
+        conditions.append(Finance.date >= start)
+    if end:
+        conditions.append(Finance.date <= end)
+
+    query = (
+        select(
+            Finance.date,
+            Finance.equipment_name,
+            func.count(),
+            *[func.coalesce(func.sum(getattr(Finance, m)), 0) for m in FINANCE_MEASURES],
+        )
+        .where(*conditions)
+        .group_by(Finance.date, Finance.equipment_name)
+    )
+    result = await db.execute(query)
+
+    rollups: dict[tuple, dict] = defaultdict(lambda: dict.fromkeys(("row_count", *FINANCE_MEASURES), 0))
+    for day, name, count, *sums in result.all():
+        for period in PERIODS:
+            acc = rollups[(period, bucket_start(day, period), name)]
+            acc["row_count"] += count
+            for m, value in zip(FINANCE_MEASURES, sums):
+                acc[m] += value
+    return dict(rollups)
+
+
+async def load_finance_rollups(db: AsyncSession, conditions: list = ()) -> dict[tuple, dict]:
+    result = await db.execute(select(FinanceRollup).where(*conditions))
+    return {
+        (r.period, r.bucket, r.equipment_name): {
+            "row_count": r.row_count,
+            **{m: getattr(r, m) for m in FINANCE_MEASURES},
+        }
+        for r in result.scalars().all()
+    }
+
+
+def diff_rollups(expected: dict, actual: dict, tolerance: float = 1e-6) -> list[dict]:
+    """Расхождения между пересчитанными (expected) и сохранёнными (actual) агрегатами."""
+    mismatches = []
+    for key in sorted(set(expected) | set(actual), key=lambda k: (k[0], k[1], k[2])):
+        want, have = expected.get(key), actual.get(key)
+        if want is None or have is None:
+            mismatches.append({"key": key, "expected": want, "actual": have})
+            continue
+        for field, value in want.items():
+            if abs((have.get(field) or 0) - value) > tolerance * max(1.0, abs(value)):
+                mismatches.append({"key": key, "expected": want, "actual": have})
+                break
+    return mismatches
+
+
+async def replace_finance_rollups(db: AsyncSession, rollups: dict[tuple, dict], conditions: list = ()) -> None:
+    """Заменяет агрегаты (все или подходящие под conditions) пересчитанными."""
+    await db.execute(delete(FinanceRollup).where(*conditions))
+    if rollups:
+        await db.execute(
+            FinanceRollup.__table__.insert(),
+            [
+                {"period": period, "bucket": bucket, "equipment_name": name, **values}
+                for (period, bucket, name), values in rollups.items()
+            ],
+        )
+
+
+async def backfill_finance_rollups(db: AsyncSession) -> bool:
+    """
+    Заполняет finance_rollups по сырой таблице, если агрегатов ещё нет,
+    а данные есть (таблица появилась после того, как finance наполнили).
+    """
+    has_rollups = await db.scalar(select(exists().select_from(FinanceRollup)))
+    has_rows = await db.scalar(select(exists().where(Finance.deleted_at.is_(None))))
+    if has_rollups or not has_rows:
+        return False
+    await replace_finance_rollups(db, await compute_finance_rollups(db))
+    return True
+
+
+# один первичный пересчёт на все воркеры
+_BACKFILL_LOCK_KEY = 0x726F6C6C   # "roll"
+
+
+async def backfill_rollups() -> None:
+    """При старте: пересчитывает пустые таблицы агрегатов в одной транзакции."""
+    async with AsyncSessionLocal() as db:
+        if db.get_bind().dialect.name == "postgresql":
+            # остальные воркеры ждут и видят уже заполненные агрегаты
+            await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _BACKFILL_LOCK_KEY})
+        await backfill_finance_rollups(db)
+        await backfill_equipment_rollups(db)
+        await db.commit()
+
+
+# ----------------------------------------
+# Equipment
+# ----------------------------------------
+
+EQUIPMENT_PERIODS = ("week", "month")
+
+EQUIPMENT_METRICS = ("hashrate", "energy_kvt", "hw_error", "uptime", "fan", "core", "asic", "effectiveness")
+
+
+def _least_greatest(db: AsyncSession):
+    if db.get_bind().dialect.name == "sqlite":
+        return func.min, func.max      # в SQLite min/max с двумя аргументами скалярные
+    return func.least, func.greatest
+
+
+async def _lock_equipment_buckets(db: AsyncSession, buckets: Iterable[tuple[str, date, str]]) -> None:
+    """
+    PostgreSQL: блокировка (до конца транзакции) агрегатов (period, bucket, name).
+    Пересчёт читает сырые строки и перезаписывает агрегат — без блокировки
+    параллельная транзакция по тому же периоду затёрла бы чужие изменения.
+    Ключи берутся в одном порядке, чтобы транзакции не ждали друг друга по кругу.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return      # в SQLite пишущая транзакция одна
+    keys = set()
+    for period, bucket, name in buckets:
+        digest = hashlib.blake2b(f"equipment_rollups:{period}:{bucket}:{name}".encode(), digest_size=8).digest()
+        keys.add(int.from_bytes(digest, "big", signed=True))
+    for key in sorted(keys):
+        await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": key})
+
+
+def _accumulate_equipment(acc: dict[tuple, list], rows) -> None:
+    for row in rows:
+        for period in EQUIPMENT_PERIODS:
+            bucket = bucket_start(row["date"], period)
+            for metric in EQUIPMENT_METRICS:
+                value = row.get(metric)
+                if value is None:
+                    continue
+                key = (period, bucket, row["name"], metric)
+                item = acc.get(key)
+                if item is None:
+                    acc[key] = [1, value, value, value]
+                else:
+                    item[0] += 1
+                    item[1] += value
+                    item[2] = min(item[2], value)
+                    item[3] = max(item[3], value)
+
+
+async def _merge_equipment_acc(db: AsyncSession, acc: dict[tuple, list]) -> None:
+    least, greatest = _least_greatest(db)
+    values = [
+        {"period": p, "bucket": b, "name": n, "metric": m, "count": c, "sum": s, "min": lo, "max": hi}
+        for (p, b, n, m), (c, s, lo, hi) in acc.items()
+    ]
+    for i in range(0, len(values), _ROLLUP_CHUNK):
+        stmt = upsert(db, EquipmentRollup).values(values[i:i + _ROLLUP_CHUNK])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["period", "bucket", "name", "metric"],
+            set_={
+                "count": EquipmentRollup.count + stmt.excluded.count,
+                "sum": EquipmentRollup.sum + stmt.excluded.sum,
+                "min": least(EquipmentRollup.min, stmt.excluded.min),
+                "max": greatest(EquipmentRollup.max, stmt.excluded.max),
+            },
+        )
+        await db.execute(stmt)
+
+
+async def merge_equipment_rows(db: AsyncSession, rows: list[dict]) -> None:
+    """
+    Добавляет новые строки equipment в агрегаты: count/sum складываются,
+    min/max объединяются. Подходит только для вставок — при изменении
+    или удалении используйте refresh_equipment_rollups.
+    """
+    acc: dict[tuple, list] = {}
+    _accumulate_equipment(acc, rows)
+    await _lock_equipment_buckets(db, {(p, b, n) for p, b, n, _ in acc})
+    await _merge_equipment_acc(db, acc)
+
+
+async def refresh_equipment_rollups(db: AsyncSession, keys: Iterable[tuple[str, date]]) -> None:
+    """
+    Пересчитывает по сырой таблице агрегаты, в которые входят строки
+    с данными (name, date). min/max нельзя «вычесть», поэтому при
+    изменении и удалении затронутые периоды считаются заново.
+    """
+    buckets = {
+        (period, bucket_start(day, period), name)
+        for name, day in keys
+        for period in EQUIPMENT_PERIODS
+    }
+    await _lock_equipment_buckets(db, buckets)
+    for period, bucket, name in sorted(buckets):
+        query = select(
+            *[
+                agg(getattr(Equipment, metric))
+                for metric in EQUIPMENT_METRICS
+                for agg in (func.count, func.sum, func.min, func.max)
+            ]
+        ).where(
+            Equipment.name == name,
+            Equipment.deleted_at.is_(None),
+            Equipment.date >= bucket,
+            Equipment.date <= bucket_end(bucket, period),
+        )
+        stats = (await db.execute(query)).one()
+        by_metric = dict(zip(EQUIPMENT_METRICS, (stats[i:i + 4] for i in range(0, len(stats), 4))))
+
+        # метрики без значений — строк агрегата больше нет
+        empty = [metric for metric, (count, *_) in by_metric.items() if not count]
+        if empty:
+            await db.execute(
+                delete(EquipmentRollup).where(
+                    EquipmentRollup.period == period,
+                    EquipmentRollup.bucket == bucket,
+                    EquipmentRollup.name == name,
+                    EquipmentRollup.metric.in_(empty),
+                )
+            )
+        values = [
+            {"period": period, "bucket": bucket, "name": name, "metric": metric,
+             "count": count, "sum": total, "min": lo, "max": hi}
+            for metric, (count, total, lo, hi) in by_metric.items()
+            if count
+        ]
+        if values:
+            stmt = upsert(db, EquipmentRollup).values(values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["period", "bucket", "name", "metric"],
+                set_={c: stmt.excluded[c] for c in ("count", "sum", "min", "max")},
+            )
+            await db.execute(stmt)
+
+
+async def rebuild_equipment_rollups(db: AsyncSession) -> int:
+    """Полная перестройка агрегатов (первичное заполнение или восстановление)."""
+    query = select(
+        Equipment.name,
+        Equipment.date,
+        *[getattr(Equipment, metric) for metric in EQUIPMENT_METRICS],
+    ).where(Equipment.deleted_at.is_(None))
+    acc: dict[tuple, list] = {}
+    total = 0
+    result = await db.stream(query.execution_options(yield_per=5000))
+    async for rows in result.mappings().partitions(5000):
+        _accumulate_equipment(acc, rows)
+        total += len(rows)
+    await db.execute(delete(EquipmentRollup))
+    await _merge_equipment_acc(db, acc)
+    return total
+
+
+async def backfill_equipment_rollups(db: AsyncSession) -> bool:
+    """Как backfill_finance_rollups, но для equipment_rollups."""
+    has_rollups = await db.scalar(select(exists().select_from(EquipmentRollup)))
+    has_rows = await db.scalar(select(exists().where(Equipment.deleted_at.is_(None))))
+    if has_rollups or not has_rows:
+        return False
+    await rebuild_equipment_rollups(db)
+    return True
@@ -0,0 +1,94 @@
+# app/routers/dashboard.py
+
+import os
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Depends
+from sqlalchemy import distinct, func
+from sqlalchemy.future import select
+
+from app.database import AsyncSessionLocal
+from app.models import Equipment, FinanceRollup
+from app.schemas import DashboardSummary
+from app.auth import require_role, Principal
+from app.cache import RefreshingValue
+
+router = APIRouter()
+
+# Сводка главной страницы считается несколькими агрегатными запросами
+# и живёт DASHBOARD_TTL секунд; ещё DASHBOARD_STALE секунд отдаётся
+# устаревшая сводка, пока в фоне считается новая.
+DASHBOARD_TTL = float(os.getenv("DASHBOARD_TTL", "15"))
+DASHBOARD_STALE = float(os.getenv("DASHBOARD_STALE", "60"))
+
+# финансовые показатели видят только эти роли
+_FINANCE_ROLES = ("admin", "superadmin")
+
+
+async def compute_summary() -> dict:
+    # своя сессия: пересчёт может идти в фоне после ответа
+    async with AsyncSessionLocal() as db:
+        latest_date = (
+            select(func.max(Equipment.date)).where(Equipment.deleted_at.is_(None)).scalar_subquery()
+        )
+        equipment = (await db.execute(
+            select(
+                func.max(Equipment.date).label("date"),
+                func.count(distinct(Equipment.name)).label("miners"),
+                func.count(distinct(Equipment.name)).filter(Equipment.active > 0).label("active_miners"),
+                func.coalesce(func.sum(Equipment.hashrate), 0).label("hashrate"),
+                func.coalesce(func.sum(Equipment.energy_kvt), 0).label("energy_kvt"),
+                func.avg(Equipment.uptime).label("uptime_avg"),
+                func.coalesce(func.sum(Equipment.hw_error), 0).label("hw_errors"),
+            ).where(Equipment.deleted_at.is_(None), Equipment.date == latest_date)
+        )).mappings().one()
+
+        # финансы — из помесячных агрегатов, сырую таблицу не читаем
+        totals = (await db.execute(
+            select(
+                func.max(FinanceRollup.bucket).label("month"),
+                *[func.coalesce(func.sum(getattr(FinanceRollup, m)), 0).label(m)
+                  for m in ("income", "expense", "benefit", "energy")],
+            ).where(FinanceRollup.period == "month")
+        )).mappings().one()
+        latest_month = (await db.execute(
+            select(*[func.coalesce(func.sum(getattr(FinanceRollup, m)), 0).label(m)
+                     for m in ("income", "expense", "benefit", "energy")])
+            .where(
+                FinanceRollup.period == "month",
+                FinanceRollup.bucket == select(func.max(FinanceRollup.bucket))
+                .where(FinanceRollup.period == "month").scalar_subquery(),
+            )
+        )).mappings().one()
+
+    return {
+        "equipment": dict(equipment),
+        "finance": {
+            "month": totals["month"],
+            "income": latest_month["income"],
+            "expense": latest_month["expense"],
+            "benefit": latest_month["benefit"],
+            "energy": latest_month["energy"],
+            "total_income": totals["income"],
+            "total_expense": totals["expense"],
+            "total_benefit": totals["benefit"],
+            "total_energy": totals["energy"],
+        },
+        "computed_at": datetime.now(timezone.utc),
+    }
+
+
+summary_value = RefreshingValue(compute_summary, ttl=DASHBOARD_TTL, stale=DASHBOARD_STALE)
+
+
+@router.get("/summary", response_model=DashboardSummary)
+async def get_dashboard_summary(user: Principal = Depends(require_role(["user", "admin", "superadmin"]))):
+    """
+    Главные показатели: последний день мониторинга (майнеры, хешрейт,
+    энергия) и финансы (последний месяц и всё время — только admin/superadmin).
+    Одна общая сводка на воркер; одновременные запросы ждут один пересчёт.
+    """
+    summary = await summary_value.get()
+    if user.role not in _FINANCE_ROLES:
+        summary = {**summary, "finance": None}
+    return summary
@@ -0,0 +1,157 @@
+# app/routers/datasets.py
+
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.database import get_db
+from app.models import Dataset
+from app.schemas import DatasetRead, DatasetQuery, DatasetPage, AggregateQuery, AggregateResult
+from app.auth import get_current_user, require_role, Principal
+from app.log_buffer import log_buffer
+from app.datasets import (
+    create_dataset,
+    distinct_values,
+    enforce_quota,
+    iter_dataset_csv,
+    remove_dataset_files,
+    run_query,
+    touch_dataset,
+)
+from app.aggregate import aggregate
+
+router = APIRouter()
+
+# admin и superadmin видят наборы всех пользователей, остальные — только свои
+_SEE_ALL = ("admin", "superadmin")
+
+
+async def _get_dataset(db: AsyncSession, dataset_id: str, user: Principal) -> Dataset:
+    dataset = await db.get(Dataset, dataset_id)
+    if not dataset or (dataset.owner_id != user.id and user.role not in _SEE_ALL):
+        raise HTTPException(status_code=404, detail="Набор данных не найден")
+    return dataset
+
+
+# Загрузка CSV: тело запроса — файл (text/csv), читается потоком
+@router.post(
+    "/",
+    response_model=DatasetRead,
+    status_code=201,
+    openapi_extra={"requestBody": {"required": True, "content": {"text/csv": {"schema": {"type": "string", "format": "binary"}}}}},
+)
+async def upload_dataset(
+    request: Request,
+    file_name: Optional[str] = None,
+    name: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    dataset = await create_dataset(db, request.stream(), name or file_name or "dataset", file_name, user.id)
+    evicted = await enforce_quota(db, keep=dataset.id)
+    await db.commit()
+    await db.refresh(dataset)
+    for dataset_id in evicted:
+        remove_dataset_files(dataset_id)
+
+    # событие загрузки в историю — как раньше писал фронтенд
+    await log_buffer.put(dict(
+        user_id=user.id,
+        user_fullname=user.fullname,
+        user_role=user.role,
+        action="Upload CSV",
+        parameter={"file": file_name, "dataset_id": dataset.id, "rows": dataset.rows},
+        file_name=file_name,
+        created_at=datetime.now(timezone.utc),
+    ))
+    return dataset
+
+
+@router.get("/", response_model=list[DatasetRead])
+async def list_datasets(db: AsyncSession = Depends(get_db), user: Principal = Depends(get_current_user)):
+    query = select(Dataset).order_by(Dataset.last_accessed_at.desc())
+    if user.role not in _SEE_ALL:
+        query = query.where(Dataset.owner_id == user.id)
+    result = await db.execute(query)
+    return result.scalars().all()
+
+
+# Агрегаты для графиков по набору или по таблицам equipment / finance
+@router.post("/aggregate", response_model=AggregateResult)
+async def aggregate_data(
+    query: AggregateQuery,
+    db: AsyncSession = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    dataset = None
+    if query.source == "dataset":
+        if not query.dataset_id:
+            raise HTTPException(status_code=400, detail="Не указан dataset_id")
+        dataset = await _get_dataset(db, query.dataset_id, user)
+    elif query.source == "finance":
+        await require_role(["admin", "superadmin"])(user=user)
+    result = await aggregate(db, query, dataset)
+    if dataset is not None:
+        await touch_dataset(db, dataset.id)
+    return result
+
+
+@router.get("/{dataset_id}", response_model=DatasetRead)
+async def get_dataset(dataset_id: str, db: AsyncSession = Depends(get_db), user: Principal = Depends(get_current_user)):
+    return await _get_dataset(db, dataset_id, user)
+
+
+# Фильтр / сортировка / проекция / страница; ответ — по колонкам
+@router.post("/{dataset_id}/query", response_model=DatasetPage)
+async def query_dataset(
+    dataset_id: str,
+    query: DatasetQuery,
+    db: AsyncSession = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    dataset = await _get_dataset(db, dataset_id, user)
+    page = await run_query(dataset, query)
+    await touch_dataset(db, dataset_id)
+    return page
+
+
+# Различные значения колонки — для выпадающих списков фильтра
+@router.get("/{dataset_id}/values")
+async def get_dataset_values(
+    dataset_id: str,
+    column: str,
+    limit: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    dataset = await _get_dataset(db, dataset_id, user)
+    return await distinct_values(dataset, column, limit)
+
+
+# Выборка целиком в CSV (limit/offset запроса не учитываются)
+@router.post("/{dataset_id}/export")
+async def export_dataset(
+    dataset_id: str,
+    query: DatasetQuery,
+    db: AsyncSession = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    dataset = await _get_dataset(db, dataset_id, user)
+    await touch_dataset(db, dataset_id)
+    return StreamingResponse(
+        iter_dataset_csv(dataset, query),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{dataset_id}.csv"'},
+    )
+
+
+@router.delete("/{dataset_id}", status_code=204)
+async def delete_dataset(dataset_id: str, db: AsyncSession = Depends(get_db), user: Principal = Depends(get_current_user)):
+    dataset = await _get_dataset(db, dataset_id, user)
+    await db.delete(dataset)
+    await db.commit()
+    remove_dataset_files(dataset_id)
@@ -1,31 +1,264 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from app.database import get_db
-from app.models import Equipment
-from app.schemas import EquipmentCreate, EquipmentUpdate, EquipmentRead
-from app.auth import require_role
+from app.database import get_db, AsyncSessionLocal
+from app.replica import get_read_db
+from app.models import Equipment, utcnow
+from app.schemas import (
+    BatchFilter,
+    BatchResult,
+    EquipmentBatchCreate,
+    EquipmentBatchUpdate,
+    EquipmentChanges,
+    EquipmentCreate,
+    EquipmentRead,
+    EquipmentUpdate,
+    ImportResult,
+    TimeSeries,
+)
+from app.auth import require_role, principal_from_token
+from app.ingest import import_rows
+from app.export import export_response
+from app.querying import contains_pattern
+from app.rollups import (
+    EQUIPMENT_METRICS,
+    merge_equipment_rows,
+    rebuild_equipment_rollups,
+    refresh_equipment_rollups,
+)
+from app.timeseries import equipment_series
+from app.live import emit, live_hub, parse_devices, serve
+from app.changes import changes_page, CHANGES_PAGE_DEFAULT, CHANGES_PAGE_MAX
+from app.versions import bump_version, conditional_json
+from app.serialize import FORMAT_MEDIA_TYPES, LIST_FORMATS, fetch_list, schema_columns
+from app.batch import (
+    batch_conditions,
+    batch_insert,
+    batch_summary,
+    batch_update,
+    check_batch_size,
+    patch_values,
+)
 
 router = APIRouter()
 
+
+def _entry_data(entry: Equipment) -> dict:
+    return {column.name: getattr(entry, column.name) for column in Equipment.__table__.c}
+
+
+def equipment_filter_conditions(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    device: Optional[str] = None,
+    search: Optional[str] = None,
+) -> list:
+    """Условия WHERE для фильтров списка и экспорта оборудования."""
+    conditions = [Equipment.deleted_at.is_(None)]
+    if start:
+        conditions.append(Equipment.date >= start)
+    if end:
+        conditions.append(Equipment.date <= end)
+    if device:
+        conditions.append(Equipment.name == device)
+    if search:
+        conditions.append(Equipment.name.ilike(contains_pattern(search), escape="\\"))
+    return conditions
+
+
+# ?format=columnar|packed — колонки для графиков вместо массива объектов (app/serialize.py)
 @router.get("/", response_model=list[EquipmentRead])
-async def get_all_equipment(db: AsyncSession = Depends(get_db), user=Depends(require_role(["user", "admin", "superadmin"]))):
-    result = await db.execute(select(Equipment))
-    return result.scalars().all()
+async def get_all_equipment(
+    request: Request,
+    conditions: list = Depends(equipment_filter_conditions),
+    fmt: str = Query("json", alias="format", pattern=LIST_FORMATS),
+    db: AsyncSession = Depends(get_read_db),
+    user=Depends(require_role(["user", "admin", "superadmin"])),
+):
+    async def build():
+        query = select(*schema_columns(Equipment, EquipmentRead)).where(*conditions)
+        return await fetch_list(db, query, fmt), {}
+
+    return await conditional_json(request, db, ["equipment"], user.role, build, FORMAT_MEDIA_TYPES[fmt])
+
+
+# Потоковая выгрузка с теми же фильтрами, что и у списка
+@router.get("/export")
+async def export_equipment(
+    conditions: list = Depends(equipment_filter_conditions),
+    fmt: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    user=Depends(require_role(["user", "admin", "superadmin"])),
+):
+    query = (
+        select(*schema_columns(Equipment, EquipmentRead))
+        .where(*conditions)
+        .order_by(Equipment.date, Equipment.id)
+    )
+    return export_response(query, fmt, gzip, "equipment")
+
+
+# Изменения после курсора: новые/изменённые строки и id удалённых
+@router.get("/changes", response_model=EquipmentChanges)
+async def get_equipment_changes(
+    since: Optional[str] = None,
+    limit: int = Query(CHANGES_PAGE_DEFAULT, ge=1, le=CHANGES_PAGE_MAX),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(require_role(["user", "admin", "superadmin"])),
+):
+    return await changes_page(db, Equipment, since, limit)
+
+
+# Ряд метрики для графиков: агрегаты по дням/неделям/месяцам или LTTB
+@router.get("/timeseries", response_model=TimeSeries)
+async def get_equipment_timeseries(
+    metric: str = Query(..., pattern=f"^({'|'.join(EQUIPMENT_METRICS)})$"),
+    device: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    points: int = Query(500, ge=10, le=5000),
+    mode: str = Query("rollup", pattern="^(rollup|lttb)$"),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(require_role(["user", "admin", "superadmin"])),
+):
+    return await equipment_series(db, metric, device, start, end, points, mode)
+
+
+# Полная перестройка агрегатов (после ручных правок БД или для старых данных)
+@router.post("/rollups/rebuild")
+async def rebuild_rollups(db: AsyncSession = Depends(get_db), user=Depends(require_role(["superadmin"]))):
+    rows = await rebuild_equipment_rollups(db)
+    await db.commit()
+    return {"rows": rows}
 
 
 @router.post("/", response_model=EquipmentRead, status_code=201)
 async def create_equipment(data: EquipmentCreate, db: AsyncSession = Depends(get_db), user=Depends(require_role(["user", "superadmin"]))):
     new_entry = Equipment(**data.dict())
     db.add(new_entry)
+    await merge_equipment_rows(db, [data.dict()])
+    await db.flush()
+    await emit(db, "created", [new_entry.name], id=new_entry.id, data=_entry_data(new_entry))
+    await bump_version(db, "equipment")
     await db.commit()
     await db.refresh(new_entry)
     return new_entry
 
 
+# Массовый импорт: тело запроса — CSV-файл (text/csv), заголовок — поля EquipmentCreate.
+# Файл читается потоком, ошибочные строки пропускаются и попадают в отчёт.
+@router.post(
+    "/import",
+    response_model=ImportResult,
+    openapi_extra={"requestBody": {"required": True, "content": {"text/csv": {"schema": {"type": "string", "format": "binary"}}}}},
+)
+async def import_equipment(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(require_role(["user", "superadmin"])),
+):
+    return await import_rows(db, request.stream(), EquipmentCreate, Equipment.__table__, on_batch=_after_import_batch)
+
+
+# агрегаты, событие и версия — в транзакции пачки: после сбоя не расходятся с таблицей
+async def _after_import_batch(db: AsyncSession, rows: list[dict]) -> None:
+    await merge_equipment_rows(db, rows)
+    names = {row["name"] for row in rows}
+    await emit(db, "imported", names, count=len(rows))
+    await bump_version(db, "equipment")
+
+
+# Пакетное создание: один многострочный INSERT в одной транзакции
+@router.post("/batch", response_model=BatchResult, status_code=201)
+async def create_equipment_batch(
+    data: EquipmentBatchCreate,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(require_role(["user", "superadmin"])),
+):
+    check_batch_size(len(data.items))
+    rows = [item.dict() for item in data.items]
+    created = await batch_insert(db, Equipment, rows, [Equipment.id, Equipment.name, Equipment.date])
+    await merge_equipment_rows(db, rows)
+    summary = batch_summary("created", [r.id for r in created], [r.name for r in created], [r.date for r in created])
+    await emit(db, "batch", summary["devices"], action="created", count=summary["count"])
+    await bump_version(db, "equipment")
+    await db.commit()
+    return summary
+
+
+# Пакетное изменение по списку id и/или фильтру (start, end, device):
+# одно UPDATE ... RETURNING, меняются только переданные в values поля
+@router.patch("/batch", response_model=BatchResult)
+async def update_equipment_batch(
+    data: EquipmentBatchUpdate,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(require_role(["user", "superadmin"])),
+):
+    values = patch_values(data.values, required=("name", "date"))
+    conditions = batch_conditions(Equipment, Equipment.name, data.where)
+    # при смене устройства или даты агрегаты пересчитываются и по старым ключам
+    moves = "name" in values or "date" in values
+    rows = await batch_update(
+        db, Equipment, conditions, values,
+        returning=[Equipment.id, Equipment.name, Equipment.date],
+        returning_old=[Equipment.name, Equipment.date] if moves else None,
+    )
+    keys = {(r.name, r.date) for r in rows}
+    if moves:
+        keys |= {(r.old_name, r.old_date) for r in rows}
+    await refresh_equipment_rollups(db, keys)
+    summary = batch_summary("updated", [r.id for r in rows], [k[0] for k in keys], [k[1] for k in keys])
+    if rows:
+        await emit(db, "batch", summary["devices"], action="updated", count=summary["count"])
+        await bump_version(db, "equipment")
+    await db.commit()
+    return summary
+
+
+# Пакетное (мягкое) удаление, например месяц ошибочной телеметрии:
+# {"device": "A1", "start": "2024-05-01", "end": "2024-05-31"}
+@router.post("/batch/delete", response_model=BatchResult)
+async def delete_equipment_batch(
+    where: BatchFilter,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(require_role(["user", "superadmin"])),
+):
+    conditions = batch_conditions(Equipment, Equipment.name, where)
+    rows = await batch_update(
+        db, Equipment, conditions, {"deleted_at": utcnow()},
+        returning=[Equipment.id, Equipment.name, Equipment.date],
+    )
+    await refresh_equipment_rollups(db, {(r.name, r.date) for r in rows})
+    summary = batch_summary("deleted", [r.id for r in rows], [r.name for r in rows], [r.date for r in rows])
+    if rows:
+        await emit(db, "batch", summary["devices"], action="deleted", count=summary["count"])
+        await bump_version(db, "equipment")
+    await db.commit()
+    return summary
+
+
+# Живая лента изменений: ws://.../equipment/ws?token=<JWT>&devices=A1,A2
+# Подписку можно сменить сообщением {"devices": ["A3"]} или {"devices": null}.
+@router.websocket("/ws")
+async def equipment_feed(websocket: WebSocket, token: str = Query(...), devices: Optional[str] = None):
+    # короткая сессия только на проверку токена — соединение не держим
+    async with AsyncSessionLocal() as db:
+        try:
+            user = await principal_from_token(token, db)
+            await require_role(["user", "admin", "superadmin"])(user=user)
+        except HTTPException:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+    await websocket.accept()
+    await serve(websocket, live_hub.subscribe(parse_devices(devices)))
+
+
 @router.get("/{equipment_id}", response_model=EquipmentRead)
-async def get_equipment_by_id(equipment_id: int, db: AsyncSession = Depends(get_db), user=Depends(require_role(["user", "admin", "superadmin"]))):
-    result = await db.execute(select(Equipment).where(Equipment.id == equipment_id))
+async def get_equipment_by_id(equipment_id: int, db: AsyncSession = Depends(get_read_db), user=Depends(require_role(["user", "admin", "superadmin"]))):
+    result = await db.execute(select(Equipment).where(Equipment.id == equipment_id, Equipment.deleted_at.is_(None)))
     entry = result.scalar_one_or_none()
     if not entry:
         raise HTTPException(status_code=404, detail="Оборудование не найдено")
@@ -34,14 +267,22 @@ async def get_equipment_by_id(equipment_id: int, db: AsyncSession = Depends(get_
 
 @router.put("/{equipment_id}", response_model=EquipmentRead)
 async def update_equipment(equipment_id: int, data: EquipmentUpdate, db: AsyncSession = Depends(get_db), user=Depends(require_role(["user", "superadmin"]))):
-    result = await db.execute(select(Equipment).where(Equipment.id == equipment_id))
+    # строка блокируется до commit: иначе параллельный PUT пересчитал бы
+    # агрегаты по устаревшему old_key и оставил строку в чужом периоде
+    result = await db.execute(
+        select(Equipment).where(Equipment.id == equipment_id, Equipment.deleted_at.is_(None)).with_for_update()
+    )
     entry = result.scalar_one_or_none()
     if not entry:
         raise HTTPException(status_code=404, detail="Оборудование не найдено")
 
+    old_key = (entry.name, entry.date)
     for field, value in data.dict().items():
         setattr(entry, field, value)
 
+    await refresh_equipment_rollups(db, {old_key, (entry.name, entry.date)})
+    await emit(db, "updated", {old_key[0], entry.name}, id=entry.id, data=_entry_data(entry))
+    await bump_version(db, "equipment")
     await db.commit()
     await db.refresh(entry)
     return entry
@@ -49,10 +290,16 @@ async def update_equipment(equipment_id: int, data: EquipmentUpdate, db: AsyncSe
 
 @router.delete("/{equipment_id}", status_code=204)
 async def delete_equipment(equipment_id: int, db: AsyncSession = Depends(get_db), user=Depends(require_role(["user", "superadmin"]))):
-    result = await db.execute(select(Equipment).where(Equipment.id == equipment_id))
+    result = await db.execute(
+        select(Equipment).where(Equipment.id == equipment_id, Equipment.deleted_at.is_(None)).with_for_update()
+    )
     entry = result.scalar_one_or_none()
     if not entry:
         raise HTTPException(status_code=404, detail="Оборудование не найдено")
 
-    await db.delete(entry)
+    entry.deleted_at = utcnow()
+    await db.flush()
+    await refresh_equipment_rollups(db, {(entry.name, entry.date)})
+    await emit(db, "deleted", [entry.name], id=entry.id)
+    await bump_version(db, "equipment")
     await db.commit()
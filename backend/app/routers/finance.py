@@ -1,18 +1,186 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy import func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.database import get_db
-from app.models import Finance
-from app.schemas import FinanceCreate, FinanceUpdate, FinanceRead
+from app.replica import get_read_db
+from app.models import Finance, FinanceRollup, utcnow
+from app.schemas import (
+    BatchFilter,
+    BatchResult,
+    FinanceBatchCreate,
+    FinanceBatchUpdate,
+    FinanceChanges,
+    FinanceCreate,
+    FinanceRead,
+    FinanceSummaryRow,
+    FinanceUpdate,
+    RollupCheckResult,
+)
 from app.auth import require_role
+from app.export import export_response
+from app.querying import contains_pattern
+from app.changes import changes_page, CHANGES_PAGE_DEFAULT, CHANGES_PAGE_MAX
+from app.versions import bump_version, conditional_json
+from app.serialize import FORMAT_MEDIA_TYPES, LIST_FORMATS, fetch_list, schema_columns
+from app.batch import (
+    batch_conditions,
+    batch_insert,
+    batch_summary,
+    batch_update,
+    check_batch_size,
+    patch_values,
+)
+from app.rollups import (
+    FINANCE_MEASURES,
+    apply_finance_delta,
+    apply_finance_deltas,
+    bucket_start,
+    compute_finance_rollups,
+    diff_rollups,
+    finance_values,
+    load_finance_rollups,
+    replace_finance_rollups,
+)
 
 router = APIRouter()
 
+
+def finance_filter_conditions(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    device: Optional[str] = None,
+    search: Optional[str] = None,
+) -> list:
+    """Условия WHERE для фильтров списка и экспорта (те же параметры, что шлёт фронтенд)."""
+    conditions = [Finance.deleted_at.is_(None)]
+    if start:
+        conditions.append(Finance.date >= start)
+    if end:
+        conditions.append(Finance.date <= end)
+    if device:
+        conditions.append(Finance.equipment_name == device)
+    if search:
+        conditions.append(Finance.equipment_name.ilike(contains_pattern(search), escape="\\"))
+    return conditions
+
+
 # 🔐 Только admin и superadmin могут просматривать
+# 📊 ?format=columnar|packed — колонки для графиков (app/serialize.py)
 @router.get("/", response_model=list[FinanceRead])
-async def get_all_finance(db: AsyncSession = Depends(get_db), user=Depends(require_role(["admin", "superadmin"]))):
-    result = await db.execute(select(Finance))
-    return result.scalars().all()
+async def get_all_finance(
+    request: Request,
+    conditions: list = Depends(finance_filter_conditions),
+    fmt: str = Query("json", alias="format", pattern=LIST_FORMATS),
+    db: AsyncSession = Depends(get_read_db),
+    user=Depends(require_role(["admin", "superadmin"])),
+):
+    async def build():
+        query = select(*schema_columns(Finance, FinanceRead)).where(*conditions)
+        return await fetch_list(db, query, fmt), {}
+
+    # 🏷️ ETag по версии таблицы: без изменений — 304 без чтения строк
+    return await conditional_json(request, db, ["finance"], user.role, build, FORMAT_MEDIA_TYPES[fmt])
+
+
+# 🔐 Выгрузка CSV/NDJSON потоком, фильтры как у списка
+@router.get("/export")
+async def export_finance(
+    conditions: list = Depends(finance_filter_conditions),
+    fmt: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    user=Depends(require_role(["admin", "superadmin"])),
+):
+    query = (
+        select(*schema_columns(Finance, FinanceRead))
+        .where(*conditions)
+        .order_by(Finance.date, Finance.id)
+    )
+    return export_response(query, fmt, gzip, "finance")
+
+
+# 🔐 Изменения после курсора: новые/изменённые записи и id удалённых
+@router.get("/changes", response_model=FinanceChanges)
+async def get_finance_changes(
+    since: Optional[str] = None,
+    limit: int = Query(CHANGES_PAGE_DEFAULT, ge=1, le=CHANGES_PAGE_MAX),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(require_role(["admin", "superadmin"])),
+):
+    return await changes_page(db, Finance, since, limit)
+
+
+# 🔐 Итоги по дням / неделям / месяцам из таблицы finance_rollups
+@router.get("/summary", response_model=list[FinanceSummaryRow])
+async def get_finance_summary(
+    group_by: str = Query("month", pattern="^(day|week|month)$"),
+    by_equipment: bool = False,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    device: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(require_role(["admin", "superadmin"])),
+):
+    """
+    Суммы income / expense / benefit / energy по периодам, при by_equipment —
+    ещё и по оборудованию. Читает только агрегаты, сырую таблицу не трогает.
+    Границы start/end выравниваются по началу периода.
+    """
+    conditions = [FinanceRollup.period == group_by]
+    if start:
+        conditions.append(FinanceRollup.bucket >= bucket_start(start, group_by))
+    if end:
+        conditions.append(FinanceRollup.bucket <= end)
+    if device:
+        conditions.append(FinanceRollup.equipment_name == device)
+
+    keys = [FinanceRollup.bucket]
+    if by_equipment:
+        keys.append(FinanceRollup.equipment_name)
+    query = (
+        select(
+            *keys,
+            func.sum(FinanceRollup.row_count).label("row_count"),
+            *[func.sum(getattr(FinanceRollup, m)).label(m) for m in FINANCE_MEASURES],
+        )
+        .where(*conditions)
+        .group_by(*keys)
+        .order_by(*keys)
+    )
+    result = await db.execute(query)
+    rows = []
+    for row in result.mappings():
+        row = dict(row)
+        row["effectiveness"] = row["effectiveness"] / row["row_count"] if row["row_count"] else 0.0
+        rows.append(row)
+    return rows
+
+
+# 🔐 Сверка агрегатов: пересчёт с нуля и сравнение с инкрементальными
+@router.post("/rollups/check", response_model=RollupCheckResult)
+async def check_finance_rollups(
+    repair: bool = False,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(require_role(["superadmin"])),
+):
+    expected = await compute_finance_rollups(db)
+    actual = await load_finance_rollups(db)
+    mismatches = diff_rollups(expected, actual)
+    if repair and mismatches:
+        await replace_finance_rollups(db, expected)
+        await db.commit()
+    return {
+        "checked": len(expected),
+        "mismatches": [
+            {"period": m["key"][0], "bucket": m["key"][1], "equipment_name": m["key"][2],
+             "expected": m["expected"], "actual": m["actual"]}
+            for m in mismatches
+        ],
+        "repaired": bool(repair and mismatches),
+    }
 
 
 # 🔐 Только superadmin может добавить запись
@@ -24,19 +192,97 @@ async def create_finance(
 ):
     new_entry = Finance(**data.dict())
     db.add(new_entry)
+    await apply_finance_delta(db, finance_values(new_entry), +1)
+    await bump_version(db, "finance")
     await db.commit()
     await db.refresh(new_entry)
     return new_entry
 
 
+# колонки, из которых складываются агрегаты finance
+_ROLLUP_COLUMNS = [Finance.date, Finance.equipment_name, *[getattr(Finance, m) for m in FINANCE_MEASURES]]
+
+
+def _rollup_values(row, prefix: str = "") -> dict:
+    return {c.name: getattr(row, prefix + c.name) for c in _ROLLUP_COLUMNS}
+
+
+# 🔐 Только superadmin: пакетное создание одним многострочным INSERT
+@router.post("/batch", response_model=BatchResult, status_code=201)
+async def create_finance_batch(
+    data: FinanceBatchCreate,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(require_role(["superadmin"]))
+):
+    check_batch_size(len(data.items))
+    rows = [item.dict() for item in data.items]
+    created = await batch_insert(db, Finance, rows, [Finance.id])
+    await apply_finance_deltas(db, added=rows)
+    await bump_version(db, "finance")
+    await db.commit()
+    return batch_summary(
+        "created", [r.id for r in created], [r["equipment_name"] for r in rows], [r["date"] for r in rows]
+    )
+
+
+# 🔐 Только superadmin: пакетное изменение по id и/или фильтру одним UPDATE;
+# прежние значения приходят из того же выражения — для агрегатов
+@router.patch("/batch", response_model=BatchResult)
+async def update_finance_batch(
+    data: FinanceBatchUpdate,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(require_role(["superadmin"]))
+):
+    values = patch_values(data.values, required=("date", "equipment_name"))
+    conditions = batch_conditions(Finance, Finance.equipment_name, data.where)
+    rows = await batch_update(
+        db, Finance, conditions, values,
+        returning=[Finance.id, *_ROLLUP_COLUMNS],
+        returning_old=_ROLLUP_COLUMNS,
+    )
+    await apply_finance_deltas(
+        db,
+        added=[_rollup_values(r) for r in rows],
+        removed=[_rollup_values(r, "old_") for r in rows],
+    )
+    if rows:
+        await bump_version(db, "finance")
+    await db.commit()
+    return batch_summary(
+        "updated",
+        [r.id for r in rows],
+        [name for r in rows for name in (r.equipment_name, r.old_equipment_name)],
+        [day for r in rows for day in (r.date, r.old_date)],
+    )
+
+
+# 🔐 Только superadmin: пакетное (мягкое) удаление
+@router.post("/batch/delete", response_model=BatchResult)
+async def delete_finance_batch(
+    where: BatchFilter,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(require_role(["superadmin"]))
+):
+    conditions = batch_conditions(Finance, Finance.equipment_name, where)
+    rows = await batch_update(
+        db, Finance, conditions, {"deleted_at": utcnow()},
+        returning=[Finance.id, *_ROLLUP_COLUMNS],
+    )
+    await apply_finance_deltas(db, removed=[_rollup_values(r) for r in rows])
+    if rows:
+        await bump_version(db, "finance")
+    await db.commit()
+    return batch_summary("deleted", [r.id for r in rows], [r.equipment_name for r in rows], [r.date for r in rows])
+
+
 # 🔐 Только admin/superadmin может просматривать по ID
 @router.get("/{finance_id}", response_model=FinanceRead)
 async def get_finance_by_id(
     finance_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user=Depends(require_role(["admin", "superadmin"]))
 ):
-    result = await db.execute(select(Finance).where(Finance.id == finance_id))
+    result = await db.execute(select(Finance).where(Finance.id == finance_id, Finance.deleted_at.is_(None)))
     entry = result.scalar_one_or_none()
     if not entry:
         raise HTTPException(status_code=404, detail="Запись не найдена")
@@ -51,14 +297,22 @@ async def update_finance(
     db: AsyncSession = Depends(get_db),
     user=Depends(require_role(["superadmin"]))
 ):
-    result = await db.execute(select(Finance).where(Finance.id == finance_id))
+    # строка блокируется до commit: параллельный PUT/DELETE той же записи
+    # иначе вычел бы из агрегатов те же старые значения ещё раз
+    result = await db.execute(
+        select(Finance).where(Finance.id == finance_id, Finance.deleted_at.is_(None)).with_for_update()
+    )
     entry = result.scalar_one_or_none()
     if not entry:
         raise HTTPException(status_code=404, detail="Запись не найдена")
 
+    old_values = finance_values(entry)
     for field, value in data.dict().items():
         setattr(entry, field, value)
 
+    await apply_finance_delta(db, old_values, -1)
+    await apply_finance_delta(db, finance_values(entry), +1)
+    await bump_version(db, "finance")
     await db.commit()
     await db.refresh(entry)
     return entry
@@ -71,10 +325,14 @@ async def delete_finance(
     db: AsyncSession = Depends(get_db),
     user=Depends(require_role(["superadmin"]))
 ):
-    result = await db.execute(select(Finance).where(Finance.id == finance_id))
+    result = await db.execute(
+        select(Finance).where(Finance.id == finance_id, Finance.deleted_at.is_(None)).with_for_update()
+    )
     entry = result.scalar_one_or_none()
     if not entry:
         raise HTTPException(status_code=404, detail="Запись не найдена")
 
-    await db.delete(entry)
+    await apply_finance_delta(db, finance_values(entry), -1)
+    entry.deleted_at = utcnow()
+    await bump_version(db, "finance")
     await db.commit()
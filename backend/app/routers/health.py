@@ -0,0 +1,52 @@
+# app/routers/health.py
+
+import asyncio
+import logging
+import os
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+from app.database import engine, pool_status, replica_engine
+from app.live import live_hub
+from app.replica import replica_monitor
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Сколько ждать ответа базы (включая получение соединения из пула)
+DB_HEALTH_TIMEOUT = float(os.getenv("DB_HEALTH_TIMEOUT", "2"))
+
+
+# Проверка базы: SELECT 1 через пул и состояние пула; для реплики —
+# последняя проверка монитора (её недоступность не делает ответ 503:
+# чтения в это время идут в primary); live — соединение LISTEN живой ленты.
+# Не требует авторизации — вызывается балансировщиком и мониторингом,
+# поэтому наружу отдаётся только тип ошибки: текст драйвера может
+# содержать хост, базу и роль. Подробности — в логе сервера.
+@router.get("/db")
+async def health_db():
+    started = time.perf_counter()
+    try:
+        async with asyncio.timeout(DB_HEALTH_TIMEOUT):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        status, error = "ok", None
+    except Exception as e:  # тайм-аут пула, недоступная база и т.п.
+        logger.warning("Проверка базы не прошла: %s: %s", type(e).__name__, e)
+        status, error = "error", "timeout" if isinstance(e, TimeoutError) else type(e).__name__
+    body = {
+        "status": status,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+        "pool": pool_status(engine.pool),
+        "replica": replica_monitor.status(),
+        "live": live_hub.status(),
+    }
+    if replica_engine is not None:
+        body["replica"]["pool"] = pool_status(replica_engine.pool)
+    if error:
+        body["error"] = error
+    return JSONResponse(body, status_code=200 if status == "ok" else 503)
@@ -1,16 +1,61 @@
 # app/routers/logs.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional, Union
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import or_, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from app.database import get_db
-from app.models import DataLog
-from app.schemas import DataLogCreate, DataLogRead
+from app.replica import get_read_db
+from app.models import DataLog, utcnow
+from app.schemas import DataLogCreate, DataLogRead, DataLogQueued, DataLogChanges
 from app.auth import get_current_user, require_role
+from app.querying import encode_cursor, decode_cursor, contains_pattern
+from app.log_buffer import log_buffer
+from app.export import export_response
+from app.changes import changes_page, CHANGES_PAGE_DEFAULT, CHANGES_PAGE_MAX
+from app.versions import bump_version, conditional_json
+from app.serialize import dump_rows, schema_columns
 
 router = APIRouter()
 
+LOGS_PAGE_DEFAULT = 200
+LOGS_PAGE_MAX = 1000
+
+
+def logs_filter_conditions(
+    search: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    types: Optional[str] = None,
+    user_id: Optional[int] = None,
+) -> list:
+    """
+    Условия WHERE для фильтров истории (те же параметры, что шлёт фронтенд).
+    end включительно: берём всё до начала следующего дня.
+    """
+    conditions = [DataLog.deleted_at.is_(None)]
+    if start:
+        conditions.append(DataLog.created_at >= datetime.combine(start, time.min, tzinfo=timezone.utc))
+    if end:
+        conditions.append(DataLog.created_at < datetime.combine(end + timedelta(days=1), time.min, tzinfo=timezone.utc))
+    if types:
+        actions = [t.strip() for t in types.split(",") if t.strip()]
+        if actions:
+            conditions.append(DataLog.action.in_(actions))
+    if user_id is not None:
+        conditions.append(DataLog.user_id == user_id)
+    if search:
+        pattern = contains_pattern(search)
+        conditions.append(or_(
+            DataLog.action.ilike(pattern, escape="\\"),
+            DataLog.file_name.ilike(pattern, escape="\\"),
+        ))
+    return conditions
+
 
 # 🔐 admin и superadmin могут смотреть все логи
 @router.get(
@@ -19,45 +64,122 @@ router = APIRouter()
     summary="Получить все логи (только admin и superadmin)",
 )
 async def get_logs(
+    request: Request,
+    conditions: list = Depends(logs_filter_conditions),
+    limit: int = Query(LOGS_PAGE_DEFAULT, ge=1, le=LOGS_PAGE_MAX),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    user=Depends(require_role(["admin", "superadmin"])),
+):
+    """
+    Возвращает страницу DataLog от новых к старым с фильтрами
+    (search, start, end, types, user_id).
+    Пагинация по ключу (created_at, id): курсор следующей страницы
+    приходит в заголовке X-Next-Cursor, его нужно передать в ?cursor=.
+    Ответ несёт ETag по версии таблицы: при совпадении If-None-Match — 304.
+    """
+    query = select(*schema_columns(DataLog, DataLogRead)).where(*conditions)
+    if cursor:
+        created_at, log_id = decode_cursor(cursor, datetime, int)
+        query = query.where(tuple_(DataLog.created_at, DataLog.id) < tuple_(created_at, log_id))
+    query = query.order_by(DataLog.created_at.desc(), DataLog.id.desc()).limit(limit + 1)
+
+    async def build():
+        result = await db.execute(query)
+        logs = result.all()
+        headers = {}
+        if len(logs) > limit:
+            logs = logs[:limit]
+            last = logs[-1]
+            headers["X-Next-Cursor"] = encode_cursor(last.created_at, last.id)
+        return dump_rows(list(result.keys()), logs), headers
+
+    return await conditional_json(request, db, ["data_logs"], user.role, build)
+
+
+# 🔐 изменения после курсора (дельта-синхронизация истории)
+@router.get(
+    "/changes",
+    response_model=DataLogChanges,
+    summary="Изменения логов после курсора (только admin и superadmin)",
+)
+async def get_log_changes(
+    since: Optional[str] = None,
+    limit: int = Query(CHANGES_PAGE_DEFAULT, ge=1, le=CHANGES_PAGE_MAX),
     db: AsyncSession = Depends(get_db),
     user=Depends(require_role(["admin", "superadmin"])),
 ):
     """
-    Возвращает список всех DataLog, сортированных от новых к старым.
+    Новые и изменённые логи после курсора since (без него — с начала)
+    и id удалённых. Курсор для следующего запроса — в поле cursor.
+    """
+    return await changes_page(db, DataLog, since, limit)
+
+
+# 🔐 выгрузка логов потоком (CSV / NDJSON), фильтры как у списка
+@router.get(
+    "/export",
+    summary="Выгрузить логи (только admin и superadmin)",
+)
+async def export_logs(
+    conditions: list = Depends(logs_filter_conditions),
+    fmt: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    user=Depends(require_role(["admin", "superadmin"])),
+):
+    """
+    Отдаёт все логи, подходящие под фильтры, без пагинации —
+    строки читаются серверным курсором и сразу уходят клиенту.
     """
-    result = await db.execute(select(DataLog).order_by(DataLog.id.desc()))
-    return result.scalars().all()
+    query = (
+        select(*schema_columns(DataLog, DataLogRead))
+        .where(*conditions)
+        .order_by(DataLog.created_at.desc(), DataLog.id.desc())
+    )
+    return export_response(query, fmt, gzip, "logs")
 
 
 # 🔐 любой авторизованный пользователь может создать запись лога
 @router.post(
     "/",
-    response_model=DataLogRead,
+    response_model=Union[DataLogRead, DataLogQueued],
     status_code=status.HTTP_201_CREATED,
     summary="Создать новую запись лога",
 )
 async def create_log(
     data: DataLogCreate,
+    response: Response,
+    sync: bool = Query(False, description="Записать сразу и вернуть id"),
     db: AsyncSession = Depends(get_db),
     user=Depends(get_current_user),
 ):
     """
     Записывает новое событие в таблицу data_logs.
     Поля user_fullname и user_role берутся из текущего пользователя,
-    created_at заполняется автоматически на уровне БД.
+    created_at фиксируется в момент запроса.
+
+    По умолчанию запись уходит в write-behind буфер и пишется в БД
+    пачкой (ответ 202 без id). С ?sync=true — сразу, ответ 201 с id.
     """
-    log = DataLog(
+    record = dict(
         user_id=user.id,
         user_fullname=user.fullname,
         user_role=user.role,          # ← добавляем роль
         action=data.action,
         parameter=data.parameter,
         file_name=data.file_name,
-        # created_at заполняется DEFAULT now() автоматически
+        created_at=datetime.now(timezone.utc),
     )
+    if not sync:
+        await log_buffer.put(record)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return DataLogQueued(**record)
+
+    # запись мимо буфера: версия поднимается сразу, чтобы автор увидел её в списке
+    log = DataLog(**record)
     db.add(log)
+    await bump_version(db, "data_logs")
     await db.commit()
-    await db.refresh(log)
     return log
 
 
@@ -75,11 +197,12 @@ async def delete_log(
     """
     Удаляет запись лога по её ID.
     """
-    result = await db.execute(select(DataLog).where(DataLog.id == log_id))
+    result = await db.execute(select(DataLog).where(DataLog.id == log_id, DataLog.deleted_at.is_(None)))
     log = result.scalar_one_or_none()
     if not log:
         raise HTTPException(status_code=404, detail="Лог не найден")
-    await db.delete(log)
+    log.deleted_at = utcnow()
+    await bump_version(db, "data_logs")
     await db.commit()
 
 
@@ -94,7 +217,11 @@ async def delete_all_logs(
     user=Depends(require_role(["superadmin"])),
 ):
     """
-    Полностью очищает таблицу data_logs.
+    Помечает все логи удалёнными (надгробия нужны для /logs/changes,
+    физически строки удаляются позже).
     """
-    await db.execute(DataLog.__table__.delete())
+    await db.execute(
+        update(DataLog).where(DataLog.deleted_at.is_(None)).values(deleted_at=utcnow())
+    )
+    await bump_version(db, "data_logs")
     await db.commit()
@@ -0,0 +1,30 @@
+# app/routers/profiles.py
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.auth import require_role
+from app.profiling import profiles
+
+router = APIRouter(dependencies=[Depends(require_role(["superadmin"]))])
+
+
+# Последние профили воркера (без стеков)
+@router.get("/")
+async def list_profiles():
+    return [
+        {k: v for k, v in profile.items() if k not in ("collapsed", "queries")}
+        for profile in reversed(profiles.values())
+    ]
+
+
+# Профиль целиком; format=collapsed — свёрнутые стеки текстом для
+# flamegraph.pl / speedscope.app
+@router.get("/{profile_id}")
+async def get_profile(profile_id: str, fmt: str = Query("json", alias="format", pattern="^(json|collapsed)$")):
+    profile = profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    if fmt == "collapsed":
+        return PlainTextResponse(profile["collapsed"])
+    return profile
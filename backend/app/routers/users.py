@@ -1,10 +1,16 @@
 # src/routers/users.py
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from typing import Optional
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import func, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import noload
 
 from app.database import get_db
-from app.models import User
+from app.replica import get_read_db
+from app.models import User, DataLog
 from app.schemas import (
     UserCreate,
     UserRead,
@@ -13,15 +19,25 @@ from app.schemas import (
     UserUpdate,
     PasswordChange,
     UserAdminUpdate,
+    UserDirectoryPage,
 )
 from app.auth import (
-    hash_password,
-    verify_password,
     create_access_token,
     require_role,
     get_current_user,
+    get_current_user_db,
+    invalidate_principal,
+    Principal,
+)
+from app.hashing import (
+    hash_password_async,
+    verify_password_async,
+    verify_and_update_password,
 )
-import os, shutil
+from app.versions import bump_version, conditional_json
+from app.querying import contains_pattern
+from app.serialize import JSON_OPTIONS, schema_columns
+from app.avatars import AVATAR_SIZES, read_avatar_upload, remove_avatar_files, store_avatar
 
 router = APIRouter(tags=["Пайдаланушылар"])
 
@@ -33,13 +49,14 @@ async def register_user(
     new_user = User(
         fullname=user.fullname,
         email=user.email,
-        password=hash_password(user.password),
+        password=await hash_password_async(user.password),
         avatar_url=user.avatar_url,
         phone=user.phone,
         position=user.position,
         role="user",
     )
     db.add(new_user)
+    await bump_version(db, "users")
     await db.commit()
     await db.refresh(new_user)
     return new_user
@@ -50,15 +67,29 @@ async def login_user(
     user: UserLogin,
     db: AsyncSession = Depends(get_db),
 ):
-    result = await db.execute(select(User).where(User.email == user.email))
+    result = await db.execute(
+        select(User).options(noload(User.data_logs)).where(User.email == user.email)
+    )
     db_user = result.scalar_one_or_none()
 
-    if not db_user or not verify_password(user.password, db_user.password):
+    if not db_user:
+        raise HTTPException(
+            status_code=401,
+            detail="Email немесе құпиясөз қате"
+        )
+
+    valid, new_hash = await verify_and_update_password(user.password, db_user.password)
+    if not valid:
         raise HTTPException(
             status_code=401,
             detail="Email немесе құпиясөз қате"
         )
 
+    # BCRYPT_ROUNDS изменился — прозрачно перехешируем пароль
+    if new_hash:
+        db_user.password = new_hash
+        await db.commit()
+
     access_token = create_access_token(
         {"sub": str(db_user.id), "role": db_user.role}
     )
@@ -67,7 +98,7 @@ async def login_user(
 
 @router.get("/me", response_model=UserRead)
 async def get_me(
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     return current_user
 
@@ -77,7 +108,7 @@ async def get_me(
     summary="Тек әкімшіге",
 )
 async def admin_page(
-    user: User = Depends(require_role(["admin", "superadmin"]))
+    user: Principal = Depends(require_role(["admin", "superadmin"]))
 ):
     return {
         "message": f"Сәлеметсіз бе, {user.fullname}! Сізге қолжетімді."
@@ -88,11 +119,13 @@ async def admin_page(
 async def update_me(
     data: UserUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_db),
 ):
     for field, value in data.dict(exclude_unset=True).items():
         setattr(current_user, field, value)
+    await bump_version(db, "users")
     await db.commit()
+    invalidate_principal(current_user.id)
     await db.refresh(current_user)
     return current_user
 
@@ -101,46 +134,138 @@ async def update_me(
 async def change_password(
     data: PasswordChange,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_db),
 ):
-    if not verify_password(data.current_password, current_user.password):
+    if not await verify_password_async(data.current_password, current_user.password):
         raise HTTPException(
             status_code=400,
             detail="Қазіргі құпиясөз дұрыс емес"
         )
 
-    current_user.password = hash_password(data.new_password)
+    current_user.password = await hash_password_async(data.new_password)
     await db.commit()
+    invalidate_principal(current_user.id)
 
 
-@router.post("/me/avatar", response_model=dict)
+# Аватар: multipart с полем file, до AVATAR_MAX_BYTES. В avatar_url
+# сохраняется самый большой размер, остальные — в thumbnails
+# (фронтенд берёт маленький для таблиц).
+@router.post(
+    "/me/avatar",
+    response_model=dict,
+    openapi_extra={"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object", "properties": {"file": {"type": "string", "format": "binary"}}, "required": ["file"],
+    }}}}},
+)
 async def upload_avatar(
-    file: UploadFile = File(...),
+    request: Request,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_db),
 ):
-    filename = f"user_{current_user.id}.jpg"
-    folder_path = "app/static/avatars"
-    os.makedirs(folder_path, exist_ok=True)
-    file_path = os.path.join(folder_path, filename)
-
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    data = await read_avatar_upload(request)
+    thumbnails = await store_avatar(data)
 
-    current_user.avatar_url = f"/static/avatars/{filename}"
+    previous_url = current_user.avatar_url
+    current_user.avatar_url = thumbnails[AVATAR_SIZES[-1]]
     db.add(current_user)
+    await bump_version(db, "users")
     await db.commit()
+    invalidate_principal(current_user.id)
+
+    # старые файлы удаляем, если то же фото не стоит у кого-то ещё
+    if previous_url and previous_url != current_user.avatar_url:
+        still_used = await db.scalar(select(func.count()).select_from(User).where(User.avatar_url == previous_url))
+        if not still_used:
+            remove_avatar_files(previous_url)
+
+    return {"avatar_url": current_user.avatar_url, "thumbnails": thumbnails}
+
+USERS_PAGE_DEFAULT = 50
+USERS_PAGE_MAX = 500
+_USER_SORTS = ("id", "fullname", "email", "role", "position", "log_count", "last_activity")
 
-    return {"avatar_url": current_user.avatar_url}
 
-# Получить всех пользователей (только для админа)
-@router.get("/all", response_model=list[UserRead])
+def _activity_stats(user_ids=None):
+    """Один GROUP BY по data_logs: число записей и последняя активность."""
+    query = (
+        select(
+            DataLog.user_id.label("user_id"),
+            func.count().label("log_count"),
+            func.max(DataLog.created_at).label("last_activity"),
+        )
+        .where(DataLog.deleted_at.is_(None))
+        .group_by(DataLog.user_id)
+    )
+    if user_ids is not None:
+        query = query.where(DataLog.user_id.in_(user_ids))
+    return query
+
+
+# Справочник пользователей (только для админа): страница с поиском
+# по ФИО / email / роли / должности, фильтром роли и сортировкой.
+# stats=true добавляет число логов и последнюю активность.
+@router.get("/all", response_model=UserDirectoryPage)
 async def get_all_users(
-    db: AsyncSession = Depends(get_db),
-    _: User = Depends(require_role(["admin", "superadmin"]))
+    request: Request,
+    search: Optional[str] = None,
+    role: Optional[str] = None,
+    sort: str = Query("fullname", pattern=f"^({'|'.join(_USER_SORTS)})$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(USERS_PAGE_DEFAULT, ge=1, le=USERS_PAGE_MAX),
+    stats: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(require_role(["admin", "superadmin"]))
 ):
-    result = await db.execute(select(User))
-    return result.scalars().all()
+    conditions = []
+    if search:
+        pattern = contains_pattern(search)
+        conditions.append(or_(*[
+            column.ilike(pattern, escape="\\")
+            for column in (User.fullname, User.email, User.role, User.position)
+        ]))
+    if role:
+        conditions.append(User.role == role)
+    by_activity = sort in ("log_count", "last_activity")
+    if by_activity and not stats:
+        raise HTTPException(status_code=400, detail="Сортировка по активности требует stats=true")
+
+    async def build():
+        total = await db.scalar(select(func.count()).select_from(User).where(*conditions))
+        columns = schema_columns(User, UserRead)
+        if by_activity:
+            # сортировка по активности — агрегат по всем пользователям
+            activity = _activity_stats().subquery()
+            sort_column = func.coalesce(activity.c.log_count, 0) if sort == "log_count" else activity.c.last_activity
+            query = select(*columns, activity.c.log_count, activity.c.last_activity) \
+                .outerjoin(activity, activity.c.user_id == User.id)
+        else:
+            sort_column = User.__table__.c[sort]
+            query = select(*columns)
+        direction = sort_column.desc() if order == "desc" else sort_column.asc()
+        direction = direction.nulls_last()
+        result = await db.execute(query.where(*conditions).order_by(direction, User.id).offset(offset).limit(limit))
+        keys = list(result.keys())
+        items = [dict(zip(keys, row)) for row in result.all()]
+
+        if stats and not by_activity and items:
+            # агрегат только по пользователям страницы
+            result = await db.execute(_activity_stats([item["id"] for item in items]))
+            activity = {row.user_id: row for row in result.all()}
+            for item in items:
+                row = activity.get(item["id"])
+                item["log_count"] = row.log_count if row else 0
+                item["last_activity"] = row.last_activity if row else None
+        elif by_activity:
+            for item in items:
+                item["log_count"] = item["log_count"] or 0
+
+        page = {"items": items, "total": total, "offset": offset, "limit": limit}
+        return orjson.dumps(page, option=JSON_OPTIONS), {}
+
+    # ETag по версии таблиц: без изменений — 304
+    tables = ["users", "data_logs"] if stats else ["users"]
+    return await conditional_json(request, db, tables, current_user.role, build)
 
 
 # Изменить роль и/или должность пользователя
@@ -149,9 +274,11 @@ async def update_user_role_and_position(
     user_id: int,
     data: UserAdminUpdate,
     db: AsyncSession = Depends(get_db),
-    _: User = Depends(require_role(["admin", "superadmin"]))
+    _: Principal = Depends(require_role(["admin", "superadmin"]))
 ):
-    result = await db.execute(select(User).where(User.id == user_id))
+    result = await db.execute(
+        select(User).options(noload(User.data_logs)).where(User.id == user_id)
+    )
     user = result.scalar_one_or_none()
 
     if not user:
@@ -160,7 +287,9 @@ async def update_user_role_and_position(
     for field, value in data.dict(exclude_unset=True).items():
         setattr(user, field, value)
 
+    await bump_version(db, "users")
     await db.commit()
+    invalidate_principal(user_id)
     await db.refresh(user)
     return user
 
@@ -168,7 +297,7 @@ async def update_user_role_and_position(
 async def delete_user(
     user_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_role(["admin", "superadmin"]))
+    current_user: Principal = Depends(require_role(["admin", "superadmin"]))
 ):
     # ❌ Запрещаем удаление самого себя
     if user_id == current_user.id:
@@ -183,5 +312,16 @@ async def delete_user(
     if not user:
         raise HTTPException(status_code=404, detail="Пайдаланушы табылмады")
 
+    # журнал действий ссылается на пользователя (data_logs.user_id NOT NULL):
+    # удалить можно только того, у кого записей нет, в том числе удалённых
+    has_logs = await db.scalar(select(select(DataLog.id).where(DataLog.user_id == user_id).exists()))
+    if has_logs:
+        raise HTTPException(
+            status_code=409,
+            detail="Пайдаланушының әрекеттер журналы бар, оны жоюға болмайды"
+        )
+
     await db.delete(user)
+    await bump_version(db, "users")
     await db.commit()
+    invalidate_principal(user_id)
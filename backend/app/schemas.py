@@ -1,9 +1,12 @@
 # src/schemas.py
 
-from pydantic import BaseModel, EmailStr, constr
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, EmailStr, conint, constr
+from typing import Optional, Dict, Any, List
 from datetime import date, datetime
 
+# в схемах с полем date = None имя поля перекрывает тип — там используется псевдоним
+DateType = date
+
 
 # ----------------------------------------
 # Пользователь
@@ -31,6 +34,19 @@ class UserRead(BaseModel):
         orm_mode = True
 
 
+class UserDirectoryItem(UserRead):
+    # заполняются только при ?stats=true
+    log_count: Optional[int] = None
+    last_activity: Optional[datetime] = None
+
+
+class UserDirectoryPage(BaseModel):
+    items: List[UserDirectoryItem]
+    total: int
+    offset: int
+    limit: int
+
+
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
@@ -81,6 +97,22 @@ class FinanceUpdate(FinanceBase):
     pass
 
 
+class FinancePatch(BaseModel):
+    # для пакетного изменения: меняются только переданные поля
+    date: Optional[DateType] = None
+    equipment_name: Optional[str] = None
+    energy: Optional[float] = None
+    effectiveness: Optional[float] = None
+    bcd_total: Optional[float] = None
+    income: Optional[int] = None
+    expense: Optional[int] = None
+    benefit: Optional[int] = None
+
+
+class FinanceBatchCreate(BaseModel):
+    items: List[FinanceCreate]
+
+
 class FinanceRead(FinanceBase):
     id: int
 
@@ -88,6 +120,31 @@ class FinanceRead(FinanceBase):
         orm_mode = True
 
 
+class FinanceChanges(BaseModel):
+    items: List[FinanceRead]
+    deleted: List[int]
+    cursor: str
+    has_more: bool
+
+
+class FinanceSummaryRow(BaseModel):
+    bucket: date                            # начало дня / недели / месяца
+    equipment_name: Optional[str] = None    # None — итог по всему оборудованию
+    row_count: int
+    energy: float
+    effectiveness: float                    # среднее за период
+    bcd_total: float
+    income: int
+    expense: int
+    benefit: int
+
+
+class RollupCheckResult(BaseModel):
+    checked: int
+    mismatches: List[Dict[str, Any]]
+    repaired: bool
+
+
 # ----------------------------------------
 # Оборудование / Мониторинг
 # ----------------------------------------
@@ -117,6 +174,28 @@ class EquipmentUpdate(EquipmentBase):
     pass
 
 
+class EquipmentPatch(BaseModel):
+    # для пакетного изменения: меняются только переданные поля
+    name: Optional[str] = None
+    date: Optional[DateType] = None
+    asic: Optional[int] = None
+    fan: Optional[int] = None
+    core: Optional[int] = None
+    memory: Optional[int] = None
+    disk: Optional[int] = None
+    energy_vt: Optional[int] = None
+    energy_kvt: Optional[int] = None
+    hashrate: Optional[int] = None
+    effectiveness: Optional[int] = None
+    uptime: Optional[int] = None
+    hw_error: Optional[int] = None
+    active: Optional[int] = None
+
+
+class EquipmentBatchCreate(BaseModel):
+    items: List[EquipmentCreate]
+
+
 class EquipmentRead(EquipmentBase):
     id: int
 
@@ -124,6 +203,83 @@ class EquipmentRead(EquipmentBase):
         orm_mode = True
 
 
+class EquipmentChanges(BaseModel):
+    items: List[EquipmentRead]
+    deleted: List[int]
+    cursor: str
+    has_more: bool
+
+
+class TimeSeriesPoint(BaseModel):
+    t: date
+    value: float            # среднее за период
+    min: float
+    max: float
+    count: int
+
+
+class TimeSeries(BaseModel):
+    metric: str
+    device: Optional[str]
+    mode: str               # rollup | lttb
+    grain: str              # day | week | month
+    start: Optional[date]
+    end: Optional[date]
+    points: List[TimeSeriesPoint]
+
+
+# ----------------------------------------
+# Пакетные изменения
+# ----------------------------------------
+
+class BatchFilter(BaseModel):
+    """Какие строки менять: список id и/или фильтр (хотя бы одно условие)."""
+    ids: Optional[List[int]] = None
+    start: Optional[date] = None
+    end: Optional[date] = None
+    device: Optional[str] = None    # equipment.name / finance.equipment_name
+
+
+class EquipmentBatchUpdate(BaseModel):
+    where: BatchFilter
+    values: EquipmentPatch
+
+
+class FinanceBatchUpdate(BaseModel):
+    where: BatchFilter
+    values: FinancePatch
+
+
+class BatchResult(BaseModel):
+    action: str                 # created | updated | deleted
+    count: int
+    ids: List[int]
+    devices: List[str]          # затронутое оборудование
+    start: Optional[date]       # диапазон затронутых дат
+    end: Optional[date]
+
+
+# ----------------------------------------
+# Импорт CSV
+# ----------------------------------------
+
+class ImportRowError(BaseModel):
+    line: int
+    errors: List[str]
+
+
+class ImportResult(BaseModel):
+    rows_total: int
+    rows_imported: int
+    rows_failed: int
+    batches: int
+    errors: List[ImportRowError]
+    errors_truncated: bool
+    loader: str                 # copy | insert
+    elapsed_seconds: float
+    rows_per_second: float
+
+
 # ----------------------------------------
 # Логирование действий пользователя
 # ----------------------------------------
@@ -146,3 +302,131 @@ class DataLogRead(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class DataLogQueued(BaseModel):
+    """Ответ на запись, принятую в буфер: id появится после сброса в БД."""
+    id: Optional[int] = None
+    user_id: int
+    user_fullname: str
+    user_role: str
+    action: str
+    parameter: Optional[Dict[str, Any]]
+    file_name: Optional[str]
+    created_at: datetime
+
+
+class DataLogChanges(BaseModel):
+    items: List[DataLogRead]
+    deleted: List[int]
+    cursor: str
+    has_more: bool
+
+
+# ----------------------------------------
+# Наборы данных для аналитики
+# ----------------------------------------
+
+class DatasetColumnInfo(BaseModel):
+    name: str
+    kind: str                   # number | string
+
+
+class DatasetRead(BaseModel):
+    id: str
+    name: str
+    file_name: Optional[str]
+    rows: int
+    columns: List[DatasetColumnInfo]
+    size_bytes: int
+    created_at: datetime
+    last_accessed_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class DatasetFilter(BaseModel):
+    column: str
+    op: constr(pattern="^(eq|ne|lt|le|gt|ge|in|contains|empty|not_empty)$")
+    value: Any = None           # для in — список
+
+
+class DatasetQuery(BaseModel):
+    filters: List[DatasetFilter] = []
+    search: Optional[str] = None        # подстрока в любой текстовой колонке
+    sort: List[str] = []                # "колонка" или "-колонка" (по убыванию)
+    columns: Optional[List[str]] = None # проекция; по умолчанию все
+    offset: conint(ge=0) = 0
+    limit: conint(ge=1, le=10000) = 100
+
+
+class DatasetPage(BaseModel):
+    columns: List[str]
+    total: int                  # строк после фильтров
+    offset: int
+    data: List[List[Any]]       # значения по колонкам
+
+
+class AggregateSpec(BaseModel):
+    column: Optional[str] = None        # без колонки — count(*)
+    fn: constr(pattern="^(count|sum|mean|min|max|p[0-9]{1,2})$")
+    name: Optional[str] = None          # имя серии в ответе, по умолчанию fn(column)
+
+
+class BinSpec(BaseModel):
+    column: str
+    kind: constr(pattern="^(histogram|time)$") = "time"
+    bins: conint(ge=2, le=1000) = 20              # для histogram
+    interval: constr(pattern="^(day|week|month)$") = "day"  # для time
+
+
+class AggregateQuery(BaseModel):
+    source: constr(pattern="^(dataset|equipment|finance)$") = "dataset"
+    dataset_id: Optional[str] = None
+    filters: List[DatasetFilter] = []
+    group_by: List[str] = []
+    bin: Optional[BinSpec] = None
+    aggregations: List[AggregateSpec]
+    max_groups: conint(ge=1, le=10000) = 1000
+
+
+class AggregateResult(BaseModel):
+    keys: List[str]                     # колонки-ключи в series
+    series: Dict[str, List[Any]]        # ключи и агрегаты по колонкам
+    groups: int
+    rows: int                           # строк после фильтров
+    truncated: bool
+    edges: Optional[List[float]] = None # границы корзин гистограммы
+
+
+# ----------------------------------------
+# Главная страница
+# ----------------------------------------
+
+class EquipmentKpi(BaseModel):
+    date: Optional[date]            # последний день с данными
+    miners: int
+    active_miners: int
+    hashrate: float
+    energy_kvt: float
+    uptime_avg: Optional[float]
+    hw_errors: int
+
+
+class FinanceKpi(BaseModel):
+    month: Optional[date]           # последний месяц с данными
+    income: float
+    expense: float
+    benefit: float
+    energy: float
+    total_income: float
+    total_expense: float
+    total_benefit: float
+    total_energy: float
+
+
+class DashboardSummary(BaseModel):
+    equipment: EquipmentKpi
+    finance: Optional[FinanceKpi]   # None для роли user
+    computed_at: datetime
@@ -0,0 +1,114 @@
+# app/serialize.py
+
+import struct
+import sys
+from array import array
+
+import orjson
+from sqlalchemy import Float, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Быстрый путь для больших списков: вместо ORM-объектов и повторной
+# проверки каждой строки pydantic-схемой выбираются только колонки схемы,
+# и кортежи сразу кодируются orjson в байты. Схема (response_model)
+# остаётся в декораторе маршрута — для OpenAPI и документации.
+# OPT_UTC_Z — как у pydantic: UTC-время оканчивается на «Z».
+JSON_OPTIONS = orjson.OPT_UTC_Z
+
+# Форматы списков для аналитики (?format=):
+#   json     — массив объектов (по умолчанию);
+#   columnar — {"columns": [...], "rows": n, "data": [[значения колонки], ...]};
+#   packed   — двоичный: PACKED_MAGIC, uint32 LE длина заголовка, JSON-заголовок,
+#              затем буферы колонок little-endian, каждый выровнен на 8 байт.
+#              Типы: int8/int16/int32 (самый узкий по диапазону), float64
+#              (NULL → NaN), dict (коды uint8/16/32 + словарь значений
+#              в заголовке — для строк и дат).
+LIST_FORMATS = "^(json|columnar|packed)$"
+PACKED_MAGIC = b"PKD1"
+FORMAT_MEDIA_TYPES = {
+    "json": "application/json",
+    "columnar": "application/json",
+    "packed": "application/octet-stream",
+}
+
+
+def schema_columns(model, schema) -> list:
+    """Колонки таблицы model в порядке полей схемы ответа."""
+    return [model.__table__.c[name] for name in schema.__fields__]
+
+
+def dump_rows(keys: list[str], rows) -> bytes:
+    return orjson.dumps([dict(zip(keys, row)) for row in rows], option=JSON_OPTIONS)
+
+
+async def fetch_json(db: AsyncSession, query) -> bytes:
+    """Выполнить запрос по колонкам и вернуть JSON-массив объектов."""
+    result = await db.execute(query)
+    return dump_rows(list(result.keys()), result.all())
+
+
+def _transpose(rows, width: int) -> list:
+    # zip(*rows) собирает колонки за один проход без промежуточных словарей
+    return list(zip(*rows)) if rows else [()] * width
+
+
+def dump_columnar(keys: list[str], rows) -> bytes:
+    return orjson.dumps(
+        {"columns": keys, "rows": len(rows), "data": _transpose(rows, len(keys))},
+        option=JSON_OPTIONS,
+    )
+
+
+def _int_typecode(low: int, high: int, signed: bool = True) -> tuple[str, str] | None:
+    """Самый узкий тип array, вмещающий [low, high]; None — не влезает в 32 бита."""
+    for code, name in (("b", "int8"), ("h", "int16"), ("i", "int32")):
+        if not signed:
+            code, name = code.upper(), "u" + name
+        bits = array(code).itemsize * 8
+        lo, hi = (-2 ** (bits - 1), 2 ** (bits - 1) - 1) if signed else (0, 2 ** bits - 1)
+        if lo <= low and high <= hi:
+            return code, name
+    return None
+
+
+def _pack_column(column, values) -> tuple[dict, array]:
+    if isinstance(column.type, Integer) and None not in values:
+        typecode = _int_typecode(min(values), max(values)) if values else ("b", "int8")
+        if typecode:
+            return {"type": typecode[1]}, array(typecode[0], values)
+    if isinstance(column.type, (Integer, Float)):
+        nan = float("nan")
+        return {"type": "float64"}, array("d", [nan if v is None else v for v in values])
+    dictionary: dict = {}
+    codes = [dictionary.setdefault(v, len(dictionary)) for v in values]
+    typecode, name = _int_typecode(0, max(len(dictionary) - 1, 0), signed=False)
+    return {"type": "dict", "codes": name, "dictionary": list(dictionary)}, array(typecode, codes)
+
+
+def dump_packed(columns: list, rows) -> bytes:
+    """Колонки результата упакованными типизированными массивами (см. PACKED_MAGIC)."""
+    meta, buffers, offset = [], [], 0
+    for column, values in zip(columns, _transpose(rows, len(columns))):
+        info, buffer = _pack_column(column, values)
+        if sys.byteorder == "big":
+            buffer.byteswap()
+        data = buffer.tobytes()
+        data += b"\0" * (-len(data) % 8)
+        meta.append({"name": column.name, "offset": offset, **info})
+        buffers.append(data)
+        offset += len(data)
+    header = orjson.dumps({"rows": len(rows), "columns": meta}, option=JSON_OPTIONS)
+    # данные начинаются с границы 8 байт — на клиенте их можно читать без копирования
+    header += b" " * (-(len(PACKED_MAGIC) + 4 + len(header)) % 8)
+    return b"".join([PACKED_MAGIC, struct.pack("<I", len(header)), header, *buffers])
+
+
+async def fetch_list(db: AsyncSession, query, fmt: str) -> bytes:
+    """Выполнить запрос по колонкам и закодировать в формате fmt (LIST_FORMATS)."""
+    result = await db.execute(query)
+    rows = result.all()
+    if fmt == "columnar":
+        return dump_columnar(list(result.keys()), rows)
+    if fmt == "packed":
+        return dump_packed(list(query.selected_columns), rows)
+    return dump_rows(list(result.keys()), rows)
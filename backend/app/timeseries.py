@@ -0,0 +1,179 @@
+# app/timeseries.py
+
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.models import Equipment, EquipmentRollup
+from app.rollups import bucket_end, bucket_start
+
+
+def choose_grain(start: date, end: date, points: int) -> str:
+    """
+    Самый мелкий период, при котором число точек не превышает points.
+    Месяц — самый крупный период: на длинных диапазонах месячных точек
+    может быть больше points, их прореживает equipment_series.
+    """
+    days = (end - start).days + 1
+    if days <= points:
+        return "day"
+    if days / 7 <= points:
+        return "week"
+    return "month"
+
+
+def lttb(series: list[dict], threshold: int) -> list[dict]:
+    """
+    Largest-Triangle-Three-Buckets: прореживание ряда до threshold точек
+    с сохранением формы графика (пики и провалы не теряются).
+    """
+    n = len(series)
+    if threshold >= n or threshold < 3:
+        return series
+
+    xs = [p["t"].toordinal() for p in series]
+    ys = [p["value"] for p in series]
+    sampled = [series[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # среднее следующего корзины — третья вершина треугольника
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(series[best])
+        a = best
+    sampled.append(series[-1])
+    return sampled
+
+
+async def _date_range(db: AsyncSession, device: Optional[str]) -> tuple[Optional[date], Optional[date]]:
+    query = select(func.min(Equipment.date), func.max(Equipment.date)).where(Equipment.deleted_at.is_(None))
+    if device:
+        query = query.where(Equipment.name == device)
+    return (await db.execute(query)).one()
+
+
+async def _daily(db: AsyncSession, metric: str, device: Optional[str], start: date, end: date) -> list[dict]:
+    column = getattr(Equipment, metric)
+    query = (
+        select(Equipment.date, func.count(column), func.sum(column), func.min(column), func.max(column))
+        .where(Equipment.date >= start, Equipment.date <= end, column.isnot(None), Equipment.deleted_at.is_(None))
+        .group_by(Equipment.date)
+        .order_by(Equipment.date)
+    )
+    if device:
+        query = query.where(Equipment.name == device)
+    result = await db.execute(query)
+    return [
+        {"t": day, "value": total / count, "min": lo, "max": hi, "count": count}
+        for day, count, total, lo, hi in result.all()
+    ]
+
+
+def _combine(bucket: date, days: list[dict]) -> dict:
+    """Одна точка периода из дневных точек."""
+    count = sum(d["count"] for d in days)
+    total = sum(d["value"] * d["count"] for d in days)
+    return {
+        "t": bucket,
+        "value": total / count,
+        "min": min(d["min"] for d in days),
+        "max": max(d["max"] for d in days),
+        "count": count,
+    }
+
+
+async def _rolled(db: AsyncSession, metric: str, device: Optional[str], start: date, end: date, grain: str) -> list[dict]:
+    """
+    Ряд по агрегатам недель или месяцев. Агрегаты покрывают период целиком,
+    поэтому крайние периоды, выходящие за [start, end], считаются заново
+    по дням внутри диапазона; подпись точки — начало периода.
+    """
+    first, last = bucket_start(start, grain), bucket_start(end, grain)
+    query = (
+        select(
+            EquipmentRollup.bucket,
+            func.sum(EquipmentRollup.count),
+            func.sum(EquipmentRollup.sum),
+            func.min(EquipmentRollup.min),
+            func.max(EquipmentRollup.max),
+        )
+        .where(
+            EquipmentRollup.period == grain,
+            EquipmentRollup.metric == metric,
+            EquipmentRollup.bucket >= first,
+            EquipmentRollup.bucket <= last,
+        )
+        .group_by(EquipmentRollup.bucket)
+        .order_by(EquipmentRollup.bucket)
+    )
+    if device:
+        query = query.where(EquipmentRollup.name == device)
+    result = await db.execute(query)
+    points = {
+        bucket: {"t": bucket, "value": total / count, "min": lo, "max": hi, "count": count}
+        for bucket, count, total, lo, hi in result.all()
+    }
+
+    for bucket in {first, last}:
+        lo, hi = max(bucket, start), min(bucket_end(bucket, grain), end)
+        if lo == bucket and hi == bucket_end(bucket, grain):
+            continue
+        points.pop(bucket, None)
+        days = await _daily(db, metric, device, lo, hi)
+        if days:
+            points[bucket] = _combine(bucket, days)
+    return [points[bucket] for bucket in sorted(points)]
+
+
+async def equipment_series(
+    db: AsyncSession,
+    metric: str,
+    device: Optional[str],
+    start: Optional[date],
+    end: Optional[date],
+    points: int,
+    mode: str,
+) -> dict:
+    """
+    Ряд метрики для графика не длиннее points точек.
+    mode=rollup — min/max/avg по дням, неделям или месяцам (по агрегатам),
+    mode=lttb — дневной ряд, прореженный LTTB.
+    Без device значения усредняются по всем устройствам.
+    """
+    if start is None or end is None:
+        first, last = await _date_range(db, device)
+        start = start or first
+        end = end or last
+    series = {"metric": metric, "device": device, "mode": mode, "start": start, "end": end, "points": []}
+    if start is None or end is None or start > end:
+        series["grain"] = "day"
+        return series
+
+    if mode == "lttb":
+        series["grain"] = "day"
+        series["points"] = lttb(await _daily(db, metric, device, start, end), points)
+        return series
+
+    grain = choose_grain(start, end, points)
+    series["grain"] = grain
+    if grain == "day":
+        series["points"] = await _daily(db, metric, device, start, end)
+    else:
+        rolled = await _rolled(db, metric, device, start, end, grain)
+        # месяцев больше, чем points, — крупнее периода нет, прореживаем
+        series["points"] = lttb(rolled, points) if grain == "month" else rolled
+    return series
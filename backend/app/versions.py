@@ -0,0 +1,81 @@
+# app/versions.py
+
+import hashlib
+import os
+from typing import Awaitable, Callable, Iterable
+
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.cache import TTLCache
+from app.models import TableVersion
+from app.querying import upsert
+
+# Версии таблиц для условных GET: каждый обработчик, меняющий таблицу,
+# вызывает bump_version() до commit. Список отвечает ETag, вычисленным из
+# (маршрут, роль, параметры запроса, версии таблиц); совпавший
+# If-None-Match получает 304 без чтения строк.
+# Дополнительно готовое тело ответа кэшируется в памяти воркера
+# (RESPONSE_CACHE_SIZE=0 отключает кэш).
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+RESPONSE_CACHE_MAX_BODY = int(os.getenv("RESPONSE_CACHE_MAX_BODY", str(8 * 1024 * 1024)))
+
+response_cache = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+
+
+async def bump_version(db: AsyncSession, *tables: str) -> None:
+    """Увеличить версии таблиц в текущей транзакции."""
+    stmt = upsert(db, TableVersion).values([{"name": name, "version": 1} for name in tables])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"version": TableVersion.version + 1},
+    )
+    await db.execute(stmt)
+
+
+async def get_versions(db: AsyncSession, tables: Iterable[str]) -> tuple:
+    tables = sorted(tables)
+    result = await db.execute(select(TableVersion.name, TableVersion.version).where(TableVersion.name.in_(tables)))
+    versions = dict(result.all())
+    return tuple((name, versions.get(name, 0)) for name in tables)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+
+async def conditional_json(
+    request: Request,
+    db: AsyncSession,
+    tables: Iterable[str],
+    role: str,
+    build: Callable[[], Awaitable[tuple[bytes, dict]]],
+    media_type: str = "application/json",
+) -> Response:
+    """
+    Ответ списка с ETag. build() вызывается только если у клиента
+    устаревшая версия и тела нет в кэше; возвращает (тело, заголовки).
+    """
+    versions = await get_versions(db, tables)
+    params = tuple(sorted(request.query_params.multi_items()))
+    key = (request.url.path, role, params, versions)
+    etag = '"' + hashlib.sha1(repr(key).encode()).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    cached = response_cache.get(key)
+    if cached is None:
+        body, extra = await build()
+        cached = (body, extra)
+        if len(body) <= RESPONSE_CACHE_MAX_BODY:
+            response_cache.set(key, cached)
+    body, extra = cached
+    return Response(content=body, media_type=media_type, headers={**headers, **extra})
@@ -0,0 +1,108 @@
+# benchmarks/auth_roundtrips.py
+"""
+Сколько обращений к БД стоит один авторизованный запрос.
+
+«До»: прежний get_current_user — select(User) с selectin-загрузкой
+всех data_logs пользователя на каждый запрос.
+«После»: GET /users/me через приложение (кэш принципалов).
+
+Запуск из каталога backend:
+    python -m benchmarks.auth_roundtrips --logs 5000 --requests 200
+По умолчанию используется временная SQLite (aiosqlite из
+requirements-dev.txt); для Postgres передайте --database-url.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--logs", type=int, default=2000, help="сколько DataLog у пользователя")
+    parser.add_argument("--requests", type=int, default=200)
+    return parser.parse_args()
+
+
+args = parse_args()
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+else:
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+os.environ.setdefault("JWT_SECRET_KEY", "bench-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+
+import httpx  # noqa: E402
+from sqlalchemy import event, insert  # noqa: E402
+from sqlalchemy.future import select  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.database import engine, init_db, AsyncSessionLocal  # noqa: E402
+from app.models import User, DataLog  # noqa: E402
+from app.auth import create_access_token, hash_password  # noqa: E402
+
+statements = 0
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _count(conn, cursor, statement, parameters, context, executemany):
+    global statements
+    statements += 1
+
+
+async def seed() -> int:
+    async with AsyncSessionLocal() as db:
+        user = User(fullname="Bench", email="bench@example.com", password=hash_password("bench123"), role="admin")
+        db.add(user)
+        await db.flush()
+        if args.logs:
+            await db.execute(insert(DataLog), [
+                {"user_id": user.id, "user_fullname": user.fullname, "user_role": user.role, "action": "Upload CSV"}
+                for _ in range(args.logs)
+            ])
+        await db.commit()
+        return user.id
+
+
+async def legacy_lookup(user_id: int):
+    # копия прежнего пути get_current_user
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User).where(User.id == user_id))
+        return result.scalar_one_or_none()
+
+
+async def measure(name: str, call) -> None:
+    global statements
+    statements = 0
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        await call()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<28} {statements / args.requests:6.2f} statements/request  "
+          f"{elapsed / args.requests * 1000:8.2f} ms/request")
+
+
+async def main():
+    await init_db()
+    user_id = await seed()
+    token = create_access_token({"sub": str(user_id), "role": "admin"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def me():
+            response = await client.get("/users/me", headers=headers)
+            response.raise_for_status()
+
+        await measure("before: select(User)+logs", lambda: legacy_lookup(user_id))
+        await measure("after:  GET /users/me", me)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    engine.echo = False
+    asyncio.run(main())
@@ -0,0 +1,334 @@
+# benchmarks/load.py
+"""
+Нагрузочный прогон API: синтетические данные и конкурентные клиенты
+по всем роутерам (users, equipment, finance, logs, dashboard).
+
+База заполняется генератором:
+    --users N        пользователей (первый — superadmin, второй — admin, не меньше 3)
+    --equipment M    строк оборудования за --days D дней
+    --finance K      строк finance за те же дни
+    --logs L         записей истории
+Затем каждый сценарий прогоняется --requests раз с --concurrency
+одновременными клиентами; печатаются p50/p95/p99 и запросов в секунду.
+Результат пишется в JSON (с хешем коммита) — два файла можно сравнить
+через --compare.
+
+Запуск из каталога backend:
+    python -m benchmarks.load --users 50 --equipment 100000 --days 90 \\
+        --finance 20000 --logs 100000 --concurrency 32 --requests 500
+По умолчанию приложение работает в этом же процессе (httpx.ASGITransport)
+поверх временной SQLite (aiosqlite из requirements-dev.txt:
+pip install -r requirements.txt -r requirements-dev.txt); для Postgres
+передайте --database-url.
+С --base-url запросы идут на уже запущенный uvicorn — он должен смотреть
+в ту же базу, а JWT_SECRET_KEY должен совпадать.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--base-url", default=None, help="адрес запущенного сервера вместо приложения в процессе")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--equipment", type=int, default=20_000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--finance", type=int, default=5_000)
+    parser.add_argument("--logs", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=300, help="запросов на сценарий")
+    parser.add_argument("--scenarios", nargs="+", default=None, help="только эти сценарии (префикс: users, equipment.list ...)")
+    parser.add_argument("--seed", type=int, default=1, help="зерно генератора")
+    parser.add_argument("--no-seed", action="store_true", help="не заполнять базу (данные уже есть)")
+    parser.add_argument("--output", default=None, help="JSON с результатами (по умолчанию benchmarks/results/...)")
+    parser.add_argument("--compare", default=None, help="JSON прошлого прогона для сравнения")
+    return parser.parse_args()
+
+
+args = parse_args()
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+elif not args.base_url:
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+os.environ.setdefault("JWT_SECRET_KEY", "bench-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+# нагрузочный прогон не должен упираться в логирование медленных запросов
+os.environ.setdefault("SLOW_QUERY_MS", "1000")
+os.environ.setdefault("SLOW_REQUEST_MS", "5000")
+
+import httpx  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.future import select  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.database import engine, init_db, AsyncSessionLocal  # noqa: E402
+from app.models import User, DataLog, Equipment, Finance  # noqa: E402
+from app.auth import create_access_token, hash_password  # noqa: E402
+from app.rollups import compute_finance_rollups, rebuild_equipment_rollups, replace_finance_rollups  # noqa: E402
+
+SEED_CHUNK = 5_000
+FIRST_DAY = date(2024, 1, 1)
+ACTIONS = ("Upload CSV", "Visualize", "Filter", "Export", "Login")
+
+rng = random.Random(args.seed)
+
+
+# ----------------------------------------
+# Генератор данных
+# ----------------------------------------
+
+def device_names() -> list[str]:
+    # M строк за D дней: по одной строке на устройство в день
+    count = max(1, math.ceil(args.equipment / max(args.days, 1)))
+    return [f"A{i:04d}" for i in range(count)]
+
+
+def equipment_row(i: int, names: list[str]) -> dict:
+    return {
+        "name": names[i % len(names)], "date": FIRST_DAY + timedelta(days=i // len(names)),
+        "asic": rng.randint(0, 3), "fan": rng.randint(3000, 6000), "core": rng.randint(55, 90),
+        "memory": rng.randint(40, 80), "disk": rng.randint(20, 90), "energy_vt": rng.randint(3000, 3500),
+        "energy_kvt": rng.randint(70, 85), "hashrate": rng.randint(90, 130), "effectiveness": rng.randint(25, 35),
+        "uptime": rng.randint(1200, 1440), "hw_error": rng.randint(0, 20), "active": int(rng.random() > 0.05),
+    }
+
+
+def finance_row(i: int, names: list[str]) -> dict:
+    income = rng.randint(500, 1500)
+    expense = rng.randint(200, 900)
+    return {
+        "date": FIRST_DAY + timedelta(days=rng.randrange(max(args.days, 1))),
+        "equipment_name": names[i % len(names)],
+        "energy": rng.uniform(70, 85), "effectiveness": rng.uniform(25, 35), "bcd_total": rng.uniform(0, 0.01),
+        "income": income, "expense": expense, "benefit": income - expense,
+    }
+
+
+async def insert_chunks(db, model, total: int, make) -> None:
+    for offset in range(0, total, SEED_CHUNK):
+        await db.execute(insert(model), [make(i) for i in range(offset, min(offset + SEED_CHUNK, total))])
+
+
+async def seed() -> list[dict]:
+    """Заполняет базу и возвращает пользователей [{id, role}]."""
+    names = device_names()
+    password = hash_password("bench123")   # один хеш на всех: bcrypt дорог
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        def user_row(i: int) -> dict:
+            role = "superadmin" if i == 0 else "admin" if i == 1 else "user"
+            return {"fullname": f"Bench User {i}", "email": f"bench{i}@example.com", "password": password, "role": role}
+
+        await insert_chunks(db, User, max(args.users, 3), user_row)
+        users = [dict(r._mapping) for r in (await db.execute(select(User.id, User.role, User.fullname))).all()]
+        await insert_chunks(db, Equipment, args.equipment, lambda i: equipment_row(i, names))
+        await insert_chunks(db, Finance, args.finance, lambda i: finance_row(i, names))
+
+        start_ts = datetime.combine(FIRST_DAY, datetime.min.time(), tzinfo=timezone.utc)
+        span = max(args.days, 1) * 86400
+
+        def log_row(i: int) -> dict:
+            user = users[i % len(users)]
+            return {
+                "user_id": user["id"], "user_fullname": user["fullname"], "user_role": user["role"],
+                "action": rng.choice(ACTIONS), "parameter": {"n": i}, "file_name": None,
+                "created_at": start_ts + timedelta(seconds=rng.randrange(span)),
+            }
+
+        await insert_chunks(db, DataLog, args.logs, log_row)
+        await rebuild_equipment_rollups(db)
+        await replace_finance_rollups(db, await compute_finance_rollups(db))
+        await db.commit()
+    print(f"seed: {len(users)} users, {args.equipment} equipment, {args.finance} finance, "
+          f"{args.logs} logs за {time.perf_counter() - started:.1f} с")
+    return users
+
+
+# ----------------------------------------
+# Сценарии
+# ----------------------------------------
+
+def scenarios(names: list[str], max_equipment_id: int) -> dict:
+    """Имя сценария → (роль, функция client → запрос)."""
+    last_day = FIRST_DAY + timedelta(days=max(args.days, 1) - 1)
+    month_ago = (last_day - timedelta(days=30)).isoformat()
+
+    def equipment_payload():
+        return equipment_row(rng.randrange(10**6), names) | {"date": last_day.isoformat()}
+
+    def finance_payload():
+        return finance_row(rng.randrange(10**6), names) | {"date": last_day.isoformat()}
+
+    return {
+        "users.me": ("user", lambda c: c.get("/users/me")),
+        "users.all": ("admin", lambda c: c.get("/users/all")),
+        "users.login": (None, lambda c: c.post("/users/login", json={
+            "email": f"bench{rng.randrange(max(args.users, 3))}@example.com", "password": "bench123"})),
+        "equipment.list_device": ("user", lambda c: c.get("/equipment/", params={"device": rng.choice(names)})),
+        "equipment.list_month": ("user", lambda c: c.get("/equipment/", params={"start": month_ago, "format": "packed"})),
+        "equipment.get": ("user", lambda c: c.get(f"/equipment/{rng.randint(1, max_equipment_id)}")),
+        "equipment.timeseries": ("user", lambda c: c.get("/equipment/timeseries", params={
+            "metric": "hashrate", "device": rng.choice(names)})),
+        "equipment.create": ("superadmin", lambda c: c.post("/equipment/", json=equipment_payload())),
+        "finance.list": ("admin", lambda c: c.get("/finance/", params={"start": month_ago})),
+        "finance.summary": ("admin", lambda c: c.get("/finance/summary", params={"group_by": "month"})),
+        "finance.create": ("superadmin", lambda c: c.post("/finance/", json=finance_payload())),
+        "logs.page": ("admin", lambda c: c.get("/logs/", params={"limit": 50})),
+        "logs.create": ("user", lambda c: c.post("/logs/", json={"action": "Visualize", "parameter": {"bench": True}})),
+        "dashboard.summary": ("admin", lambda c: c.get("/dashboard/summary")),
+    }
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Перцентиль по отсортированному списку (линейная интерполяция)."""
+    if not values:
+        return float("nan")
+    position = (len(values) - 1) * q
+    low, high = math.floor(position), math.ceil(position)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+async def run_scenario(client: httpx.AsyncClient, headers: dict, call) -> dict:
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    errors = 0
+    remaining = args.requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                response = await call(client)
+                status = str(response.status_code)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    client.headers.clear()
+    client.headers.update(headers)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": statuses,
+        "rps": round(len(latencies) / elapsed, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }
+
+
+# ----------------------------------------
+# Отчёт
+# ----------------------------------------
+
+def git_info() -> dict:
+    def git(*cmd):
+        try:
+            return subprocess.run(["git", *cmd], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def print_table(results: dict, previous: dict) -> None:
+    header = f"{'scenario':<24} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+    print(header + ("   Δp95     Δrps" if previous else ""))
+    for name, r in results.items():
+        line = f"{name:<24} {r['rps']:9.1f} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f} {r['errors']:7d}"
+        old = previous.get(name)
+        if old:
+            line += f" {(r['p95_ms'] / old['p95_ms'] - 1) * 100:+6.1f}% {(r['rps'] / old['rps'] - 1) * 100:+6.1f}%"
+        print(line)
+
+
+async def main():
+    if args.base_url:
+        transport, base_url = None, args.base_url
+    else:
+        await app.router.startup()
+        transport, base_url = httpx.ASGITransport(app=app), "http://bench"
+    await init_db()
+
+    if args.no_seed:
+        async with AsyncSessionLocal() as db:
+            users = [dict(r._mapping) for r in (await db.execute(select(User.id, User.role, User.fullname))).all()]
+    else:
+        users = await seed()
+    async with AsyncSessionLocal() as db:
+        names = list((await db.execute(select(Equipment.name).distinct())).scalars()) or device_names()
+        max_equipment_id = (await db.execute(select(Equipment.id).order_by(Equipment.id.desc()).limit(1))).scalar() or 1
+
+    tokens = {}
+    for user in users:
+        tokens.setdefault(user["role"], create_access_token({"sub": str(user["id"]), "role": user["role"]}))
+
+    selected = scenarios(names, max_equipment_id)
+    if args.scenarios:
+        selected = {k: v for k, v in selected.items() if any(k.startswith(p) for p in args.scenarios)}
+
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=60) as client:
+        for name, (role, call) in selected.items():
+            headers = {"Authorization": f"Bearer {tokens[role]}"} if role else {}
+            results[name] = await run_scenario(client, headers, call)
+            print(f"  {name}: {results[name]['rps']} rps", flush=True)
+
+    report = {
+        "git": git_info(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "database": engine.url.get_backend_name(),
+        "in_process": not args.base_url,
+        "config": {k: getattr(args, k) for k in ("users", "equipment", "days", "finance", "logs", "concurrency", "requests", "seed")},
+        "results": results,
+    }
+    previous = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)["results"]
+    print_table(results, previous)
+
+    output = args.output
+    if output is None:
+        commit = (report["git"]["commit"] or "nogit")[:10]
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(os.path.dirname(__file__), "results", f"load-{commit}-{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"результаты: {output}")
+
+    if not args.base_url:
+        await app.router.shutdown()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
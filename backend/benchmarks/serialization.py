@@ -0,0 +1,117 @@
+# benchmarks/serialization.py
+"""
+Сериализация большого списка оборудования: прежний путь против быстрого.
+
+«До»: select(Equipment) → ORM-объекты → проверка каждой строки
+EquipmentRead → jsonable_encoder → json.dumps (как делал FastAPI
+по response_model).
+«После»: select по колонкам схемы → кортежи → orjson (app/serialize.py).
+
+Запуск из каталога backend:
+    python -m benchmarks.serialization --sizes 10000 100000 1000000
+По умолчанию используется временная SQLite (aiosqlite из
+requirements-dev.txt); для Postgres передайте --database-url.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3, help="повторов на размер, берётся лучший")
+    return parser.parse_args()
+
+
+args = parse_args()
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+else:
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+os.environ.setdefault("JWT_SECRET_KEY", "bench-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import delete, insert  # noqa: E402
+from sqlalchemy.future import select  # noqa: E402
+
+from app.database import engine, init_db, AsyncSessionLocal  # noqa: E402
+from app.models import Equipment  # noqa: E402
+from app.schemas import EquipmentRead  # noqa: E402
+from app.serialize import fetch_json, schema_columns  # noqa: E402
+
+SEED_CHUNK = 10_000
+legacy_adapter = TypeAdapter(list[EquipmentRead])
+
+
+async def seed(rows: int) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Equipment))
+        first = date(2024, 1, 1)
+        for offset in range(0, rows, SEED_CHUNK):
+            await db.execute(insert(Equipment), [
+                {
+                    "name": f"A{i % 50}", "date": first + timedelta(days=i // 50),
+                    "asic": i % 3, "fan": 4200, "core": 70, "memory": 65, "disk": 40,
+                    "energy_vt": 3250, "energy_kvt": 78, "hashrate": 110 + i % 7,
+                    "effectiveness": 29, "uptime": 1440, "hw_error": i % 11, "active": 1,
+                }
+                for i in range(offset, min(offset + SEED_CHUNK, rows))
+            ])
+        await db.commit()
+
+
+async def legacy_path() -> bytes:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Equipment).where(Equipment.deleted_at.is_(None)))
+        items = legacy_adapter.validate_python(result.scalars().all(), from_attributes=True)
+        return json.dumps(jsonable_encoder(items)).encode()
+
+
+async def fast_path() -> bytes:
+    async with AsyncSessionLocal() as db:
+        query = select(*schema_columns(Equipment, EquipmentRead)).where(Equipment.deleted_at.is_(None))
+        return await fetch_json(db, query)
+
+
+async def measure(call) -> tuple[float, float, int]:
+    best = float("inf")
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        body = await call()
+        best = min(best, time.perf_counter() - started)
+    # память — отдельным прогоном: tracemalloc сильно замедляет код
+    tracemalloc.start()
+    await call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, len(body)
+
+
+async def main():
+    await init_db()
+    print(f"{'rows':>9} {'path':<8} {'seconds':>9} {'peak MB':>9} {'body MB':>9}")
+    for rows in args.sizes:
+        await seed(rows)
+        results = {}
+        for name, call in (("before", legacy_path), ("after", fast_path)):
+            seconds, peak, size = await measure(call)
+            results[name] = seconds
+            print(f"{rows:>9} {name:<8} {seconds:9.3f} {peak / 2**20:9.1f} {size / 2**20:9.1f}")
+        print(f"{rows:>9} speedup  {results['before'] / results['after']:8.1f}x")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    engine.echo = False
+    asyncio.run(main())
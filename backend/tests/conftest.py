@@ -0,0 +1,70 @@
+# tests/conftest.py
+
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Приложение создаёт движок при импорте app.database, поэтому окружение
+# задаётся до импорта: отдельная временная SQLite на прогон тестов.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_TMP_DIR = tempfile.mkdtemp(prefix="diplom-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_TMP_DIR}/test.db"
+os.environ.pop("DATABASE_REPLICA_URL", None)
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ.setdefault("AVATAR_DIR", os.path.join(_TMP_DIR, "avatars"))
+os.environ.setdefault("DATASETS_DIR", os.path.join(_TMP_DIR, "datasets"))
+os.environ.setdefault("LOG_ARCHIVE_DIR", os.path.join(_TMP_DIR, "archive"))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)   # /static монтируется относительно backend
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _register(client, email: str, role: str) -> dict:
+    from sqlalchemy import update
+    from app.database import AsyncSessionLocal
+    from app.models import User
+
+    response = client.post("/users/register", json={"fullname": email, "email": email, "password": "secret1"})
+    assert response.status_code == 200, response.text
+
+    async def set_role():
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(User).where(User.email == email).values(role=role))
+            await db.commit()
+
+    client.portal.call(set_role)
+    response = client.post("/users/login", json={"email": email, "password": "secret1"})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture(scope="session")
+def superadmin(client) -> dict:
+    """Заголовки авторизации суперадмина."""
+    return _register(client, "superadmin@example.com", "superadmin")
+
+
+@pytest.fixture
+def register(client):
+    """Зарегистрировать пользователя с ролью и вернуть его заголовки авторизации."""
+    return lambda email, role="user": _register(client, email, role)
+
+
+@pytest.fixture
+def run(client):
+    """Выполнить корутину в event loop приложения."""
+    def runner(coroutine_function, *args):
+        return client.portal.call(coroutine_function, *args)
+    return runner
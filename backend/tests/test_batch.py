@@ -0,0 +1,118 @@
+# tests/test_batch.py
+
+from datetime import date
+
+import pytest
+
+from app.database import AsyncSessionLocal
+from app.rollups import compute_finance_rollups, load_finance_rollups
+
+
+def _finance(day: str, name: str, income: int) -> dict:
+    return {
+        "date": day, "equipment_name": name, "energy": 1.5, "effectiveness": 0.5,
+        "bcd_total": 0.1, "income": income, "expense": 10, "benefit": income - 10,
+    }
+
+
+@pytest.fixture
+def assert_rollups_consistent(run):
+    """Агрегаты finance_rollups совпадают с пересчётом по сырой таблице."""
+    async def check():
+        async with AsyncSessionLocal() as db:
+            assert await load_finance_rollups(db) == await compute_finance_rollups(db)
+    return lambda: run(check)
+
+
+def test_finance_batch_keeps_rollups_consistent(client, superadmin, assert_rollups_consistent):
+    items = [
+        _finance("2024-05-01", "B1", 100),
+        _finance("2024-05-02", "B1", 200),
+        _finance("2024-05-31", "B2", 300),
+        _finance("2024-06-03", "B2", 400),
+    ]
+    response = client.post("/finance/batch", json={"items": items}, headers=superadmin)
+    assert response.status_code == 201, response.text
+    created = response.json()
+    assert created["count"] == 4
+    assert (created["start"], created["end"]) == ("2024-05-01", "2024-06-03")
+    assert_rollups_consistent()
+
+    # изменение значений по фильтру
+    response = client.patch(
+        "/finance/batch",
+        json={"where": {"device": "B1"}, "values": {"income": 150}},
+        headers=superadmin,
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["count"] == 2
+    assert_rollups_consistent()
+
+    # перенос строки в другой месяц и на другое устройство: уходит из старых периодов
+    moved = created["ids"][2]
+    response = client.patch(
+        "/finance/batch",
+        json={"where": {"ids": [moved]}, "values": {"date": "2024-07-15", "equipment_name": "B1"}},
+        headers=superadmin,
+    )
+    assert response.status_code == 200, response.text
+    assert sorted(response.json()["devices"]) == ["B1", "B2"]
+    assert_rollups_consistent()
+
+    response = client.post("/finance/batch/delete", json={"device": "B2"}, headers=superadmin)
+    assert response.status_code == 200, response.text
+    assert response.json()["ids"] == [created["ids"][3]]
+    assert_rollups_consistent()
+
+    response = client.post("/finance/rollups/check", headers=superadmin)
+    assert response.json()["mismatches"] == []
+
+
+def test_batch_requires_a_condition(client, superadmin):
+    response = client.post("/finance/batch/delete", json={}, headers=superadmin)
+    assert response.status_code == 400
+
+
+def test_batch_update_of_equipment_refreshes_old_buckets(client, superadmin, run):
+    from sqlalchemy import select
+
+    from app.models import EquipmentRollup
+
+    row = {
+        "name": "E9", "date": "2024-05-06", "asic": 1, "fan": 1, "core": 1, "memory": 1, "disk": 1,
+        "energy_vt": 1, "energy_kvt": 1, "hashrate": 7, "effectiveness": 1, "uptime": 1, "hw_error": 0, "active": 1,
+    }
+    response = client.post("/equipment/batch", json={"items": [row]}, headers=superadmin)
+    assert response.status_code == 201, response.text
+    response = client.patch(
+        "/equipment/batch",
+        json={"where": {"device": "E9"}, "values": {"date": "2024-08-05"}},
+        headers=superadmin,
+    )
+    assert response.status_code == 200, response.text
+
+    async def buckets():
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(EquipmentRollup.bucket).where(
+                    EquipmentRollup.name == "E9", EquipmentRollup.period == "month",
+                    EquipmentRollup.metric == "hashrate",
+                )
+            )
+            return result.scalars().all()
+
+    assert run(buckets) == [date(2024, 8, 1)]
+
+
+def test_single_row_update_and_delete_keep_rollups_consistent(client, superadmin, assert_rollups_consistent):
+    response = client.post("/finance/", json=_finance("2024-09-10", "S1", 50), headers=superadmin)
+    assert response.status_code == 201, response.text
+    finance_id = response.json()["id"]
+
+    response = client.put(f"/finance/{finance_id}", json=_finance("2024-10-01", "S1", 70), headers=superadmin)
+    assert response.status_code == 200, response.text
+    assert_rollups_consistent()
+
+    assert client.delete(f"/finance/{finance_id}", headers=superadmin).status_code == 204
+    assert client.delete(f"/finance/{finance_id}", headers=superadmin).status_code == 404
+    assert_rollups_consistent()
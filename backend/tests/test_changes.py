@@ -0,0 +1,97 @@
+# tests/test_changes.py
+
+from datetime import date, datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app.querying import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    moment = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    cursor = encode_cursor(moment, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, datetime, int) == (moment, 42)
+    assert decode_cursor(encode_cursor(date(2024, 5, 1), "A1"), date, str) == (date(2024, 5, 1), "A1")
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", encode_cursor(1, 2, 3)])
+def test_bad_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, datetime, int)
+    assert error.value.status_code == 400
+
+
+def _crawl(client, headers, since=None, limit=2) -> tuple[dict, set, str, int]:
+    """Все страницы /finance/changes от курсора: {id: строка}, удалённые id, курсор, число страниц."""
+    items, deleted, pages = {}, set(), 0
+    while True:
+        params = {"limit": limit, **({"since": since} if since else {})}
+        response = client.get("/finance/changes", params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        pages += 1
+        assert len(page["items"]) + len(page["deleted"]) <= limit
+        for row in page["items"]:
+            items[row["id"]] = row
+            deleted.discard(row["id"])
+        for row_id in page["deleted"]:
+            items.pop(row_id, None)
+            deleted.add(row_id)
+        since = page["cursor"]
+        if not page["has_more"]:
+            return items, deleted, since, pages
+
+
+def test_changes_return_updated_and_deleted_ids_across_pages(client, superadmin):
+    items = [
+        {"date": f"2024-03-0{day}", "equipment_name": "C1", "energy": 1.0, "effectiveness": 1.0,
+         "bcd_total": 1.0, "income": 10, "expense": 1, "benefit": 9}
+        for day in range(1, 6)
+    ]
+    response = client.post("/finance/batch", json={"items": items}, headers=superadmin)
+    assert response.status_code == 201, response.text
+    ids = response.json()["ids"]
+
+    rows, _, cursor, pages = _crawl(client, superadmin)
+    assert set(ids) <= set(rows)
+    assert pages > 1
+
+    updated, removed = ids[:2], ids[2:4]
+    response = client.patch(
+        "/finance/batch", json={"where": {"ids": updated}, "values": {"income": 77}}, headers=superadmin
+    )
+    assert response.status_code == 200, response.text
+    response = client.post("/finance/batch/delete", json={"ids": removed}, headers=superadmin)
+    assert response.status_code == 200, response.text
+
+    rows, deleted, _, _ = _crawl(client, superadmin, since=cursor)
+    assert all(rows[row_id]["income"] == 77 for row_id in updated)
+    assert set(removed) <= deleted
+    assert not set(removed) & set(rows)
+
+
+
+def test_idle_poll_moves_old_cursor_forward(run):
+    from datetime import timedelta
+
+    from app.changes import TOMBSTONE_RETENTION_DAYS, changes_page
+    from app.database import AsyncSessionLocal
+    from app.models import Equipment
+
+    # курсор почти на границе хранения надгробий, после него ничего не менялось
+    old = datetime.now(timezone.utc) - timedelta(days=TOMBSTONE_RETENTION_DAYS - 1)
+
+    async def poll(since):
+        async with AsyncSessionLocal() as db:
+            return await changes_page(db, Equipment, since, 10, conditions=[Equipment.name == "idle-device"])
+
+    page = run(poll, encode_cursor(old, 0))
+    assert page["items"] == [] and page["deleted"] == [] and not page["has_more"]
+    moved, _ = decode_cursor(page["cursor"], datetime, int)
+    assert moved > datetime.now(timezone.utc) - timedelta(minutes=1)
+
+    # следующий опрос с новым курсором тоже проходит и не откатывает его
+    again, _ = decode_cursor(run(poll, page["cursor"])["cursor"], datetime, int)
+    assert again >= moved
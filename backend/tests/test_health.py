@@ -0,0 +1,25 @@
+# tests/test_health.py
+
+from app.routers import health
+
+
+class _FailingEngine:
+    pool = None
+
+    def connect(self):
+        raise ConnectionRefusedError('password authentication failed for user "diplom" at db.internal')
+
+
+def test_health_db_hides_driver_error(client, monkeypatch):
+    monkeypatch.setattr(health, "engine", _FailingEngine())
+    response = client.get("/health/db")
+    assert response.status_code == 503
+    assert response.json()["error"] == "ConnectionRefusedError"
+    assert "diplom" not in response.text and "db.internal" not in response.text
+
+
+def test_health_db_ok(client):
+    response = client.get("/health/db")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
+    assert "error" not in response.json()
@@ -0,0 +1,77 @@
+# tests/test_live.py
+
+import asyncio
+import sys
+import types
+
+import orjson
+
+from app import live
+
+
+class FakeConnection:
+    def __init__(self):
+        self.listeners = {}
+        self.on_terminated = []
+        self.closed = False
+
+    def add_termination_listener(self, callback):
+        self.on_terminated.append(callback)
+
+    async def add_listener(self, channel, callback):
+        self.listeners[channel] = callback
+
+    async def execute(self, query, timeout=None):
+        return "SELECT 1"
+
+    def is_closed(self):
+        return self.closed
+
+    def terminate(self):
+        self.closed = True
+
+    def drop(self):
+        # разрыв со стороны сервера
+        self.closed = True
+        for callback in self.on_terminated:
+            callback(self)
+
+
+def test_listener_reconnects_and_asks_clients_to_resync(monkeypatch):
+    connections = []
+    attempts = []
+
+    async def connect(dsn, timeout=None):
+        attempts.append(dsn)
+        if len(attempts) == 1:
+            raise OSError("connection refused")
+        connections.append(FakeConnection())
+        return connections[-1]
+
+    monkeypatch.setitem(sys.modules, "asyncpg", types.SimpleNamespace(connect=connect))
+    monkeypatch.setattr(live, "LIVE_RECONNECT_MIN", 0.01)
+
+    async def scenario():
+        hub = live.LiveHub()
+        subscriber = hub.subscribe()
+        task = asyncio.create_task(hub._run())
+        try:
+            while not hub.connected:
+                await asyncio.sleep(0.01)
+            assert hub.reconnects == 0
+            first = connections[0]
+            first.listeners[live.LIVE_CHANNEL](first, 1, live.LIVE_CHANNEL, live.encode_event("created", ["A1"]))
+            assert orjson.loads(subscriber.queue.get_nowait())["type"] == "created"
+
+            first.drop()
+            assert not hub.connected
+            while len(connections) < 2 or not hub.connected:
+                await asyncio.sleep(0.01)
+            assert hub.reconnects == 1
+            assert orjson.loads(subscriber.queue.get_nowait())["type"] == "resync"
+            assert live.LIVE_CHANNEL in connections[1].listeners
+        finally:
+            task.cancel()
+            await hub.stop()
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
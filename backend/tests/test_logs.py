@@ -0,0 +1,18 @@
+# tests/test_logs.py
+
+
+def test_sync_log_is_visible_to_its_author_at_once(client, superadmin):
+    response = client.get("/logs/", headers=superadmin)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    response = client.post(
+        "/logs/", params={"sync": "true"}, json={"action": "sync-check", "parameter": {}}, headers=superadmin
+    )
+    assert response.status_code == 201, response.text
+    log_id = response.json()["id"]
+
+    # без ожидания сброса буфера: старый ETag больше не совпадает
+    response = client.get("/logs/", headers={**superadmin, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert log_id in [row["id"] for row in response.json()]
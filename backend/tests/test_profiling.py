@@ -0,0 +1,26 @@
+# tests/test_profiling.py
+
+import asyncio
+import time
+
+from app.profiling import StackSampler, build_profile
+
+SCOPE = {"method": "GET", "path": "/busy"}
+
+
+def test_cpu_bound_request_is_not_undercounted():
+    async def busy():
+        sampler = StackSampler(asyncio.current_task(), 0.001)
+        started = time.perf_counter()
+        sampler.start()
+        # event loop держит GIL: сэмплер просыпается раз в switchinterval, а не в 1 мс
+        while time.perf_counter() - started < 0.3:
+            sum(range(1000))
+        wall = time.perf_counter() - started
+        sampler.stop()
+        return build_profile("p", SCOPE, 200, wall, sampler, [])
+
+    profile = asyncio.run(busy())
+    assert profile["samples"] > 0
+    assert profile["cpu_ms"] > 0.8 * profile["wall_ms"]
+    assert profile["cpu_ms"] <= profile["wall_ms"] * 1.05
@@ -0,0 +1,49 @@
+# tests/test_replica.py
+
+import asyncio
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import replica
+from app.auth import Principal
+
+USER = Principal(id=1, fullname="u", email="u@example.com", avatar_url=None, phone=None, role="user", position=None)
+
+
+@pytest.fixture
+def healthy_replica(monkeypatch):
+    # «реплика» — та же база: проверяется только выбор сессии
+    monkeypatch.setattr(replica, "ReplicaSessionLocal", replica.AsyncSessionLocal)
+    monitor = replica.ReplicaMonitor()
+    monitor.healthy, monitor.lag = True, 0.0
+    monkeypatch.setattr(replica, "replica_monitor", monitor)
+    replica.recent_writers.clear()
+    return monitor
+
+
+def test_reads_go_to_replica_when_healthy(healthy_replica):
+    assert replica.read_target(USER.id) == ("replica", "ok")
+
+
+def test_recent_writer_reads_from_primary(healthy_replica):
+    replica.recent_writers.set(USER.id, True)
+    assert replica.read_target(USER.id) == ("primary", "sticky")
+    assert replica.read_target(USER.id + 1) == ("replica", "ok")
+
+
+def test_lagging_replica_falls_back(healthy_replica):
+    healthy_replica.lag = replica.REPLICA_MAX_LAG_SECONDS + 1
+    assert replica.read_target(USER.id) == ("primary", "lagging")
+
+
+def test_failed_replica_read_marks_monitor_unhealthy(healthy_replica):
+    async def failing_request():
+        dependency = replica.get_read_db(USER)
+        await dependency.__anext__()
+        await dependency.athrow(OperationalError("SELECT 1", {}, Exception("connection lost")))
+
+    with pytest.raises(OperationalError):
+        asyncio.run(failing_request())
+    assert not healthy_replica.healthy
+    assert replica.read_target(USER.id) == ("primary", "unhealthy")
@@ -0,0 +1,137 @@
+# tests/test_rollups.py
+
+import asyncio
+from datetime import date, timedelta
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app import models
+from app.database import Base
+from app.rollups import (
+    backfill_equipment_rollups,
+    backfill_finance_rollups,
+    compute_finance_rollups,
+    load_finance_rollups,
+    rebuild_equipment_rollups,
+    refresh_equipment_rollups,
+)
+from app.timeseries import equipment_series
+
+
+def _with_session(test):
+    async def runner():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            await test(db)
+        await engine.dispose()
+    asyncio.run(runner())
+
+
+def test_empty_finance_rollups_are_backfilled():
+    async def test(db):
+        db.add_all([
+            models.Finance(date=date(2024, 5, 1), equipment_name="A1", income=10, expense=4, benefit=6),
+            models.Finance(date=date(2024, 5, 9), equipment_name="A1", income=5, expense=1, benefit=4),
+        ])
+        await db.commit()
+
+        assert await backfill_finance_rollups(db) is True
+        await db.commit()
+        assert await load_finance_rollups(db) == await compute_finance_rollups(db)
+        # агрегаты уже есть — повторно не пересчитываются
+        assert await backfill_finance_rollups(db) is False
+
+    _with_session(test)
+
+
+def test_backfill_skips_empty_finance():
+    async def test(db):
+        assert await backfill_finance_rollups(db) is False
+        assert await load_finance_rollups(db) == {}
+
+    _with_session(test)
+
+
+def _hashrate_rows(first: date, days: int) -> list:
+    # значение растёт по дням: среднее периода зависит от того, какие дни в него вошли
+    return [
+        models.Equipment(name="A1", date=first + timedelta(days=i), hashrate=i)
+        for i in range(days)
+    ]
+
+
+def test_empty_equipment_rollups_are_backfilled():
+    async def test(db):
+        db.add_all(_hashrate_rows(date(2024, 5, 1), 10))
+        await db.commit()
+
+        assert await backfill_equipment_rollups(db) is True
+        await db.commit()
+        assert await backfill_equipment_rollups(db) is False
+
+    _with_session(test)
+
+
+def test_rolled_edges_are_clipped_to_range():
+    async def test(db):
+        db.add_all(_hashrate_rows(date(2024, 5, 1), 60))   # 1 мая — 29 июня
+        await db.commit()
+        await backfill_equipment_rollups(db)
+        await db.commit()
+
+        # 15 мая — 10 июня по месяцам: оба месяца неполные
+        series = await equipment_series(db, "hashrate", None, date(2024, 5, 15), date(2024, 6, 10), 3, "rollup")
+        assert series["grain"] == "month"
+        may, june = series["points"]
+        assert (may["t"], may["count"], may["min"], may["max"]) == (date(2024, 5, 1), 17, 14, 30)
+        assert (june["t"], june["count"], june["min"], june["max"]) == (date(2024, 6, 1), 10, 31, 40)
+
+    _with_session(test)
+
+
+def test_monthly_series_is_thinned_to_points():
+    async def test(db):
+        db.add_all(_hashrate_rows(date(2020, 1, 1), 4 * 365))
+        await db.commit()
+        await backfill_equipment_rollups(db)
+        await db.commit()
+
+        series = await equipment_series(db, "hashrate", None, None, None, 10, "rollup")
+        assert series["grain"] == "month"
+        assert len(series["points"]) == 10
+        assert series["points"][0]["t"] == date(2020, 1, 1)
+
+    _with_session(test)
+
+
+def test_refresh_overwrites_existing_equipment_rollups():
+    from sqlalchemy import select
+
+    async def rollups(db):
+        result = await db.execute(select(models.EquipmentRollup))
+        return {
+            (r.period, r.bucket, r.name, r.metric): (r.count, r.sum, r.min, r.max)
+            for r in result.scalars().all()
+        }
+
+    async def test(db):
+        rows = _hashrate_rows(date(2024, 5, 1), 10)
+        db.add_all(rows)
+        await db.commit()
+        await backfill_equipment_rollups(db)
+        await db.commit()
+
+        # строка остаётся в периоде: меняется значение и появляется новая метрика
+        rows[3].hashrate, rows[3].uptime = 100, 1
+        await db.flush()
+        await refresh_equipment_rollups(db, [("A1", rows[3].date)])
+        await db.commit()
+        refreshed = await rollups(db)
+
+        await rebuild_equipment_rollups(db)
+        await db.commit()
+        assert refreshed == await rollups(db)
+
+    _with_session(test)
@@ -0,0 +1,24 @@
+# tests/test_users.py
+
+
+def _user_id(client, headers) -> int:
+    response = client.get("/users/me", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def test_user_with_logs_cannot_be_deleted(client, superadmin, register):
+    headers = register("logged@example.com")
+    user_id = _user_id(client, headers)
+    response = client.post("/logs/", params={"sync": "true"}, json={"action": "login"}, headers=headers)
+    assert response.status_code == 201, response.text
+
+    response = client.delete(f"/users/{user_id}", headers=superadmin)
+    assert response.status_code == 409
+    assert client.get("/users/me", headers=headers).status_code == 200
+
+
+def test_user_without_logs_is_deleted(client, superadmin, register):
+    user_id = _user_id(client, register("quiet@example.com"))
+    assert client.delete(f"/users/{user_id}", headers=superadmin).status_code == 204
+    assert client.delete(f"/users/{user_id}", headers=superadmin).status_code == 404
@@ -0,0 +1,41 @@
+// src/api/columnar.js
+// Разбор списков в колоночных форматах (?format=columnar | ?format=packed).
+// Результат в обоих случаях: { rows, columns: { имя: массив значений } }.
+
+// {"columns": [...], "rows": n, "data": [[...], ...]}
+export const fromColumnar = ({ columns, rows, data }) => ({
+  rows,
+  columns: Object.fromEntries(columns.map((name, i) => [name, data[i]])),
+});
+
+const TYPED = {
+  int8: Int8Array,
+  int16: Int16Array,
+  int32: Int32Array,
+  uint8: Uint8Array,
+  uint16: Uint16Array,
+  uint32: Uint32Array,
+  float64: Float64Array,
+};
+
+// "PKD1" | uint32 LE длина заголовка | JSON-заголовок | буферы колонок (выравнивание 8 байт)
+export const decodePacked = (buffer) => {
+  const view = new DataView(buffer);
+  const magic = new TextDecoder().decode(new Uint8Array(buffer, 0, 4));
+  if (magic !== "PKD1") throw new Error("Неизвестный формат ответа");
+  const headerLength = view.getUint32(4, true);
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)));
+  const base = 8 + headerLength;
+
+  const columns = {};
+  for (const col of header.columns) {
+    const offset = base + col.offset;
+    if (col.type === "dict") {
+      const codes = new TYPED[col.codes](buffer, offset, header.rows);
+      columns[col.name] = Array.from(codes, (code) => col.dictionary[code]);
+    } else {
+      columns[col.name] = new TYPED[col.type](buffer, offset, header.rows);
+    }
+  }
+  return { rows: header.rows, columns };
+};
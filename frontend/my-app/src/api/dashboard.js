@@ -0,0 +1,8 @@
+// src/api/dashboard.js
+import API from "./axios";
+
+// Главные показатели одной сводкой (finance = null для роли user)
+export const fetchDashboardSummary = async () => {
+  const res = await API.get("/dashboard/summary");
+  return res.data;
+};
@@ -0,0 +1,64 @@
+// src/api/datasets.js
+import API from "./axios";
+
+// Загрузить CSV как набор данных (разбор и хранение — на сервере)
+export const uploadDataset = async (file, onProgress) => {
+  const res = await API.post("/datasets/", file, {
+    params: { file_name: file.name },
+    headers: { "Content-Type": "text/csv" },
+    onUploadProgress: (e) => {
+      if (onProgress && e.total) onProgress(Math.round((e.loaded / e.total) * 100));
+    },
+  });
+  return res.data;
+};
+
+export const fetchDataset = async (id) => {
+  const res = await API.get(`/datasets/${id}`);
+  return res.data;
+};
+
+// Страница выборки: { filters: [{column, op, value}], search, sort: ["col", "-col"], columns, offset, limit }
+// Ответ по колонкам: { columns, total, offset, data: [[...], ...] }
+export const queryDataset = async (id, query) => {
+  const res = await API.post(`/datasets/${id}/query`, query);
+  return res.data;
+};
+
+// Различные значения колонки (для списков выбора)
+export const fetchDatasetValues = async (id, column, limit = 1000) => {
+  const res = await API.get(`/datasets/${id}/values`, { params: { column, limit } });
+  return res.data;
+};
+
+// Вся выборка в CSV (Blob)
+export const exportDataset = async (id, query) => {
+  const res = await API.post(`/datasets/${id}/export`, query, { responseType: "blob" });
+  return res.data;
+};
+
+// Агрегаты для графиков: { source: "dataset"|"equipment"|"finance", dataset_id,
+// filters, group_by, bin: {column, kind: "time"|"histogram", interval, bins},
+// aggregations: [{column, fn: "sum"|"mean"|"min"|"max"|"count"|"p95", name}] }
+// Ответ: { keys, series: { имя: [...] }, groups, rows, truncated, edges }
+export const aggregateData = async (query) => {
+  const res = await API.post("/datasets/aggregate", query);
+  return res.data;
+};
+
+export const deleteDataset = async (id) => {
+  await API.delete(`/datasets/${id}`);
+};
+
+// Колонки ответа → строки (для таблиц и графиков)
+export const toRows = ({ data }) =>
+  data.length ? data[0].map((_, r) => data.map((col) => col[r])) : [];
+
+// Серии агрегата → строки-объекты для recharts
+export const seriesToRows = ({ series }) => {
+  const names = Object.keys(series);
+  const length = names.length ? series[names[0]].length : 0;
+  return Array.from({ length }, (_, i) =>
+    Object.fromEntries(names.map((name) => [name, series[name][i]]))
+  );
+};
@@ -1,5 +1,6 @@
 // src/api/finance.js
 import API from "./axios";
+import { decodePacked, fromColumnar } from "./columnar";
 
 // Получить все записи (с фильтрами в query)
 export const fetchFinance = async ({ start, end, device, search } = {}) => {
@@ -30,3 +31,42 @@ export const deleteFinance = async (id) => {
   const res = await API.delete(`/finance/${id}`);
   return res.data;
 };
+
+// Выгрузка с сервера потоком (format: "csv" | "ndjson"), возвращает Blob
+export const exportFinance = async ({ start, end, device, search, format = "csv" } = {}) => {
+  const params = { format };
+  if (start) params.start = start;
+  if (end) params.end = end;
+  if (device) params.device = device;
+  if (search) params.search = search;
+  const res = await API.get("/finance/export", { params, responseType: "blob" });
+  return res.data;
+};
+
+// Итоги по периодам (groupBy: "day" | "week" | "month") из серверных агрегатов
+export const fetchFinanceSummary = async ({ groupBy = "month", byEquipment = false, start, end, device } = {}) => {
+  const params = { group_by: groupBy, by_equipment: byEquipment };
+  if (start) params.start = start;
+  if (end) params.end = end;
+  if (device) params.device = device;
+  const res = await API.get("/finance/summary", { params });
+  return res.data;
+};
+
+// Изменения после курсора: { items, deleted, cursor, has_more }
+export const fetchFinanceChanges = async (since) => {
+  const res = await API.get("/finance/changes", { params: since ? { since } : {} });
+  return res.data;
+};
+
+// Данные финансов по колонкам для графиков: { rows, columns: { поле: массив } }.
+// binary: true — упакованные типизированные массивы (меньше и быстрее разбор)
+export const fetchFinanceColumns = async ({ start, end, device, search, binary = true } = {}) => {
+  const params = { format: binary ? "packed" : "columnar" };
+  if (start) params.start = start;
+  if (end) params.end = end;
+  if (device) params.device = device;
+  if (search) params.search = search;
+  const res = await API.get("/finance", { params, responseType: binary ? "arraybuffer" : "json" });
+  return binary ? decodePacked(res.data) : fromColumnar(res.data);
+};
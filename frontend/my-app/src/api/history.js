@@ -1,14 +1,44 @@
 // src/api/history.js
 import API from "./axios";
 
-// 1) Получить все логи с бэка (с поддержкой фильтров)
-export async function fetchLogs({ search, start, end, types } = {}) {
+// Параметры фильтров для GET /logs/
+function logParams({ search, start, end, types, userId, limit, cursor } = {}) {
   const params = {};
   if (search) params.search = search;
   if (start) params.start = start;
   if (end) params.end = end;
   if (types && types.length) params.types = types.join(",");
-  const res = await API.get("/logs/", { params });
+  if (userId) params.user_id = userId;
+  if (limit) params.limit = limit;
+  if (cursor) params.cursor = cursor;
+  return params;
+}
+
+// 1) Получить страницу логов с бэка (с поддержкой фильтров)
+export async function fetchLogs(filters = {}) {
+  const res = await API.get("/logs/", { params: logParams(filters) });
+  return res.data;
+}
+
+// 1a) То же, плюс курсор следующей страницы из заголовка X-Next-Cursor
+//     (null — страниц больше нет)
+export async function fetchLogsPage(filters = {}) {
+  const res = await API.get("/logs/", { params: logParams(filters) });
+  return { items: res.data, nextCursor: res.headers["x-next-cursor"] || null };
+}
+
+// 1b) Выгрузка логов с сервера потоком (format: "csv" | "ndjson"), возвращает Blob
+export async function exportLogs({ format = "csv", ...filters } = {}) {
+  const res = await API.get("/logs/export", {
+    params: { ...logParams(filters), format },
+    responseType: "blob",
+  });
+  return res.data;
+}
+
+// 1c) Изменения после курсора: { items, deleted, cursor, has_more }
+export async function fetchLogChanges(since) {
+  const res = await API.get("/logs/changes", { params: since ? { since } : {} });
   return res.data;
 }
 
@@ -1,5 +1,6 @@
 // src/api/monitoring.js
 import API from "./axios";
+import { decodePacked, fromColumnar } from "./columnar";
 
 // Получить все записи
 export const fetchMonitoringData = async () => {
@@ -24,3 +25,63 @@ export const deleteMonitoringEntry = async (id) => {
   const res = await API.delete(`/equipment/${id}`);
   return res.data;
 };
+
+// Массовый импорт CSV (файл уходит на сервер потоком, без разбора в браузере)
+export const importMonitoringCSV = async (file) => {
+  const res = await API.post("/equipment/import", file, {
+    headers: { "Content-Type": "text/csv" },
+  });
+  return res.data;
+};
+
+// Выгрузка с сервера потоком (format: "csv" | "ndjson"), возвращает Blob
+export const exportMonitoringData = async ({ start, end, device, search, format = "csv" } = {}) => {
+  const params = { format };
+  if (start) params.start = start;
+  if (end) params.end = end;
+  if (device) params.device = device;
+  if (search) params.search = search;
+  const res = await API.get("/equipment/export", { params, responseType: "blob" });
+  return res.data;
+};
+
+// Ряд метрики для графика (mode: "rollup" — min/max/avg по периодам, "lttb" — прореженный дневной ряд)
+export const fetchTimeseries = async ({ metric, device, start, end, points = 500, mode = "rollup" }) => {
+  const params = { metric, points, mode };
+  if (device) params.device = device;
+  if (start) params.start = start;
+  if (end) params.end = end;
+  const res = await API.get("/equipment/timeseries", { params });
+  return res.data;
+};
+
+// Живая лента изменений оборудования (WebSocket).
+// onEvent получает {type: "created"|"updated"|"deleted"|"imported"|"batch", id, data, names}
+export const subscribeMonitoring = (onEvent, devices = null) => {
+  const token = localStorage.getItem("token");
+  if (!token) return () => {};
+  const url = new URL("/equipment/ws", API.defaults.baseURL.replace(/^http/, "ws"));
+  url.searchParams.set("token", token);
+  if (devices && devices.length) url.searchParams.set("devices", devices.join(","));
+  const ws = new WebSocket(url);
+  ws.onmessage = (msg) => onEvent(JSON.parse(msg.data));
+  return () => ws.close();
+};
+
+// Изменения после курсора: { items, deleted, cursor, has_more }
+export const fetchMonitoringChanges = async (since) => {
+  const res = await API.get("/equipment/changes", { params: since ? { since } : {} });
+  return res.data;
+};
+
+// Данные оборудования по колонкам для графиков: { rows, columns: { поле: массив } }.
+// binary: true — упакованные типизированные массивы (меньше и быстрее разбор)
+export const fetchMonitoringColumns = async ({ start, end, device, search, binary = true } = {}) => {
+  const params = { format: binary ? "packed" : "columnar" };
+  if (start) params.start = start;
+  if (end) params.end = end;
+  if (device) params.device = device;
+  if (search) params.search = search;
+  const res = await API.get("/equipment/", { params, responseType: binary ? "arraybuffer" : "json" });
+  return binary ? decodePacked(res.data) : fromColumnar(res.data);
+};
@@ -1,6 +1,8 @@
 import API from "./axios.js";
 
-export const getAllUsers = () => API.get("/users/all");
+// Страница справочника: { search, role, sort, order, offset, limit, stats }
+// → { items, total, offset, limit }
+export const getAllUsers = (params = {}) => API.get("/users/all", { params });
 
 export const updateUserRole = (id, data) =>
   API.patch(`/users/${id}/update-role`, data);
@@ -14,6 +14,7 @@ import {
 } from "lucide-react";
 import { toast } from "react-hot-toast";
 import { useAuth } from "../contexts/AuthContext.jsx";
+import { avatarSrc } from "@/lib/auth";
 
 import {
   Dialog,
@@ -124,7 +125,7 @@ export default function Sidebar({ isOpen, toggleSidebar }) {
           <div className={isOpen ? "flex items-center space-x-3" : "flex justify-center"}>
             <Avatar className="w-12 h-12 border-2 border-indigo-500">
               <AvatarImage
-                src={`http://localhost:8000${avatarUrl}`}
+                src={avatarSrc(avatarUrl, 128)}
                 alt={user.fullname}
               />
               <AvatarFallback>{user.fullname?.[0]?.toUpperCase() || "U"}</AvatarFallback>
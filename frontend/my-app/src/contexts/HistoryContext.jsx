@@ -1,8 +1,15 @@
 // src/contexts/HistoryContext.jsx
-import React, { createContext, useContext, useState, useEffect } from "react";
+import React, {
+  createContext,
+  useContext,
+  useState,
+  useEffect,
+  useCallback,
+  useRef,
+} from "react";
 import { useAuth } from "./AuthContext.jsx";
 import {
-  fetchLogs,
+  fetchLogsPage,
   createLog,
   deleteLog,
   clearHistory,
@@ -13,18 +20,54 @@ const HistoryContext = createContext(null);
 export function HistoryProvider({ children }) {
   const { user: currentUser } = useAuth();
   const [events, setEvents] = useState([]);
+  // Фильтры уходят на сервер: { search, start, end, types }
+  // (types: null — все типы, [] — ни одного)
+  const [filters, setFilters] = useState({});
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loading, setLoading] = useState(false);
+  // номер последнего запроса первой страницы — ответы устаревших отбрасываются
+  const requestId = useRef(0);
 
-  // 1) Загружаем логи из базы при старте
+  // 1) Первая страница логов по текущим фильтрам (GET /logs/ ограничен
+  //    LOGS_PAGE_DEFAULT записями, дальше — по курсору X-Next-Cursor)
   useEffect(() => {
+    const id = ++requestId.current;
+    if (filters.types && filters.types.length === 0) {
+      setEvents([]);
+      setNextCursor(null);
+      return;
+    }
     (async () => {
+      setLoading(true);
       try {
-        const data = await fetchLogs();
-        setEvents(data);
+        const { items, nextCursor } = await fetchLogsPage(filters);
+        if (id !== requestId.current) return;
+        setEvents(items);
+        setNextCursor(nextCursor);
       } catch (err) {
         console.error("Не удалось загрузить логи:", err);
+      } finally {
+        if (id === requestId.current) setLoading(false);
       }
     })();
-  }, []);
+  }, [filters]);
+
+  // 1a) Следующая страница с теми же фильтрами
+  const loadMore = useCallback(async () => {
+    if (!nextCursor || loading) return;
+    const id = requestId.current;
+    setLoading(true);
+    try {
+      const page = await fetchLogsPage({ ...filters, cursor: nextCursor });
+      if (id !== requestId.current) return;
+      setEvents((prev) => [...prev, ...page.items]);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      console.error("Не удалось загрузить логи:", err);
+    } finally {
+      if (id === requestId.current) setLoading(false);
+    }
+  }, [filters, nextCursor, loading]);
 
   // 2) Добавление нового лога
   const addEvent = async ({ type, params = {}, file = "" }) => {
@@ -42,7 +85,9 @@ export function HistoryProvider({ children }) {
   };
 
   // 3) Удаление одного лога
+  //    (запись из буфера ещё без id — удалить на сервере пока нечего)
   const deleteEvent = async (id) => {
+    if (id == null) return;
     try {
       await deleteLog(id);
       setEvents((prev) => prev.filter((e) => e.id !== id));
@@ -56,6 +101,7 @@ export function HistoryProvider({ children }) {
     try {
       await clearHistory();
       setEvents([]);
+      setNextCursor(null);
     } catch (err) {
       console.error("Не удалось очистить логи:", err);
     }
@@ -63,7 +109,17 @@ export function HistoryProvider({ children }) {
 
   return (
     <HistoryContext.Provider
-      value={{ events, addEvent, deleteEvent, clearHistory: clearAll }}
+      value={{
+        events,
+        filters,
+        setFilters,
+        hasMore: Boolean(nextCursor),
+        loading,
+        loadMore,
+        addEvent,
+        deleteEvent,
+        clearHistory: clearAll,
+      }}
     >
       {children}
     </HistoryContext.Provider>
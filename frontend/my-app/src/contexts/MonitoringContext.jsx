@@ -5,6 +5,7 @@ import {
   createMonitoringEntry,
   updateMonitoringEntry,
   deleteMonitoringEntry,
+  subscribeMonitoring,
 } from "../api/monitoring.js"; // <--- обязательно относительный путь!
 
 const MonitoringContext = createContext();
@@ -12,22 +13,54 @@ const MonitoringContext = createContext();
 export function MonitoringProvider({ children }) {
   const [entries, setEntries] = useState([]);
 
+  const reload = async () => {
+    try {
+      const data = await fetchMonitoringData();
+      setEntries(data);
+    } catch (err) {
+      console.error("Не удалось загрузить monitoring:", err);
+    }
+  };
+
   // при загрузке — фетчим все записи
   useEffect(() => {
-    (async () => {
-      try {
-        const data = await fetchMonitoringData();
-        setEntries(data);
-      } catch (err) {
-        console.error("Не удалось загрузить monitoring:", err);
+    reload();
+  }, []);
+
+  // дальше получаем изменения из живой ленты, без перезагрузки списка
+  useEffect(() => {
+    return subscribeMonitoring((event) => {
+      switch (event.type) {
+        case "created":
+          setEntries((prev) =>
+            prev.some((e) => e.id === event.id) ? prev : [...prev, event.data]
+          );
+          break;
+        case "updated":
+          setEntries((prev) =>
+            prev.map((e) => (e.id === event.id ? event.data : e))
+          );
+          break;
+        case "deleted":
+          setEntries((prev) => prev.filter((e) => e.id !== event.id));
+          break;
+        case "imported":
+        case "batch":
+        case "resync": // лента переподключилась — события за разрыв потеряны
+          reload();
+          break;
+        default:
+          break;
       }
-    })();
+    });
   }, []);
 
   const addEntry = async (entry) => {
     const created = await createMonitoringEntry(entry);
-    // вставляем в конец списка
-    setEntries((prev) => [...prev, created]);
+    // вставляем в конец списка (если лента ещё не успела добавить)
+    setEntries((prev) =>
+      prev.some((e) => e.id === created.id) ? prev : [...prev, created]
+    );
   };
 
   const updateEntry = async (entry) => {
@@ -43,3 +43,14 @@ export const uploadAvatar = async (file) => {
 
   return res.data.avatar_url;
 };
+
+// ✅ URL аватара нужного размера (64 / 128 / 256).
+// Загруженные аватары лежат как /static/avatars/<hash>_<size>.webp,
+// для таблиц и меню берём маленькую копию вместо полного фото.
+const AVATAR_THUMB = /_\d+\.webp$/;
+
+export const avatarSrc = (url, size = 256) => {
+  if (!url) return url;
+  const sized = AVATAR_THUMB.test(url) ? url.replace(AVATAR_THUMB, `_${size}.webp`) : url;
+  return sized.startsWith("/") ? `${API.defaults.baseURL}${sized}` : sized;
+};
@@ -11,19 +11,24 @@ import { Button } from "../components/ui/button";
 import { Input } from "../components/ui/input";
 import { Filter } from "lucide-react";
 import { useHistoryLog } from "../contexts/HistoryContext";
+import { exportDataset, fetchDatasetValues, queryDataset, toRows } from "../api/datasets";
+import { toast } from "react-hot-toast";
+
+const PAGE_SIZE = 500;
+const VISUALIZE_LIMIT = 10000;
 
 export default function AnalyticsFilter() {
   const navigate = useNavigate();
   const { addEvent } = useHistoryLog();
   const { state } = useLocation();
-  const { headers = [], data = [] } = state || {};
+  const { datasetId, headers = [] } = state || {};
 
-  // Если нет входных данных — сразу возвращаемся на загрузку
+  // Если нет набора данных — сразу возвращаемся на загрузку
   useEffect(() => {
-    if (!headers.length || !data.length) {
+    if (!datasetId || !headers.length) {
       navigate("/analytics/upload", { replace: true });
     }
-  }, [headers, data, navigate]);
+  }, [datasetId, headers, navigate]);
 
   // 1) Общие фильтры
   const [globalSearch, setGlobalSearch] = useState("");
@@ -59,72 +64,57 @@ export default function AnalyticsFilter() {
     else document.exitFullscreen();
   };
 
-  // Вычисляем отфильтрованный + отсортированный массив
-  const filtered = useMemo(() => {
-    let rows = data.filter((row) => {
-      // глобальный поиск
-      if (globalSearch) {
-        const hay = row.join(" ").toLowerCase();
-        if (!hay.includes(globalSearch.toLowerCase())) return false;
-      }
-      // выбор оборудования
-      const eqIdx = headers.indexOf("Жабдық");
-      if (eqIdx >= 0 && selectedEquip.length > 0) {
-        if (!selectedEquip.includes(row[eqIdx])) return false;
-      }
-      // по датам
-      const dateIdx = headers.indexOf("Күні");
-      if (dateIdx >= 0) {
-        if (fromDate && row[dateIdx] < fromDate) return false;
-        if (toDate && row[dateIdx] > toDate) return false;
-      }
-      // по одной колонке
-      if (filterValue) {
-        const cell = String(row[colIndex]).toLowerCase();
-        const fv = filterValue.toLowerCase();
-        if (operator === "contains" && !cell.includes(fv)) return false;
-        if (operator === "equals" && cell !== fv) return false;
-        if (operator === "gt" && +cell <= +filterValue) return false;
-        if (operator === "lt" && +cell >= +filterValue) return false;
-      }
-      return true;
-    });
+  // Список оборудования для выбора — с сервера
+  const [equipOptions, setEquipOptions] = useState([]);
+  useEffect(() => {
+    if (datasetId && headers.includes("Жабдық")) {
+      fetchDatasetValues(datasetId, "Жабдық").then(setEquipOptions).catch(console.error);
+    }
+  }, [datasetId, headers]);
 
-    if (sortCol !== null) {
-      rows.sort((a, b) => {
-        const v1 = a[sortCol],
-          v2 = b[sortCol];
-        if (v1 === v2) return 0;
-        const c = v1 > v2 ? 1 : -1;
-        return sortAsc ? c : -c;
-      });
+  // Фильтры и сортировка в виде запроса к /datasets/{id}/query
+  const query = useMemo(() => {
+    const filters = [];
+    if (headers.includes("Жабдық") && selectedEquip.length > 0) {
+      filters.push({ column: "Жабдық", op: "in", value: selectedEquip });
+    }
+    if (headers.includes("Күні")) {
+      if (fromDate) filters.push({ column: "Күні", op: "ge", value: fromDate });
+      if (toDate) filters.push({ column: "Күні", op: "le", value: toDate });
     }
-    return rows;
-  }, [
-    data,
-    headers,
-    globalSearch,
-    selectedEquip,
-    fromDate,
-    toDate,
-    colIndex,
-    operator,
-    filterValue,
-    sortCol,
-    sortAsc,
-  ]);
+    if (filterValue && headers[colIndex]) {
+      const op = { contains: "contains", equals: "eq", gt: "gt", lt: "lt" }[operator];
+      filters.push({ column: headers[colIndex], op, value: filterValue });
+    }
+    return {
+      filters,
+      search: globalSearch || null,
+      sort: sortCol !== null ? [(sortAsc ? "" : "-") + headers[sortCol]] : [],
+    };
+  }, [headers, globalSearch, selectedEquip, fromDate, toDate, colIndex, operator, filterValue, sortCol, sortAsc]);
+
+  // Первая страница выборки (фильтрация и сортировка — на сервере)
+  const [filtered, setFiltered] = useState([]);
+  const [total, setTotal] = useState(0);
+  useEffect(() => {
+    if (!datasetId) return;
+    const timer = setTimeout(() => {
+      queryDataset(datasetId, { ...query, limit: PAGE_SIZE })
+        .then((page) => {
+          setFiltered(toRows(page));
+          setTotal(page.total);
+        })
+        .catch((err) => toast.error(err.response?.data?.detail || err.message));
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [datasetId, query]);
 
-  // Экспорт видимых колонок в CSV
-  const exportCSV = () => {
-    if (!filtered.length) return;
+  // Экспорт видимых колонок в CSV (вся выборка, формирует сервер)
+  const exportCSV = async () => {
+    if (!total) return;
     const activeHeaders = headers.filter((_, i) => visibleCols[i]);
-    const rows = [
-      activeHeaders.join(","),
-      ...filtered.map((r) => r.filter((_, i) => visibleCols[i]).join(",")),
-    ];
-    const csv = rows.join("\n");
     const filename = `filtered_${Date.now()}.csv`;
-    const blob = new Blob([csv], { type: "text/csv" });
+    const blob = await exportDataset(datasetId, { ...query, columns: activeHeaders });
     const url = URL.createObjectURL(blob);
     const a = document.createElement("a");
     a.href = url;
@@ -134,18 +124,25 @@ export default function AnalyticsFilter() {
 
     addEvent({
       type: "Filter CSV",
-      params: { dateFrom: fromDate, dateTo, cols: activeHeaders },
+      params: { dateFrom: fromDate, dateTo: toDate, cols: activeHeaders },
       file: filename,
     });
   };
 
   // Переход на страницу визуализации
-  const goVisualize = () => {
+  const goVisualize = async () => {
     const outHeaders = headers.filter((_, i) => visibleCols[i]);
+    const page = await queryDataset(datasetId, {
+      ...query,
+      columns: outHeaders,
+      limit: VISUALIZE_LIMIT,
+    });
     navigate("/analytics/visualize", {
       state: {
+        datasetId,
+        filters: query.filters,
         headers: outHeaders,
-        data: filtered,
+        data: toRows(page),
         metrics: outHeaders,
       },
     });
@@ -212,9 +209,7 @@ export default function AnalyticsFilter() {
                 }
                 className="w-full h-20 bg-white dark:bg-gray-700 text-gray-900 dark:text-gray-100 border border-gray-300 dark:border-gray-600 rounded"
               >
-                {Array.from(
-                  new Set(data.map((r) => r[headers.indexOf("Жабдық")]))
-                ).map((eq) => (
+                {equipOptions.map((eq) => (
                   <option
                     key={eq}
                     value={eq}
@@ -343,6 +338,9 @@ export default function AnalyticsFilter() {
       </Card>
 
       {/* Таблица с fullscreen */}
+      <p className="text-sm text-gray-600 dark:text-gray-400">
+        {filtered.length < total ? `${filtered.length} / ${total}` : total}
+      </p>
       <div className="relative">
         <button
           onClick={toggleFs}
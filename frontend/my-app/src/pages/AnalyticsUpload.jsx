@@ -1,8 +1,7 @@
 // src/pages/AnalyticsUpload.jsx
 import React, { useRef, useState } from "react";
 import { useNavigate } from "react-router-dom";
-import Papa from "papaparse";
-import { useHistoryLog } from "../contexts/HistoryContext";
+import { uploadDataset } from "../api/datasets";
 import {
   Card,
   CardHeader,
@@ -16,7 +15,6 @@ import { UploadCloud } from "lucide-react";
 export default function AnalyticsUpload() {
   const navigate = useNavigate();
   const inputRef = useRef(null);
-  const { addEvent } = useHistoryLog();
 
   const [dragOver, setDragOver] = useState(false);
   const [selectedFile, setSelectedFile] = useState(null);
@@ -32,43 +30,22 @@ export default function AnalyticsUpload() {
     setSelectedFile(file);
     setPercent(0);
 
-    // Отслеживаем прогресс чтения
-    const reader = new FileReader();
-    reader.onprogress = (e) => {
-      if (e.total > 0) setPercent(Math.round((e.loaded / e.total) * 100));
-    };
-    reader.onloadend = () => setPercent(100);
-    reader.readAsArrayBuffer(file);
-
     try {
-      await new Promise((res, rej) =>
-        Papa.parse(file, {
-          header: false,
-          skipEmptyLines: true,
-          complete: ({ data }) => {
-            if (data.length < 2) return rej(new Error("Деректер табылмады"));
-            const headers = data[0];
-            const rows = data.slice(1);
-
-            // Логируем событие загрузки CSV
-            addEvent({
-              type: "Upload CSV",
-              params: { file: file.name },
-              file: file.name,
-            });
-
-            // Навигируем на страницу фильтрации
-            navigate("/analytics/filter", {
-              state: { headers, data: rows },
-            });
-            res();
-          },
-          error: (err) => rej(err),
-        })
-      );
+      // Файл уходит на сервер потоком; разбор, хранение и запись в историю — там
+      const dataset = await uploadDataset(file, setPercent);
+      setPercent(100);
+
+      // Навигируем на страницу фильтрации
+      navigate("/analytics/filter", {
+        state: {
+          datasetId: dataset.id,
+          headers: dataset.columns.map((c) => c.name),
+          columns: dataset.columns,
+        },
+      });
     } catch (err) {
       console.error(err);
-      toast.error("CSV талдау қателігі: " + err.message);
+      toast.error("CSV талдау қателігі: " + (err.response?.data?.detail || err.message));
       reset();
     }
   };
@@ -34,12 +34,18 @@ import {
   RefreshCw,
 } from "lucide-react";
 import { useHistoryLog } from "../contexts/HistoryContext";
+import { aggregateData, seriesToRows } from "../api/datasets";
+
+// постоянная ссылка, чтобы эффект агрегации не перезапускался на каждом рендере
+const NO_FILTERS = [];
 
 export default function AnalyticsVisualize() {
   const navigate = useNavigate();
   const { addEvent } = useHistoryLog();
   const { state } = useLocation();
   const {
+    datasetId,
+    filters = NO_FILTERS,
     headers = [],
     data = [],
     metrics = [], // выбранные столбцы
@@ -68,6 +74,8 @@ export default function AnalyticsVisualize() {
   const [chartType, setChartType] = useState("line");
   const [xAxisKey, setXAxisKey] = useState(xOptions[0] || "");
   const [yAxisKeys, setYAxisKeys] = useState(yOptions.slice());
+  // Агрегация по оси X считается на сервере по всему набору ("" — сырые строки)
+  const [aggFn, setAggFn] = useState("");
 
   // Для локального отладки (необязательно)
   const [historyLog, setHistoryLog] = useState([]);
@@ -75,7 +83,7 @@ export default function AnalyticsVisualize() {
     setHistoryLog((h) => [...h, { time: new Date(), action }]);
 
   // Подготавливаем данные для графика
-  const chartData = useMemo(
+  const rawData = useMemo(
     () =>
       data.map((row) =>
         headers.reduce((obj, h, i) => {
@@ -86,6 +94,30 @@ export default function AnalyticsVisualize() {
     [data, headers]
   );
 
+  const [aggData, setAggData] = useState(null);
+  useEffect(() => {
+    if (!aggFn || !datasetId || !xAxisKey || !yAxisKeys.length) {
+      setAggData(null);
+      return;
+    }
+    aggregateData({
+      source: "dataset",
+      dataset_id: datasetId,
+      filters,
+      group_by: [xAxisKey],
+      aggregations: yAxisKeys
+        .filter((k) => k !== xAxisKey)
+        .map((k) => ({ column: k, fn: aggFn, name: k })),
+    })
+      .then((res) => setAggData(seriesToRows(res)))
+      .catch((err) => {
+        console.error(err);
+        setAggData(null);
+      });
+  }, [aggFn, datasetId, filters, xAxisKey, yAxisKeys]);
+
+  const chartData = aggData || rawData;
+
   // Ссылка на контейнер графика
   const chartRef = useRef(null);
   const COLORS = ["#3B82F6", "#10B981", "#F59E0B", "#EF4444", "#8B5CF6"];
@@ -239,6 +271,29 @@ export default function AnalyticsVisualize() {
                 ))}
               </select>
             </div>
+            {/* Агрегация */}
+            {datasetId && (
+              <div>
+                <p className="text-xs font-medium mb-1">Агрегация по оси X</p>
+                <select
+                  value={aggFn}
+                  onChange={(e) => {
+                    setAggFn(e.target.value);
+                    logAction(`Агрегация: ${e.target.value || "нет"}`);
+                  }}
+                  className="w-full border rounded p-1 text-xs"
+                >
+                  <option value="">Нет</option>
+                  <option value="sum">Сумма</option>
+                  <option value="mean">Среднее</option>
+                  <option value="min">Минимум</option>
+                  <option value="max">Максимум</option>
+                  <option value="p50">Медиана</option>
+                  <option value="p95">95-й процентиль</option>
+                  <option value="count">Количество</option>
+                </select>
+              </div>
+            )}
             {/* Экспорт */}
             <Button
               onClick={exportPNG}
@@ -1,4 +1,4 @@
-import React from "react";
+import React, { useEffect, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import {
   UploadCloud,
@@ -10,10 +10,37 @@ import {
   Cpu,
 } from "lucide-react";
 import { useAuth } from "@/contexts/AuthContext"; // 👈 добавили
+import { fetchDashboardSummary } from "@/api/dashboard";
+
+const fmt = (v, digits = 0) =>
+  v == null ? "—" : Number(v).toLocaleString("ru-RU", { maximumFractionDigits: digits });
 
 export default function Main() {
   const navigate = useNavigate();
   const { user } = useAuth(); // 👈 заменили localStorage
+  const [summary, setSummary] = useState(null);
+
+  // KPI одной сводкой с сервера (кэшируется там же)
+  useEffect(() => {
+    fetchDashboardSummary().then(setSummary).catch(console.error);
+  }, []);
+
+  const kpis = summary
+    ? [
+        {
+          label: "Белсенді майнерлер",
+          value: `${summary.equipment.active_miners} / ${summary.equipment.miners}`,
+        },
+        { label: "Hashrate (TH/s)", value: fmt(summary.equipment.hashrate) },
+        { label: "Энергия (кВт)", value: fmt(summary.equipment.energy_kvt) },
+        ...(summary.finance
+          ? [
+              { label: "Кіріс (ай)", value: fmt(summary.finance.income) },
+              { label: "Пайда (ай)", value: fmt(summary.finance.benefit) },
+            ]
+          : []),
+      ]
+    : [];
 
   return (
     <div className="min-h-screen w-full bg-gray-50 dark:bg-gray-900 py-10 px-4 animate-fade-in">
@@ -29,6 +56,21 @@ export default function Main() {
           </p>
         </div>
 
+        {/* KPI */}
+        {kpis.length > 0 && (
+          <div className="grid grid-cols-2 sm:grid-cols-5 gap-4">
+            {kpis.map((k) => (
+              <div
+                key={k.label}
+                className="bg-white dark:bg-gray-800 rounded-xl shadow p-4 text-center"
+              >
+                <p className="text-xs text-gray-500 dark:text-gray-400">{k.label}</p>
+                <p className="text-lg font-semibold text-gray-900 dark:text-white">{k.value}</p>
+              </div>
+            ))}
+          </div>
+        )}
+
         {/* 3 Негізгі функционал */}
         <div className="grid grid-cols-1 sm:grid-cols-3 gap-6">
           {user?.role !== "user" && ( // 👈 проверка роли
@@ -1,5 +1,5 @@
 // src/pages/History.jsx
-import React, { useState, useMemo } from "react";
+import React, { useState, useMemo, useEffect } from "react";
 import { useNavigate } from "react-router-dom";
 import {
   Card,
@@ -25,6 +25,7 @@ import {
   DialogFooter,
 } from "../components/ui/dialog";
 import { useHistoryLog } from "../contexts/HistoryContext";
+import { exportLogs } from "../api/history";
 import { useSettings } from "../contexts/SettingsContext";
 
 // Типы событий для KPI
@@ -57,7 +58,15 @@ const EVENT_TYPES = [
 
 export default function History() {
   const navigate = useNavigate();
-  const { events: records, deleteEvent, clearHistory } = useHistoryLog();
+  const {
+    events: records,
+    setFilters,
+    hasMore,
+    loading,
+    loadMore,
+    deleteEvent,
+    clearHistory,
+  } = useHistoryLog();
   const { settings } = useSettings();
   const { timeFormat, language } = settings;
 
@@ -73,23 +82,23 @@ export default function History() {
   const [toDeleteId, setToDeleteId] = useState(null);
   const [clearAllOpen, setClearAllOpen] = useState(false);
 
-  // Отфильтрованные записи
-  const filtered = useMemo(() => {
-    return records.filter((r) => {
-      const datePart = (r.created_at || r.timestamp || "").slice(0, 10);
-      if (dateFrom && datePart < dateFrom) return false;
-      if (dateTo && datePart > dateTo) return false;
-      if (!typeFilter[r.action]) return false;
-      if (
-        search &&
-        !JSON.stringify(r).toLowerCase().includes(search.toLowerCase())
-      )
-        return false;
-      return true;
-    });
-  }, [records, search, dateFrom, dateTo, typeFilter]);
+  // Фильтры применяются на сервере; поиск — с задержкой 300 мс после ввода
+  useEffect(() => {
+    const timer = setTimeout(() => {
+      const checked = EVENT_TYPES.filter(({ key }) => typeFilter[key]).map(
+        ({ key }) => key
+      );
+      setFilters({
+        search: search.trim() || undefined,
+        start: dateFrom || undefined,
+        end: dateTo || undefined,
+        types: checked.length === EVENT_TYPES.length ? null : checked,
+      });
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [search, dateFrom, dateTo, typeFilter, setFilters]);
 
-  // KPI-счётчики
+  // KPI-счётчики (по загруженным страницам)
   const stats = useMemo(() => {
     const cnt = EVENT_TYPES.reduce(
       (acc, { key }) => ({ ...acc, [key]: 0 }),
@@ -142,33 +151,29 @@ export default function History() {
     }
   };
 
-  // Экспорт истории в CSV
-  const exportLogCSV = () => {
-    if (!records.length) return;
-    const header = [
-      "Уақыты",
-      "Пайдаланушы",
-      "Роль",
-      "Іс-әрекет",
-      "Параметрлер",
-      "Файл",
-    ];
-    const rows = records.map((r) => [
-      r.created_at || r.timestamp || "",
-      r.user_fullname,
-      r.user_role || "",
-      r.action,
-      JSON.stringify(r.parameter),
-      r.file_name || "",
-    ]);
-    const csv = [header.join(","), ...rows.map((r) => r.join(","))].join("\n");
-    const blob = new Blob([csv], { type: "text/csv" });
-    const url = URL.createObjectURL(blob);
-    const a = document.createElement("a");
-    a.href = url;
-    a.download = `history_${Date.now()}.csv`;
-    a.click();
-    URL.revokeObjectURL(url);
+  // Экспорт истории в CSV — потоком с сервера, все записи по текущим фильтрам
+  const exportLogCSV = async () => {
+    const checked = EVENT_TYPES.filter(({ key }) => typeFilter[key]).map(
+      ({ key }) => key
+    );
+    if (!checked.length) return;
+    try {
+      const blob = await exportLogs({
+        format: "csv",
+        search: search.trim() || undefined,
+        start: dateFrom || undefined,
+        end: dateTo || undefined,
+        types: checked.length === EVENT_TYPES.length ? undefined : checked,
+      });
+      const url = URL.createObjectURL(blob);
+      const a = document.createElement("a");
+      a.href = url;
+      a.download = `history_${Date.now()}.csv`;
+      a.click();
+      URL.revokeObjectURL(url);
+    } catch (err) {
+      console.error("Не удалось выгрузить логи:", err);
+    }
   };
 
   return (
@@ -283,7 +288,7 @@ export default function History() {
             </tr>
           </thead>
           <tbody>
-            {filtered.length === 0 && (
+            {records.length === 0 && !loading && (
               <tr>
                 <td
                   colSpan={7}
@@ -293,7 +298,7 @@ export default function History() {
                 </td>
               </tr>
             )}
-            {filtered.map((r) => (
+            {records.map((r) => (
               <tr
                 key={r.id}
                 className="odd:bg-white even:bg-gray-50 dark:odd:bg-gray-800 dark:even:bg-gray-700 hover:bg-gray-100 dark:hover:bg-gray-600"
@@ -331,6 +336,18 @@ export default function History() {
             ))}
           </tbody>
         </table>
+        {/* Следующая страница по курсору */}
+        {hasMore && (
+          <div className="p-3 text-center">
+            <Button
+              variant="outline"
+              onClick={loadMore}
+              disabled={loading}
+            >
+              {loading ? "Жүктелуде..." : "Тағы жүктеу"}
+            </Button>
+          </div>
+        )}
       </div>
 
       {/* Действия */}
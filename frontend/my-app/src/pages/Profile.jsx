@@ -13,7 +13,7 @@ import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
 import { Mail, Phone, Upload, CheckCircle2 } from "lucide-react";
 import { useAuth } from "@/contexts/AuthContext";
-import { uploadAvatar } from "@/lib/auth";
+import { uploadAvatar, avatarSrc } from "@/lib/auth";
 import { updateCurrentUser } from "@/lib/auth";
 
 export default function Profile() {
@@ -69,7 +69,7 @@ export default function Profile() {
                 <Avatar className="w-24 h-24 ring-4 ring-white transition-transform duration-300 group-hover:scale-105 border-4 border-indigo-500 shadow-md">
                   {avatarUrl ? (
                     <AvatarImage
-                      src={`http://localhost:8000${avatarUrl}`}
+                      src={avatarSrc(avatarUrl, 256)}
                       alt={user?.fullname || "User"}
                       className="object-cover"
                     />
@@ -1,6 +1,8 @@
-import React, { useState, useEffect, useMemo } from "react";
+import React, { useState, useEffect } from "react";
 import API from "../api/axios.js";
+import { getAllUsers } from "../api/users.js";
 import { useAuth } from "../contexts/AuthContext.jsx";
+import { avatarSrc } from "../lib/auth";
 import { Button } from "../components/ui/button";
 import {
   Table,
@@ -29,50 +31,82 @@ import {
 import { toast } from "react-hot-toast";
 import { Pencil, Trash2 } from "lucide-react";
 
+const PAGE_SIZE = 50;
+
+// Колонки, по которым сервер умеет сортировать
+const SORTABLE = {
+  fullname: "ФИО",
+  email: "Email",
+  role: "Рөлі",
+  position: "Лауазымы",
+  log_count: "Әрекеттер саны",
+  last_activity: "Соңғы белсенділік",
+};
+
 export default function Users() {
   const { user } = useAuth();
   const [users, setUsers] = useState([]);
+  const [total, setTotal] = useState(0);
   const [loading, setLoading] = useState(false);
 
   const [search, setSearch] = useState("");
+  const [query, setQuery] = useState("");
   const [roleFilter, setRoleFilter] = useState("all");
+  const [sort, setSort] = useState({ column: "fullname", order: "asc" });
+  const [page, setPage] = useState(0);
+  const [reload, setReload] = useState(0);
 
   const [editUser, setEditUser] = useState(null);
   const [isDialogOpen, setDialogOpen] = useState(false);
 
-  // ✅ Загружаем всех пользователей
+  // ✅ Поиск уходит на сервер с задержкой 300 мс после ввода
+  useEffect(() => {
+    const timer = setTimeout(() => {
+      setQuery(search.trim());
+      setPage(0);
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [search]);
+
+  // ✅ Загружаем страницу пользователей (поиск, фильтр и сортировка — на сервере)
   useEffect(() => {
+    let cancelled = false;
     (async () => {
       setLoading(true);
       try {
-        const { data } = await API.get("/users/all");
-        setUsers(data);
+        const { data } = await getAllUsers({
+          search: query || undefined,
+          role: roleFilter === "all" ? undefined : roleFilter,
+          sort: sort.column,
+          order: sort.order,
+          offset: page * PAGE_SIZE,
+          limit: PAGE_SIZE,
+          stats: true,
+        });
+        if (cancelled) return;
+        setUsers(data.items);
+        setTotal(data.total);
       } catch (err) {
-        toast.error("Не удалось загрузить пользователей");
+        if (!cancelled) toast.error("Не удалось загрузить пользователей");
       } finally {
-        setLoading(false);
+        if (!cancelled) setLoading(false);
       }
     })();
-  }, []);
-
-  const filtered = useMemo(() => {
-    return users.filter((u) => {
-      const term = search.trim().toLowerCase();
-      if (
-        term &&
-        !(
-          u.fullname.toLowerCase().includes(term) ||
-          u.email.toLowerCase().includes(term)
-        )
-      ) {
-        return false;
-      }
-      if (roleFilter !== "all" && u.role !== roleFilter) {
-        return false;
-      }
-      return true;
-    });
-  }, [users, search, roleFilter]);
+    return () => {
+      cancelled = true;
+    };
+  }, [query, roleFilter, sort, page, reload]);
+
+  const toggleSort = (column) => {
+    setSort((prev) =>
+      prev.column === column
+        ? { column, order: prev.order === "asc" ? "desc" : "asc" }
+        : { column, order: "asc" }
+    );
+    setPage(0);
+  };
+
+  const pages = Math.max(1, Math.ceil(total / PAGE_SIZE));
 
   const onEdit = (u) => {
     setEditUser({ ...u });
@@ -90,7 +124,9 @@ export default function Users() {
         `/users/${editUser.id}/update-role`,
         payload
       );
-      setUsers((prev) => prev.map((u) => (u.id === data.id ? data : u)));
+      setUsers((prev) =>
+        prev.map((u) => (u.id === data.id ? { ...u, ...data } : u))
+      );
       toast.success("Пайдаланушы жаңартылды");
       setDialogOpen(false);
     } catch {
@@ -102,7 +138,7 @@ export default function Users() {
     if (!window.confirm("Пайдаланушыны жою керек пе?")) return;
     try {
       await API.delete(`/users/${id}`);
-      setUsers((prev) => prev.filter((u) => u.id !== id));
+      setReload((n) => n + 1);
       toast.success("Пайдаланушы жойылды");
     } catch {
       toast.error("Жою кезінде қате");
@@ -113,11 +149,17 @@ export default function Users() {
     <div className="space-y-6 p-6 bg-gray-50 dark:bg-gray-900 text-gray-900 dark:text-gray-100">
       <div className="flex flex-wrap gap-4">
         <Input
-          placeholder="ФИО немесе email арқылы іздеу…"
+          placeholder="ФИО, email, рөл немесе лауазым бойынша іздеу…"
           value={search}
           onChange={(e) => setSearch(e.target.value)}
         />
-        <Select value={roleFilter} onValueChange={setRoleFilter}>
+        <Select
+          value={roleFilter}
+          onValueChange={(v) => {
+            setRoleFilter(v);
+            setPage(0);
+          }}
+        >
           <SelectTrigger className="w-40">
             <SelectValue placeholder="Рөлі бойынша" />
           </SelectTrigger>
@@ -135,24 +177,30 @@ export default function Users() {
           <TableHeader className="bg-gray-100 dark:bg-gray-700">
             <TableRow>
               <TableHead>Avatar</TableHead>
-              <TableHead>ФИО</TableHead>
-              <TableHead>Email</TableHead>
-              <TableHead>Рөлі</TableHead>
-              <TableHead>Лауазымы</TableHead>
+              {Object.entries(SORTABLE).map(([column, label]) => (
+                <TableHead
+                  key={column}
+                  className="cursor-pointer select-none"
+                  onClick={() => toggleSort(column)}
+                >
+                  {label}
+                  {sort.column === column && (sort.order === "asc" ? " ▲" : " ▼")}
+                </TableHead>
+              ))}
               <TableHead className="text-right">Әрекеттер</TableHead>
             </TableRow>
           </TableHeader>
           <TableBody>
             {loading ? (
               <TableRow>
-                <TableCell colSpan={6}>Жүктелуде…</TableCell>
+                <TableCell colSpan={8}>Жүктелуде…</TableCell>
               </TableRow>
-            ) : filtered.length === 0 ? (
+            ) : users.length === 0 ? (
               <TableRow>
-                <TableCell colSpan={6}>Пайдаланушылар табылмады</TableCell>
+                <TableCell colSpan={8}>Пайдаланушылар табылмады</TableCell>
               </TableRow>
             ) : (
-              filtered.map((u) => (
+              users.map((u) => (
                 <TableRow
                   key={u.id}
                   className="hover:bg-gray-50 dark:hover:bg-gray-800"
@@ -160,19 +208,26 @@ export default function Users() {
                   <TableCell>
                     <img
                       src={
-                        u.avatar_url ||
+                        avatarSrc(u.avatar_url, 64) ||
                         `https://ui-avatars.com/api/?name=${encodeURIComponent(
                           u.fullname
                         )}`
                       }
                       alt={u.fullname}
                       className="w-8 h-8 rounded-full"
+                      loading="lazy"
                     />
                   </TableCell>
                   <TableCell>{u.fullname}</TableCell>
                   <TableCell>{u.email}</TableCell>
                   <TableCell>{u.role}</TableCell>
                   <TableCell>{u.position || "—"}</TableCell>
+                  <TableCell>{u.log_count ?? "—"}</TableCell>
+                  <TableCell>
+                    {u.last_activity
+                      ? new Date(u.last_activity).toLocaleString()
+                      : "—"}
+                  </TableCell>
                   <TableCell className="text-right space-x-2">
                     <Button
                       size="icon"
@@ -199,6 +254,33 @@ export default function Users() {
         </Table>
       </div>
 
+      <div className="flex items-center justify-between text-sm">
+        <span>
+          Барлығы: {total}
+        </span>
+        <div className="flex items-center gap-2">
+          <Button
+            variant="outline"
+            size="sm"
+            disabled={page === 0 || loading}
+            onClick={() => setPage((p) => p - 1)}
+          >
+            ←
+          </Button>
+          <span>
+            {page + 1} / {pages}
+          </span>
+          <Button
+            variant="outline"
+            size="sm"
+            disabled={page + 1 >= pages || loading}
+            onClick={() => setPage((p) => p + 1)}
+          >
+            →
+          </Button>
+        </div>
+      </div>
+
       <Dialog open={isDialogOpen} onOpenChange={setDialogOpen}>
         <DialogContent className="max-w-md">
           <DialogHeader>